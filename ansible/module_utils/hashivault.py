@@ -1,13 +1,61 @@
+import base64
+import contextlib
+import copy
+import fcntl
+import functools
+import hashlib
+import json
 import os
+import random
+import socket
+import ssl
+import struct
+import tempfile
+import threading
+import time
 
+_imports_started = time.time()  # noqa
 import hvac
 import requests
+from collections import OrderedDict
 from ansible.module_utils.basic import AnsibleModule, env_fallback
+from hvac.adapters import JSONAdapter
+from hvac.adapters import RawAdapter
+from hvac.exceptions import BadGateway
+from hvac.exceptions import Forbidden
+from hvac.exceptions import InternalServerError
 from hvac.exceptions import InvalidPath
+from hvac.exceptions import InvalidRequest
+from hvac.exceptions import RateLimitExceeded
+from hvac.exceptions import UnexpectedError
+from hvac.exceptions import VaultDown
+from hvac.exceptions import VaultError
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.ssl_ import resolve_cert_reqs
+from urllib.parse import quote
+from urllib.parse import unquote
+from urllib.parse import urlparse
 
+_import_time = time.time() - _imports_started
 normalize = {'list': list, 'str': str, 'dict': dict, 'bool': bool, 'int': int, 'duration': str}
 
 
+def hashivault_env_bool(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def hashivault_env_int(name, default):
+    """Return the integer in environment variable name, default when it is unset or not an integer."""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
 def hashivault_argspec():
     argument_spec = dict(
         url=dict(required=False, default=os.environ.get('VAULT_ADDR', ''), type='str'),
@@ -25,7 +73,25 @@ def hashivault_argspec():
         secret_id=dict(required=False, fallback=(env_fallback, ['VAULT_SECRET_ID']), type='str', no_log=True),
         aws_header=dict(required=False, fallback=(env_fallback, ['VAULT_AWS_HEADER']), type='str', no_log=True),
         namespace=dict(required=False, default=os.environ.get('VAULT_NAMESPACE', None), type='str'),
-        timeout=dict(required=False, default=30, type=int)
+        timeout=dict(required=False, default=30, type=int),
+        token_cache=dict(required=False, default=hashivault_env_bool('VAULT_TOKEN_CACHE'), type='bool'),
+        token_cache_path=dict(required=False, default=os.environ.get('VAULT_TOKEN_CACHE_PATH',
+                                                                     '~/.ansible/hashivault/token_cache'), type='str'),
+        pool_connections=dict(required=False, default=10, type='int'),
+        pool_maxsize=dict(required=False, type='int'),
+        pool_block=dict(required=False, default=False, type='bool'),
+        retries=dict(required=False, default=hashivault_env_int('VAULT_MAX_RETRIES', 0), type='int'),
+        retry_backoff=dict(required=False, default=0.5, type='float'),
+        deadline=dict(required=False, type='float'),
+        discover_nodes=dict(required=False, default=hashivault_env_bool('VAULT_DISCOVER_NODES'), type='bool'),
+        read_consistency=dict(required=False, default=os.environ.get('VAULT_READ_CONSISTENCY', 'none'), type='str',
+                              choices=['none', 'index', 'forward']),
+        index_state_path=dict(required=False, default=os.environ.get('VAULT_INDEX_STATE_PATH',
+                                                                     '~/.ansible/hashivault/index_state'), type='str'),
+        profile=dict(required=False, default=hashivault_env_bool('VAULT_PROFILE'), type='bool'),
+        broker=dict(required=False, default=hashivault_env_bool('VAULT_BROKER'), type='bool'),
+        broker_idle_timeout=dict(required=False, default=hashivault_env_int('VAULT_BROKER_IDLE_TIMEOUT', 300),
+                                 type='int'),
     )
     return argument_spec
 
@@ -46,9 +112,15 @@ def hashivault_init(argument_spec, supports_check_mode=False, required_if=None,
 
 
 def hashivault_normalize_from_doc(module, options, documentation):
+    """
+    Convert the values of options to their type in documentation, the
+    suboptions of an option of DOCUMENTATION or a dict of option name to type.
+    """
     desired_state = {}
     for key, value in options.items():
-        config_type = documentation.get(key, {}).get('type')
+        config_type = documentation.get(key)
+        if isinstance(config_type, dict):
+            config_type = config_type.get('type')
         if config_type is None:
             module.warn('Unknown option "{}". Make sure this is not a typo, if it is not, please open an '
                         'issue at https://github.com/TerryHowe/ansible-modules-hashivault/issues.'.format(key))
@@ -110,11 +182,1043 @@ def hashivault_client(params):
             verify = check_verify
     else:
         verify = check_verify
-    client = hvac.Client(url=url, cert=cert, verify=verify, namespace=namespace, timeout=timeout)
+    if params.get('broker'):
+        session = hashivault_broker_session(params.get('broker_idle_timeout') or 300)
+    else:
+        session = hashivault_session(pool_connections=params.get('pool_connections') or 10,
+                                     pool_maxsize=params.get('pool_maxsize') or max(10, params.get('concurrency') or 0),
+                                     pool_block=bool(params.get('pool_block')))
+    nodes = [hashivault_url(node.strip().rstrip('/')) for node in (url or '').split(',') if node.strip()]
+    client = hvac.Client(url=nodes[0] if nodes else url, cert=cert, verify=verify, namespace=namespace,
+                         timeout=timeout, adapter=HashivaultAdapter, session=session)
+    if len(nodes) > 1 or (nodes and params.get('discover_nodes')):
+        client.adapter.router = hashivault_router(nodes, session, verify=verify, cert=cert, timeout=timeout,
+                                                  discover=bool(params.get('discover_nodes')))
+    read_consistency = params.get('read_consistency')
+    if read_consistency and read_consistency != 'none':
+        index_state = hashivault_index_state(params.get('index_state_path') or '~/.ansible/hashivault/index_state')
+        client.adapter.consistency = (index_state, url, read_consistency)
+    retries = params.get('retries')
+    client.adapter.retries = retries or 0
+    client.adapter.retry_backoff = params.get('retry_backoff') or 0.5
+    if params.get('deadline'):
+        client.adapter.deadline = time.time() + params.get('deadline')
     return client
 
 
-def hashivault_auth(client, params):
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def hashivault_session(pool_connections=10, pool_maxsize=10, pool_block=False):
+    """
+    requests session shared by every client of the process built with the same
+    pool settings, so connections are kept alive and reused across clients and
+    threads. pool_connections is the number of hosts pooled, pool_maxsize the
+    number of connections kept per host and pool_block makes callers wait for
+    a free connection rather than open one that is thrown away afterwards.
+    The session has no verify nor cert of its own: hvac would let those
+    override the client's, they are passed with every request instead.
+    """
+    key = (pool_connections, pool_maxsize, pool_block)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.verify = None
+            adapter = HashivaultHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                            pool_block=pool_block)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.mount(UNIX_SCHEME, adapter)
+            session.hooks['response'].append(_profile_response)
+            _sessions[key] = session
+        return session
+
+
+class _ProfiledHTTPConnection(HTTPConnection):
+    """Note how long opening the socket took."""
+
+    def _new_conn(self):
+        started = time.time()
+        try:
+            return super(_ProfiledHTTPConnection, self)._new_conn()
+        finally:
+            _profile_connection(0, started)
+
+
+class _ResumingSSLSocket(ssl.SSLSocket):
+    """SSLSocket handing its TLS session to its context when it is closed."""
+
+    def _real_close(self):
+        self.context.keep_session(self)
+        super(_ResumingSSLSocket, self)._real_close()
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """
+    SSLContext resuming the TLS session of the last connection to the same
+    server, so a new connection is an abbreviated handshake.
+    """
+    sslsocket_class = _ResumingSSLSocket
+
+    def __init__(self, *args, **kwargs):
+        super(_ResumingSSLContext, self).__init__()
+        self.tls_sessions = {}
+        self.tls_sessions_lock = threading.Lock()
+
+    @staticmethod
+    def _server(sock):
+        try:
+            return sock.server_hostname, sock.getpeername()
+        except (AttributeError, OSError):
+            return None
+
+    def keep_session(self, sock):
+        # TLS 1.3 sends its session tickets after the handshake, a session
+        # without one cannot be resumed
+        try:
+            server = self._server(sock)
+            session = sock.session
+            if server is None or session is None or (not session.has_ticket and sock.version() == 'TLSv1.3'):
+                return
+        except (AttributeError, OSError, ValueError):
+            return
+        with self.tls_sessions_lock:
+            self.tls_sessions[server] = session
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        try:
+            server = (kwargs.get('server_hostname'), sock.getpeername())
+        except OSError:
+            server = None
+        with self.tls_sessions_lock:
+            session = self.tls_sessions.get(server)
+        if session is not None and kwargs.get('session') is None and time.time() < session.time + session.timeout:
+            kwargs['session'] = session
+        sslsock = super(_ResumingSSLContext, self).wrap_socket(sock, *args, **kwargs)
+        self.keep_session(sslsock)
+        return sslsock
+
+
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def _file_version(path):
+    """Tell a file or directory apart from the one path named before it was replaced."""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime, stat.st_size
+
+
+def hashivault_ssl_context(cert_reqs, ca_certs=None, ca_cert_dir=None, cert_file=None, key_file=None):
+    """
+    SSLContext shared by the connections of the process verifying servers
+    the same way and presenting the same client certificate. Loading a CA
+    bundle takes longer than a handshake with a nearby Vault, urllib3 loads
+    it for every connection. A file replaced since gets a new context.
+    """
+    verify_mode = resolve_cert_reqs(cert_reqs)
+    key = (verify_mode, ca_certs, _file_version(ca_certs), ca_cert_dir, _file_version(ca_cert_dir),
+           cert_file, _file_version(cert_file), key_file, _file_version(key_file))
+    with _ssl_contexts_lock:
+        context = _ssl_contexts.get(key)
+        if context is None:
+            context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            context.options |= ssl.OP_NO_COMPRESSION
+            if verify_mode == ssl.CERT_NONE:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            elif ca_certs or ca_cert_dir:
+                context.load_verify_locations(cafile=ca_certs or None, capath=ca_cert_dir or None)
+            else:
+                context.load_default_certs()
+            if cert_file:
+                context.load_cert_chain(cert_file, key_file or None)
+            _ssl_contexts[key] = context
+        return context
+
+
+class _ProfiledHTTPSConnection(HTTPSConnection):
+    """
+    Note how long opening the socket and setting the connection up, TLS
+    handshake included, took. The connection takes its SSLContext from
+    hashivault_ssl_context rather than have urllib3 make one.
+    """
+
+    def _new_conn(self):
+        started = time.time()
+        try:
+            return super(_ProfiledHTTPSConnection, self)._new_conn()
+        finally:
+            _profile_connection(0, started)
+
+    def connect(self):
+        started = time.time()
+        if self.ssl_context is None and not getattr(self, 'ca_cert_data', None) and not self.key_password:
+            self.ssl_context = hashivault_ssl_context(self.cert_reqs, ca_certs=self.ca_certs,
+                                                      ca_cert_dir=self.ca_cert_dir, cert_file=self.cert_file,
+                                                      key_file=self.key_file)
+            # loaded by the context already
+            self.ca_certs = self.ca_cert_dir = self.cert_file = self.key_file = None
+        try:
+            return super(_ProfiledHTTPSConnection, self).connect()
+        finally:
+            _profile_connection(1, started)
+
+
+class _ProfiledHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _ProfiledHTTPConnection
+
+
+class _ProfiledHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _ProfiledHTTPSConnection
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    """HTTP connection to the Unix socket at socket_path, as to a Vault Agent listener."""
+
+    def __init__(self, *args, **kwargs):
+        self.socket_path = kwargs.pop('socket_path')
+        super(_UnixHTTPConnection, self).__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        started = time.time()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error as e:
+            sock.close()
+            raise NewConnectionError(self, 'Failed to connect to %s: %s' % (self.socket_path, e))
+        finally:
+            _profile_connection(0, started)
+        return sock
+
+
+class _UnixHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _UnixHTTPConnection
+
+
+UNIX_SCHEME = 'http+unix://'
+
+
+def hashivault_url(url):
+    """
+    Return url as requests takes it: unix:///path/agent.sock becomes
+    http+unix://%2Fpath%2Fagent.sock, the socket path is the host.
+    """
+    if url and url.startswith('unix://'):
+        return UNIX_SCHEME + quote(url[len('unix://'):], safe='')
+    return url
+
+
+class HashivaultHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter whose connections tell the running VaultProfile how long
+    connecting took. It also sends http+unix:// urls over the Unix socket
+    named by their host, with a pool of connections per socket.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(HashivaultHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _ProfiledHTTPConnectionPool,
+                                                   'https': _ProfiledHTTPSConnectionPool}
+        self._unix_pools = {}
+        self._unix_pools_lock = threading.Lock()
+
+    def _unix_pool(self, url):
+        socket_path = unquote(urlparse(url).netloc)
+        with self._unix_pools_lock:
+            pool = self._unix_pools.get(socket_path)
+            if pool is None:
+                pool = self._unix_pools[socket_path] = _UnixHTTPConnectionPool(
+                    'localhost', maxsize=self._pool_maxsize, block=self._pool_block, socket_path=socket_path)
+            return pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        if request.url.startswith(UNIX_SCHEME):
+            return self._unix_pool(request.url)
+        return super(HashivaultHTTPAdapter, self).get_connection_with_tls_context(request, verify, proxies=proxies,
+                                                                                  cert=cert)
+
+    def get_connection(self, url, proxies=None):
+        # requests < 2.32
+        if url.startswith(UNIX_SCHEME):
+            return self._unix_pool(url)
+        return super(HashivaultHTTPAdapter, self).get_connection(url, proxies=proxies)
+
+    def close(self):
+        super(HashivaultHTTPAdapter, self).close()
+        with self._unix_pools_lock:
+            for pool in self._unix_pools.values():
+                pool.close()
+            self._unix_pools.clear()
+
+
+PATH_KEYWORDS = frozenset([
+    'accessors', 'acl', 'attempt', 'audit', 'auth', 'ca', 'ca_chain', 'capabilities-self', 'cert', 'certs',
+    'config', 'connection', 'create', 'create-orphan', 'creds', 'crl', 'data', 'delete', 'destroy', 'entity',
+    'entity-alias', 'generate', 'generate-root', 'group', 'group-alias', 'groups', 'ha-status', 'health', 'id',
+    'identity', 'init', 'intermediate', 'issue', 'keys', 'leader', 'leases', 'login', 'lookup', 'lookup-accessor',
+    'lookup-self', 'metadata', 'mounts', 'name', 'namespaces', 'policies', 'policy', 'rekey', 'renew', 'renew-self',
+    'reset', 'revoke', 'revoke-self', 'role', 'role-id', 'roles', 'root', 'rotate', 'rotate-root', 'seal',
+    'seal-status', 'secret-id', 'secret-id-accessor', 'set-signed', 'sign', 'sign-verbatim', 'static-roles',
+    'subkeys', 'sys', 'tidy', 'token', 'tune', 'undelete', 'unseal', 'update', 'urls', 'users', 'verify',
+    'wrapping',
+])
+
+
+def hashivault_path_template(url):
+    """
+    Return the API path of url with every segment that is neither the mount
+    nor a known API word replaced by *, and without the query string, so it
+    can be shown without the names of secrets, users or roles in it.
+    """
+    path = requests.utils.urlparse(url).path
+    if path.startswith('/v1/'):
+        path = path[len('/v1/'):]
+    segments = path.strip('/').split('/')
+    keep = 2 if segments[0] == 'auth' else 1
+    template = []
+    for i, segment in enumerate(segments):
+        if i >= keep and segment not in PATH_KEYWORDS:
+            segment = '*'
+            if template and template[-1] == '*':
+                continue
+        template.append(segment)
+    return '/'.join(template)
+
+
+_profile = None
+
+
+class VaultProfile(object):
+    """
+    Requests sent and time spent by a module run while profile is set. Every
+    response of a hashivault_session is recorded with its connect, TLS and
+    server time. The server time is what is left of the latency once the
+    connection is set up, it includes sending the request and reading the
+    response. Login, state comparison and any other timer started with
+    hashivault_profiled add up under their name.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.retries = hashivault_request_stats()['retries']
+        self.lock = threading.Lock()
+        self.requests = []
+        self.timers = OrderedDict((('login', 0.0), ('compare', 0.0)))
+
+    def record(self, response):
+        connect, setup = getattr(_thread_stats, 'connection', None) or (0.0, 0.0)
+        _thread_stats.connection = None
+        started = time.time()
+        received = len(response.content or b'')
+        total = response.elapsed.total_seconds() + time.time() - started
+        body = response.request.body or b''
+        entry = OrderedDict((
+            ('method', response.request.method),
+            ('path', hashivault_path_template(response.request.url)),
+            ('status', response.status_code),
+            ('bytes_sent', len(body.encode('utf-8') if not isinstance(body, bytes) else body)),
+            ('bytes_received', received),
+            ('connect', round(connect, 6)),
+            ('tls', round(max(setup - connect, 0.0), 6)),
+            ('server', round(max(total - max(setup, connect), 0.0), 6)),
+            ('total', round(total, 6)),
+        ))
+        with self.lock:
+            self.requests.append(entry)
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def report(self):
+        with self.lock:
+            report = OrderedDict(total_time=round(time.time() - self.started, 6),
+                                 import_time=round(_import_time, 6))
+            for name, seconds in self.timers.items():
+                report[name + '_time'] = round(seconds, 6)
+            report['request_count'] = len(self.requests)
+            report['request_time'] = round(sum(entry['total'] for entry in self.requests), 6)
+            report['retries'] = hashivault_request_stats()['retries'] - self.retries
+            report['requests'] = list(self.requests)
+            return report
+
+
+@contextlib.contextmanager
+def hashivault_profiling(enabled=True):
+    """
+    Profile the requests sent in the block and yield the VaultProfile, or
+    None when not enabled or when an outer block is already profiling.
+    """
+    global _profile
+    if not enabled or _profile is not None:
+        yield None
+        return
+    profile = _profile = VaultProfile()
+    try:
+        yield profile
+    finally:
+        _profile = None
+
+
+def _profile_connection(index, started):
+    if _profile is None:
+        return
+    timings = list(getattr(_thread_stats, 'connection', None) or (0.0, 0.0))
+    timings[index] += time.time() - started
+    _thread_stats.connection = timings
+
+
+def _profile_response(response, *args, **kwargs):
+    profile = _profile
+    if profile is not None:
+        profile.record(response)
+    return response
+
+
+@contextlib.contextmanager
+def hashivault_timer(name):
+    """Add the time spent in the block to name in the running VaultProfile, once when nested."""
+    profile = _profile
+    active = getattr(_thread_stats, 'timers', None)
+    if active is None:
+        active = _thread_stats.timers = set()
+    if profile is None or name in active:
+        yield
+        return
+    active.add(name)
+    started = time.time()
+    try:
+        yield
+    finally:
+        active.discard(name)
+        profile.add(name, time.time() - started)
+
+
+def hashivault_profiled(name):
+    """Decorator timing every call of the function with hashivault_timer(name)."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return function(*args, **kwargs)
+            with hashivault_timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+IDEMPOTENT_METHODS = ('get', 'list', 'head', 'delete')
+
+_request_stats = {'retries': 0, 'overloads': 0}
+_request_stats_lock = threading.Lock()
+_thread_stats = threading.local()
+
+
+def hashivault_request_stats():
+    """Copy of the counters kept by every HashivaultAdapter of the process."""
+    with _request_stats_lock:
+        return dict(_request_stats)
+
+
+def hashivault_retryable(method, e):
+    """
+    Tell whether a request that failed with e may be sent again. Rate limits,
+    sealed or standby nodes, stale reads and refused connections were not acted
+    upon and are always retried. Other server and connection errors are only
+    retried for methods that can safely be repeated.
+    """
+    if isinstance(e, (RateLimitExceeded, VaultDown, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args and isinstance(
+            getattr(e.args[0], 'reason', None), NewConnectionError):
+        return True
+    if getattr(e, 'status_code', None) == 412:
+        return True
+    if method.lower() not in IDEMPOTENT_METHODS:
+        return False
+    if isinstance(e, (InternalServerError, BadGateway)) or getattr(e, 'status_code', None) == 504:
+        return True
+    return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def hashivault_overloaded(e):
+    """Tell whether a request failed because vault is overloaded, rate limited or unavailable."""
+    if isinstance(e, (RateLimitExceeded, VaultDown, InternalServerError, BadGateway)):
+        return True
+    return getattr(e, 'status_code', None) == 504
+
+
+def _retry_after(e):
+    try:
+        return max(float(getattr(e, 'retry_after', None)), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HashivaultAdapter(JSONAdapter):
+    """
+    hvac adapter used by every client built by hashivault_client. If the token
+    is rejected and a relogin callback has been set, the callback is called once
+    to get a fresh token and the request is retried. A 403 only counts as a
+    rejected token once auth/token/lookup-self is refused too, otherwise the
+    token lacks a capability and a new one would not have it either. With an
+    ensure_token callback set, it is called before every request is sent, so
+    the token can be renewed or replaced and its uses counted. Requests failing with an
+    error hashivault_retryable accepts are sent again up to retries times after
+    an exponential backoff with full jitter, or after the Retry-After the server
+    asked for, unless that would go past the deadline. With a router every
+    request is sent to the node the NodeRouter picks for it. With consistency
+    set to (IndexState, key, mode) the X-Vault-Index returned by writes is
+    kept under key and sent with later reads, so a performance standby only
+    answers once it has caught up with them, or forwards the read to the
+    active node when mode is forward.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super(HashivaultAdapter, self).__init__(*args, **kwargs)
+        self.relogin = None
+        self.ensure_token = None
+        self.retries = 0
+        self.retry_backoff = 0.5
+        self.deadline = None
+        self.router = None
+        self.consistency = None
+
+    @property
+    def base_uri(self):
+        return getattr(self._local, 'base_uri', None) or self._base_uri
+
+    @base_uri.setter
+    def base_uri(self, base_uri):
+        self._base_uri = base_uri
+
+    def _raise_for_error(self, method, url, response):
+        try:
+            super(HashivaultAdapter, self)._raise_for_error(method, url, response)
+        except VaultError as e:
+            e.status_code = response.status_code
+            e.retry_after = response.headers.get('Retry-After')
+            raise
+
+    def request(self, method, url, headers=None, raise_exception=True, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return self._request(method, url, headers=headers, raise_exception=raise_exception, **kwargs)
+            except Exception as e:
+                if hashivault_overloaded(e):
+                    with _request_stats_lock:
+                        _request_stats['overloads'] += 1
+                    _thread_stats.overloads = getattr(_thread_stats, 'overloads', 0) + 1
+                    _thread_stats.overload = e.__class__.__name__
+                if attempt >= self.retries or not hashivault_retryable(method, e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = hashivault_backoff(attempt, base=self.retry_backoff)
+                if self.deadline is not None and time.time() + delay > self.deadline:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                with _request_stats_lock:
+                    _request_stats['retries'] += 1
+
+    def _request(self, method, url, headers=None, raise_exception=True, **kwargs):
+        try:
+            return self._send(method, url, headers=headers, raise_exception=raise_exception, **kwargs)
+        except Forbidden:
+            relogin = self.relogin
+            if relogin is None or not self._token_rejected():
+                raise
+            self.relogin = None
+            relogin()
+            return self._send(method, url, headers=headers, raise_exception=raise_exception, **kwargs)
+
+    def _token_rejected(self):
+        try:
+            self._send('get', '/v1/auth/token/lookup-self')
+        except Forbidden:
+            return True
+        except Exception:
+            pass
+        return False
+
+    def _send(self, method, url, headers=None, raise_exception=True, **kwargs):
+        if self.ensure_token is not None:
+            self.ensure_token()
+        router = self.router
+        node = router.pick(method, token=self.token) if router else None
+        consistency = self.consistency
+        if consistency and method.lower() in READ_METHODS:
+            index_state, key, mode = consistency
+            state = index_state.get(key)
+            if state:
+                headers = dict(headers or {})
+                headers['X-Vault-Index'] = state
+                if mode == 'forward':
+                    headers['X-Vault-Inconsistent'] = 'forward-active-node'
+        self._local.base_uri = node
+        try:
+            response = RawAdapter.request(self, method, url, headers=headers, raise_exception=raise_exception,
+                                          **kwargs)
+        except Exception as e:
+            if node and hashivault_node_failure(e):
+                router.failure(node)
+            raise
+        finally:
+            self._local.base_uri = None
+        if node:
+            router.success(node)
+        if consistency and method.lower() not in READ_METHODS and response.headers.get('X-Vault-Index'):
+            consistency[0].put(consistency[1], response.headers['X-Vault-Index'])
+        # what JSONAdapter.request does with the response
+        if response.status_code == 200:
+            try:
+                return response.json()
+            except ValueError:
+                pass
+        return response
+
+
+READ_METHODS = ('get', 'list', 'head')
+
+
+def hashivault_node_failure(e):
+    """Tell whether a request failed because of the node it was sent to rather than because of the request."""
+    if isinstance(e, (VaultDown, BadGateway, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return getattr(e, 'status_code', None) == 504
+
+
+class NodeRouter(object):
+    """
+    Picks the vault node of a cluster every request goes to. Writes go to the
+    active node, reads are spread round robin over the active node and the
+    performance standbys; plain standbys only forward and are not used. The
+    role of each node comes from its unauthenticated sys/health. With discover
+    the cluster is asked for its nodes, through sys/ha-status when the token
+    allows it and otherwise sys/leader, on top of the nodes given.
+
+    A node a request failed on is ejected for cooldown seconds, doubled on
+    every failure up to max_cooldown, and probed again through sys/health
+    before it gets requests back. Roles are probed again every refresh
+    seconds, or sooner when no active node is known. One thread probes at a
+    time and without holding the lock, the others keep sending requests to the
+    nodes already known meanwhile.
+    """
+
+    def __init__(self, nodes, session, verify=True, cert=None, timeout=30, discover=False, cooldown=5,
+                 max_cooldown=300, refresh=60):
+        self.nodes = list(nodes)
+        self.session = session
+        self.verify = verify
+        self.cert = cert
+        self.timeout = timeout
+        self.discover = discover
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.refresh_interval = refresh
+        self.active = None
+        self.readers = []
+        self.ejected = {}
+        self.probed_at = None
+        self.counter = 0
+        self.routed = {}
+        self.lock = threading.Lock()
+        self.probe_lock = threading.Lock()
+
+    def _get(self, node, path, token=None, params=None):
+        headers = {'X-Vault-Token': token} if token else {}
+        return self.session.get(node + '/v1/' + path, headers=headers, params=params, verify=self.verify,
+                                cert=self.cert, timeout=self.timeout)
+
+    def _role(self, node):
+        try:
+            status_code = self._get(node, 'sys/health').status_code
+        except requests.exceptions.RequestException:
+            return None
+        return {200: 'active', 473: 'performance_standby', 429: 'standby'}.get(status_code)
+
+    def _discover(self, token, nodes):
+        found = []
+        for node in nodes:
+            try:
+                response = self._get(node, 'sys/ha-status', token=token)
+                if response.status_code == 200:
+                    found = [n.get('api_address') for n in response.json().get('data', response.json()).get(
+                        'nodes', [])]
+                    break
+                response = self._get(node, 'sys/leader')
+                if response.status_code == 200:
+                    found = [response.json().get('leader_address')]
+                    break
+            except (requests.exceptions.RequestException, ValueError):
+                continue
+        return [(node or '').rstrip('/') for node in found]
+
+    def _refresh(self, token):
+        with self.lock:
+            nodes = list(self.nodes)
+        if self.discover:
+            found = self._discover(token, nodes)
+            with self.lock:
+                for node in found:
+                    if node and node not in self.nodes:
+                        self.nodes.append(node)
+                nodes = list(self.nodes)
+        with self.lock:
+            ejected = set(self.ejected)
+        roles = dict((node, self._role(node)) for node in nodes if node not in ejected)
+        with self.lock:
+            active = None
+            readers = []
+            for node in nodes:
+                if node not in roles:
+                    continue
+                role = roles[node]
+                if role is None:
+                    self._eject(node)
+                elif role == 'active':
+                    active = node
+                    readers.append(node)
+                elif role == 'performance_standby':
+                    readers.append(node)
+            self.active = active
+            self.readers = readers
+            self.probed_at = time.time()
+
+    def _eject(self, node):
+        cooldown = min(self.ejected[node][1] * 2, self.max_cooldown) if node in self.ejected else self.cooldown
+        self.ejected[node] = (time.time() + cooldown, cooldown)
+
+    def _reprobe(self, due):
+        roles = dict((node, self._role(node)) for node in due)
+        with self.lock:
+            for node, role in roles.items():
+                if role is None:
+                    self._eject(node)
+                    continue
+                self.ejected.pop(node, None)
+                if role == 'active':
+                    self.active = node
+                if role in ('active', 'performance_standby') and node not in self.readers:
+                    self.readers.append(node)
+
+    def _probe(self, token):
+        """Probe the nodes due for it, outside self.lock so requests to known nodes go on meanwhile."""
+        with self.lock:
+            now = time.time()
+            due = [node for node, (until, cooldown) in self.ejected.items() if until <= now]
+            stale = self.probed_at is None or now - self.probed_at > self.refresh_interval
+            refresh = stale or (self.active is None and now - self.probed_at > self.cooldown)
+        if due:
+            self._reprobe(due)
+        if refresh:
+            self._refresh(token)
+
+    def pick(self, method, token=None):
+        """Node to send a request with method to."""
+        # one thread probes at a time, the others use what is known unless nothing is yet
+        if self.probe_lock.acquire(self.probed_at is None):
+            try:
+                self._probe(token)
+            finally:
+                self.probe_lock.release()
+        with self.lock:
+            node = None
+            if method.lower() in READ_METHODS and self.readers:
+                node = self.readers[self.counter % len(self.readers)]
+                self.counter += 1
+            node = node or self.active or self.nodes[0]
+            self.routed[node] = self.routed.get(node, 0) + 1
+            return node
+
+    def failure(self, node):
+        """Eject node after a request failed because of it."""
+        with self.lock:
+            self._eject(node)
+            if node in self.readers:
+                self.readers.remove(node)
+            if node == self.active:
+                self.active = None
+
+    def success(self, node):
+        with self.lock:
+            if node in self.ejected:
+                del self.ejected[node]
+
+    def report(self):
+        with self.lock:
+            return dict(active=self.active, readers=list(self.readers), ejected=sorted(self.ejected),
+                        routed=dict(self.routed))
+
+
+class IndexState(object):
+    """
+    Last X-Vault-Index returned by a write to each vault, kept in a file on the
+    controller so the reads of later tasks can ask for a node that has seen
+    the writes of earlier ones. States older than ttl are dropped: they are
+    only useful right after the write and a state from a vault that has since
+    been rebuilt would never be satisfied.
+    """
+
+    def __init__(self, path, ttl=3600):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.states = None
+        self.lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                states = json.load(f)
+        except Exception:
+            return {}
+        now = time.time()
+        return dict((k, v) for k, v in states.items() if v.get('time', 0) + self.ttl > now)
+
+    def get(self, key):
+        with self.lock:
+            if self.states is None:
+                self.states = self._read()
+            entry = self.states.get(key)
+        if entry and entry['time'] + self.ttl > time.time():
+            return entry['state']
+        return None
+
+    def put(self, key, state):
+        entry = dict(state=state, time=time.time())
+        with self.lock:
+            fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self.states = self._read()
+                self.states[key] = entry
+                tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.')
+                with os.fdopen(tmp_fd, 'w') as f:
+                    json.dump(self.states, f)
+                os.rename(tmp_path, self.path)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+_index_states = {}
+_index_states_lock = threading.Lock()
+
+
+def hashivault_index_state(path):
+    """IndexState shared by every client of the process using path."""
+    with _index_states_lock:
+        if path not in _index_states:
+            _index_states[path] = IndexState(path)
+        return _index_states[path]
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def hashivault_router(nodes, session, verify=True, cert=None, timeout=30, discover=False):
+    """NodeRouter shared by every client of the process for the same nodes, so the cluster is probed once."""
+    key = (tuple(nodes), discover, str(verify), tuple(cert or ()), id(session))
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = NodeRouter(nodes, session, verify=verify, cert=cert, timeout=timeout,
+                                                discover=discover)
+        return router
+
+
+def _forget_connections():
+    """
+    Drop the sessions and routers inherited from the parent in a forked child,
+    the hashivault action plugin runs modules in the workers ansible forks and
+    the broker is forked by a module, so sockets must not be shared with the
+    parent nor the other workers. The read cache is emptied too, the parent
+    does not see the writes of its children and would hand a later fork
+    secrets they have since changed. SSL contexts and their TLS sessions are
+    kept. Locks are made anew, another thread of the parent may have held one
+    when it forked.
+    """
+    global _sessions_lock, _routers_lock, _request_stats_lock, _index_states_lock, _ssl_contexts_lock
+    _sessions_lock = threading.Lock()
+    _ssl_contexts_lock = threading.Lock()
+    for context in _ssl_contexts.values():
+        context.tls_sessions_lock = threading.Lock()
+    _routers_lock = threading.Lock()
+    _request_stats_lock = threading.Lock()
+    _index_states_lock = threading.Lock()
+    hashivault_read_cache.lock = threading.Lock()
+    hashivault_read_cache.clear()
+    _sessions.clear()
+    _routers.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_connections)
+
+
+def _token_lifetime(auth, refresh_ratio=0.8):
+    """Return when a token from a login or renew auth block should be refreshed and when it expires."""
+    now = time.time()
+    lease_duration = auth.get('lease_duration') or 0
+    if lease_duration > 0:
+        return now + lease_duration * refresh_ratio, now + lease_duration
+    return float('inf'), float('inf')
+
+
+class TokenCache(object):
+    """
+    Encrypted on disk cache of login tokens shared by module invocations on the
+    controller. Entries are keyed by a digest of the vault url, namespace, auth
+    type, login mount point, principal and credentials. The file is encrypted
+    with a key from `VAULT_TOKEN_CACHE_KEY` or, when that is not set, a random
+    key kept next to the cache. Both files are only readable by the owner, so
+    without `VAULT_TOKEN_CACHE_KEY` the encryption protects no more than that.
+    """
+
+    def __init__(self, path):
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise Exception('token_cache requires the cryptography python library')
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700)
+        self.fernet = Fernet(self._load_key())
+
+    def _load_key(self):
+        passphrase = os.environ.get('VAULT_TOKEN_CACHE_KEY')
+        if passphrase:
+            return base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode('utf-8')).digest())
+        from cryptography.fernet import Fernet
+        key_path = self.path + '.key'
+        if not os.path.exists(key_path):
+            # written aside and linked into place, so a run starting at the same
+            # time never reads a partly written key, the first link wins
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(key_path) or '.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(Fernet.generate_key())
+                try:
+                    os.link(tmp_path, key_path)
+                except FileExistsError:
+                    pass
+            finally:
+                os.unlink(tmp_path)
+        with open(key_path, 'rb') as f:
+            return f.read().strip()
+
+    def _locked(self):
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlock(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()).decode('utf-8'))
+        except Exception:
+            return {}
+
+    def _write(self, entries):
+        now = time.time()
+        entries = dict((k, v) for k, v in entries.items() if v.get('expires_at', 0) > now)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(entries).encode('utf-8')))
+        os.chmod(tmp_path, 0o600)
+        os.rename(tmp_path, self.path)
+
+    def get(self, key):
+        entry = self._read().get(key)
+        if entry and entry.get('expires_at', 0) > time.time():
+            return entry
+        return None
+
+    def put(self, key, auth):
+        refresh_at, expires_at = _token_lifetime(auth)
+        entry = dict(client_token=auth['client_token'], renewable=bool(auth.get('renewable')),
+                     refresh_at=refresh_at, expires_at=expires_at)
+        fd = self._locked()
+        try:
+            entries = self._read()
+            entries[key] = entry
+            self._write(entries)
+        finally:
+            self._unlock(fd)
+        return entry
+
+    def delete(self, key):
+        fd = self._locked()
+        try:
+            entries = self._read()
+            if entries.pop(key, None) is not None:
+                self._write(entries)
+        finally:
+            self._unlock(fd)
+
+
+def hashivault_token_cache_key(params):
+    authtype = params.get('authtype')
+    login_mount_point = params.get('login_mount_point') or authtype
+    if authtype in ('userpass', 'ldap', 'radius'):
+        principal = params.get('username')
+        credential = params.get('password')
+    elif authtype == 'approle':
+        principal = params.get('role_id')
+        credential = params.get('secret_id')
+    elif authtype == 'github':
+        principal = ''
+        credential = params.get('token')
+    elif authtype == 'tls':
+        principal = params.get('client_cert')
+        credential = params.get('client_key')
+    elif authtype == 'aws':
+        principal = params.get('role_id')
+        credential = params.get('aws_header')
+    else:
+        return None
+    identity = [params.get('url'), params.get('namespace'), authtype, login_mount_point, principal,
+                hashlib.sha256((credential or '').encode('utf-8')).hexdigest()]
+    return hashlib.sha256(json.dumps(identity).encode('utf-8')).hexdigest()
+
+
+def hashivault_identity(params):
+    """Return a digest identifying who the params authenticate as, including the vault url and namespace."""
+    key = hashivault_token_cache_key(params)
+    if key is None:
+        identity = [params.get('url'), params.get('namespace'),
+                    hashlib.sha256((params.get('token') or '').encode('utf-8')).hexdigest()]
+        key = hashlib.sha256(json.dumps(identity).encode('utf-8')).hexdigest()
+    return key
+
+
+@hashivault_profiled('login')
+def _hashivault_login(client, params):
+    """Log in with the configured auth method and return the auth block of the response, if any."""
     token = params.get('token')
     authtype = params.get('authtype')
     login_mount_point = params.get('login_mount_point', authtype)
@@ -122,26 +1226,90 @@ def hashivault_auth(client, params):
         login_mount_point = authtype
     username = params.get('username')
     password = params.get('password')
-    secret_id = params.get('secret_id')
     role_id = params.get('role_id')
 
     if authtype == 'github':
-        client.auth.github.login(token, mount_point=login_mount_point)
+        response = client.auth.github.login(token, mount_point=login_mount_point)
     elif authtype == 'userpass':
-        client.auth.userpass.login(username, password, mount_point=login_mount_point)
+        response = client.auth.userpass.login(username, password, mount_point=login_mount_point)
     elif authtype == 'ldap':
-        client.auth.ldap.login(username, password, mount_point=login_mount_point)
+        response = client.auth.ldap.login(username, password, mount_point=login_mount_point)
     elif authtype == 'radius':
-        client.auth.radius.login(username, password, mount_point=login_mount_point)
-    elif authtype == 'approle':
-        client = AppRoleClient(client, role_id, secret_id, mount_point=login_mount_point)
+        response = client.auth.radius.login(username, password, mount_point=login_mount_point)
     elif authtype == 'tls':
-        client.auth.cert.login()
+        response = client.auth.cert.login()
     elif authtype == 'aws':
-        credentials = get_ec2_iam_credentials(params.get['aws_header'], role_id)
-        client.auth_aws_iam(**credentials)
+        credentials = get_ec2_iam_credentials(params.get('aws_header'), role_id)
+        response = client.auth_aws_iam(**credentials)
+    elif authtype == 'agent':
+        # requests without a token get the auto-auth token of the Vault Agent
+        client.token = None
+        response = None
     else:
         client.token = token
+        response = None
+    if isinstance(response, dict):
+        return response.get('auth')
+    return None
+
+
+@hashivault_profiled('login')
+def hashivault_auth(client, params):
+    if params.get('broker'):
+        return _hashivault_broker_auth(client, params)
+    authtype = params.get('authtype')
+    login_mount_point = params.get('login_mount_point', authtype)
+    if not login_mount_point:
+        login_mount_point = authtype
+    secret_id = params.get('secret_id')
+    role_id = params.get('role_id')
+
+    cache_key = None
+    if params.get('token_cache'):
+        cache_key = hashivault_token_cache_key(params)
+    if cache_key is None:
+        if authtype == 'approle':
+            client = AppRoleClient(client, role_id, secret_id, mount_point=login_mount_point)
+            object.__getattribute__(client, 'client').adapter.relogin = object.__getattribute__(client, '_login')
+            return client
+        _hashivault_login(client, params)
+        return client
+
+    cache = TokenCache(params.get('token_cache_path'))
+
+    def store(auth):
+        if auth and auth.get('client_token') and not auth.get('num_uses'):
+            cache.put(cache_key, auth)
+
+    if authtype == 'approle':
+        client = AppRoleClient(client, role_id, secret_id, mount_point=login_mount_point, on_token=store)
+        real_client = object.__getattribute__(client, 'client')
+    else:
+        real_client = client
+
+    def relogin():
+        cache.delete(cache_key)
+        if authtype == 'approle':
+            object.__getattribute__(client, '_login')()
+        else:
+            store(_hashivault_login(real_client, params))
+
+    entry = cache.get(cache_key)
+    if entry is None:
+        relogin()
+    else:
+        real_client.token = entry['client_token']
+        if authtype == 'approle':
+            object.__getattribute__(client, '_seed')(entry)
+        elif time.time() >= entry['refresh_at']:
+            try:
+                if entry['renewable']:
+                    store(real_client.auth.token.renew_self()['auth'])
+                else:
+                    relogin()
+            except Forbidden:
+                relogin()
+    real_client.adapter.relogin = relogin
     return client
 
 
@@ -150,10 +1318,141 @@ def hashivault_auth_client(params):
     return hashivault_auth(client, params)
 
 
+def hashivault_lazy_client(params):
+    """Return a function giving one client authenticated on first use and shared by every caller."""
+    clients = []
+    lock = threading.Lock()
+
+    def get_client():
+        with lock:
+            if not clients:
+                clients.append(hashivault_auth_client(params))
+            return clients[0]
+    return get_client
+
+
+class AdaptiveConcurrency(object):
+    """
+    AIMD limit on the number of calls in flight. The limit starts at initial
+    and doubles after every window of calls that went well until the first
+    sign of overload, then grows by one per window. It is halved, once per
+    window, when a request of a call was rate limited or hit an overloaded or
+    unavailable node, or when the p95 latency of a window is more than
+    latency_tolerance times the best p95 seen so far. Changes of the limit and
+    the reason for every decrease are kept for report().
+    """
+
+    def __init__(self, maximum=8, minimum=1, initial=4, decrease=0.5, latency_tolerance=2.0):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.limit = float(min(initial, self.maximum))
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.slow_start = True
+        self.in_flight = 0
+        self.epoch = 0
+        self.latencies = []
+        self.best_p95 = None
+        self.start = time.time()
+        self.timeline = [dict(time=0.0, concurrency=int(self.limit))]
+        self.throttles = []
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            return self.epoch
+
+    def release(self, epoch, latency, overload=None):
+        with self.condition:
+            self.in_flight -= 1
+            if overload:
+                if epoch == self.epoch:
+                    self._decrease(overload)
+            elif epoch == self.epoch:
+                self.latencies.append(latency)
+                if len(self.latencies) >= max(int(self.limit), 8):
+                    self._end_window()
+            self.condition.notify_all()
+
+    def _end_window(self):
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.latencies = []
+        if self.best_p95 is not None and p95 > self.best_p95 * self.latency_tolerance:
+            self._decrease('latency')
+            return
+        self.best_p95 = p95 if self.best_p95 is None else min(self.best_p95, p95)
+        if self.slow_start:
+            self._set_limit(self.limit * 2)
+        else:
+            self._set_limit(self.limit + 1)
+
+    def _decrease(self, reason):
+        self.slow_start = False
+        self.epoch += 1
+        self.latencies = []
+        self._set_limit(self.limit * self.decrease)
+        self.throttles.append(dict(time=round(time.time() - self.start, 3), reason=reason,
+                                   concurrency=int(self.limit)))
+
+    def _set_limit(self, limit):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if int(limit) != int(self.limit):
+            self.timeline.append(dict(time=round(time.time() - self.start, 3), concurrency=int(limit)))
+        self.limit = limit
+
+    def call(self, function, item):
+        """Call function on item once a slot is free and learn from how it went."""
+        epoch = self.acquire()
+        overloads = getattr(_thread_stats, 'overloads', 0)
+        start = time.time()
+        try:
+            return function(item)
+        finally:
+            overload = None
+            if getattr(_thread_stats, 'overloads', 0) != overloads:
+                overload = _thread_stats.overload
+            self.release(epoch, time.time() - start, overload)
+
+    def report(self):
+        with self.condition:
+            return dict(max_concurrency=max(entry['concurrency'] for entry in self.timeline),
+                        final_concurrency=int(self.limit), timeline=list(self.timeline),
+                        throttles=list(self.throttles))
+
+
+def hashivault_map(function, items, concurrency=8, controller=None):
+    """
+    Call function on every item with at most concurrency calls in flight,
+    fewer while an AdaptiveConcurrency controller sees vault struggle.
+    Results are returned in item order.
+    """
+    items = list(items)
+    if concurrency is None or concurrency <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    if controller is None:
+        controller = AdaptiveConcurrency(maximum=concurrency)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+        return list(executor.map(lambda item: controller.call(function, item), items))
+
+
 def hashiwrapper(function):
     def wrapper(*args, **kwargs):
         result = {"changed": False, "rc": 0}
-        result.update(function(*args, **kwargs))
+        params = getattr(args[0], 'params', args[0]) if args else {}
+        enabled = isinstance(params, dict) and bool(params.get('profile'))
+        with hashivault_profiling(enabled) as profile:
+            retries = hashivault_request_stats()['retries']
+            result.update(function(*args, **kwargs))
+            retries = hashivault_request_stats()['retries'] - retries
+        if retries:
+            result['request_retries'] = retries
+        if profile is not None:
+            result['vault_profile'] = profile.report()
         return result
     return wrapper
 
@@ -169,10 +1468,827 @@ def hashivault_default_token():
     return ''
 
 
+def _cache_ttl(response, max_age):
+    lease_duration = response.get('lease_duration') or 0
+    return min(lease_duration, max_age) if lease_duration > 0 else max_age
+
+
+def _cache_aged(response, stored_at):
+    """Take the seconds response spent in a cache off its lease_duration."""
+    if response.get('lease_duration'):
+        response['lease_duration'] = max(0, response['lease_duration'] - int(time.time() - stored_at))
+    return response
+
+
+class ReadCache(object):
+    """
+    In process LRU cache of secret read responses bounded by entry count and
+    size. Entries live for the lease_duration returned by Vault, capped by the
+    max age asked for by the caller, and a hit returns what is left of it.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return _cache_aged(copy.deepcopy(entry[2]), entry[3])
+
+    def put(self, key, response, max_age):
+        ttl = _cache_ttl(response, max_age)
+        if ttl <= 0:
+            return
+        size = len(json.dumps(response, default=str))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            now = time.time()
+            self.entries[key] = (now + ttl, size, copy.deepcopy(response), now)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, url, namespace, mount_point, path):
+        """Forget every cached version of a secret, whoever read it."""
+        with self.lock:
+            for key in [k for k in self.entries if k[1:5] == (url, namespace, mount_point, path)]:
+                self._remove(key)
+
+    def clear(self):
+        """Forget every cached secret."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        self.bytes -= self.entries.pop(key)[1]
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, entries=len(self.entries), bytes=self.bytes)
+
+
+@hashiwrapper
+def hashivault_read_secrets(params):
+    """
+    Read every item of params['secrets'] over one client with at most concurrency reads in flight. Items inherit
+    version, mount_point, default and the connection options from params.
+    """
+    secrets = params.get('secrets')
+    fail_fast = params.get('fail_fast')
+    get_client = hashivault_lazy_client(params)
+    stop = threading.Event()
+    base_params = dict(params)
+    base_params.pop('secrets', None)
+
+    def read(item):
+        if stop.is_set():
+            return {'failed': True, 'msg': u"Skipped after an earlier failure"}
+        item_params = dict(base_params)
+        for option, value in item.items():
+            if option != 'name' and value is not None:
+                item_params[option] = value
+        try:
+            item_result = hashivault_read(item_params, client=get_client)
+        except Exception as e:
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            item_result = {'failed': True, 'msg': u"Error %s reading %s" % (error_string, item['secret'])}
+        if item_result.get('failed') and fail_fast:
+            stop.set()
+        return item_result
+
+    controller = AdaptiveConcurrency(maximum=params.get('concurrency') or 1)
+    results = hashivault_map(read, secrets, concurrency=params.get('concurrency'), controller=controller)
+    values = {}
+    failures = {}
+    for item, item_result in zip(secrets, results):
+        name = item.get('name') or item['secret']
+        if item_result.get('failed'):
+            failures[name] = item_result.get('msg')
+        else:
+            values[name] = item_result['value']
+    result = {"changed": False, "rc": 0, "value": values, "scheduler": controller.report()}
+    if failures:
+        result['rc'] = 1
+        result['failed'] = True
+        result['failures'] = failures
+        result['msg'] = u"Error reading %d of %d secrets" % (len(failures), len(secrets))
+    return result
+
+
+def hashivault_kv2_patch(client, path, data, mount_point='secret', cas=None):
+    """
+    Merge data into an existing kv version 2 secret with one JSON merge patch
+    request instead of reading and writing the whole secret. Keys set to None
+    are removed. Raises KV2PatchUnsupported when the server, the mount, the
+    token policy or a missing secret does not allow a patch.
+    """
+    params = {'data': data}
+    if cas is not None:
+        params['options'] = {'cas': cas}
+    api_path = '/v1/{mount_point}/data/{path}'.format(mount_point=mount_point, path=path)
+    try:
+        return client.adapter.request('patch', api_path, json=params,
+                                      headers={'Content-Type': 'application/merge-patch+json'})
+    except (UnexpectedError, Forbidden, InvalidPath) as e:
+        raise KV2PatchUnsupported("%s(%s)" % (e.__class__.__name__, e))
+
+
+class KV2PatchUnsupported(Exception):
+    pass
+
+
+def hashivault_cas_conflict(e):
+    """Tell whether a kv version 2 write failed because cas did not match the current version."""
+    return isinstance(e, InvalidRequest) and 'check-and-set' in str(e)
+
+
+def hashivault_backoff(attempt, base=0.1, cap=5.0):
+    """Seconds to wait before retry attempt (0 based), exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+FINGERPRINT_METADATA_KEY = 'ansible_hashivault_fingerprint'
+
+
+def hashivault_fingerprint(data, state='present'):
+    """Hash of the data a task writes and of whether it overwrites or overlays it."""
+    content = json.dumps({'state': state, 'data': data}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def hashivault_kv2_metadata(client, path, mount_point='secret'):
+    """Read the metadata of a kv version 2 secret, None when there is none."""
+    try:
+        return client.secrets.kv.v2.read_secret_metadata(path, mount_point=mount_point).get('data') or {}
+    except InvalidPath:
+        return None
+
+
+def hashivault_kv2_fingerprint_matches(metadata, fingerprint):
+    """
+    Tell from the metadata alone whether the current version of a secret was
+    written with fingerprint. The fingerprint is stored with the version it
+    was written as, so a write by anything else invalidates it.
+    """
+    if not metadata:
+        return False
+    version = metadata.get('current_version')
+    version_info = (metadata.get('versions') or {}).get(str(version)) or {}
+    if version_info.get('deletion_time') or version_info.get('destroyed'):
+        return False
+    stored = (metadata.get('custom_metadata') or {}).get(FINGERPRINT_METADATA_KEY)
+    return stored == '%s:%s' % (version, fingerprint)
+
+
+def hashivault_kv2_store_fingerprint(client, path, fingerprint, version, mount_point='secret', metadata=None):
+    """
+    Record fingerprint for version of a kv version 2 secret in its
+    custom_metadata, keeping the other custom_metadata keys.
+    """
+    custom_metadata = dict((metadata or {}).get('custom_metadata') or {})
+    custom_metadata[FINGERPRINT_METADATA_KEY] = '%s:%s' % (version, fingerprint)
+    api_path = '/v1/{mount_point}/metadata/{path}'.format(mount_point=mount_point, path=path)
+    return client.adapter.post(api_path, json={'custom_metadata': custom_metadata})
+
+
+def hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint, response, metadata, result):
+    """
+    Record the fingerprint of the version in response, the one just written
+    or compared, a failure only adds a warning to result.
+    """
+    version = ((response or {}).get('data') or {}).get('version')
+    if not version:
+        return
+    try:
+        hashivault_kv2_store_fingerprint(client, secret, fingerprint, version, mount_point=mount_point,
+                                         metadata=metadata)
+    except Exception as e:
+        error_string = "%s(%s)" % (e.__class__.__name__, e)
+        result.setdefault('warnings', []).append(u"Error %s storing fingerprint of %s" % (error_string, secret))
+
+
+class PathTrie(object):
+    """
+    Secret paths found by hashivault_walk kept as a tree of nested dicts keyed
+    by the keys vault lists, so shared prefixes are stored once. Walked folders
+    are keyed with their trailing slash and hold a dict, secrets hold None and
+    folders that were not walked hold False.
+    """
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.root = {}
+
+    def paths(self, node=None, prefix=None):
+        """Yield the full path of every secret, and of every folder left unwalked, in sorted order."""
+        if node is None:
+            node = self.root
+            prefix = self.prefix + '/' if self.prefix else ''
+        for key in sorted(node):
+            child = node[key]
+            if child is None or child is False:
+                yield prefix + key
+            else:
+                for path in self.paths(child, prefix + key):
+                    yield path
+
+    def select(self, include=None, exclude=None):
+        """Return the paths matching one of the include globs, if any, and none of the exclude globs."""
+        return [path for path in self.paths()
+                if (not include or _glob_match(path, include)) and not _glob_match(path, exclude or [])]
+
+
+def _glob_match(path, patterns):
+    import fnmatch
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns)
+
+
+def hashivault_walk(client, path, mount_point, version=1, max_depth=None, exclude=None, concurrency=8,
+                    controller=None):
+    """
+    Breadth first walk of the secrets under path, listing every folder of a
+    level concurrently. Folders matching an exclude glob are not walked and
+    folders deeper than max_depth are returned as is. Returns a PathTrie.
+    The levels share controller, or one AdaptiveConcurrency of their own.
+    """
+    exclude = exclude or []
+    if controller is None and concurrency and concurrency > 1:
+        controller = AdaptiveConcurrency(maximum=concurrency)
+    trie = PathTrie(path.strip('/'))
+    if version == 2:
+        list_secrets = client.secrets.kv.v2.list_secrets
+    else:
+        list_secrets = client.secrets.kv.v1.list_secrets
+
+    def list_folder(folder):
+        node, prefix, depth = folder
+        try:
+            response = list_secrets(path=prefix, mount_point=mount_point)
+        except InvalidPath:
+            if depth == 1:
+                raise
+            return []
+        return response.get('data', {}).get('keys', [])
+
+    level = [(trie.root, trie.prefix, 1)]
+    while level:
+        next_level = []
+        listed = hashivault_map(list_folder, level, concurrency, controller)
+        for (node, prefix, depth), keys in zip(level, listed):
+            for key in keys:
+                full_path = prefix + '/' + key if prefix else key
+                if not key.endswith('/'):
+                    node[key] = None
+                elif _glob_match(full_path, exclude):
+                    continue
+                elif max_depth is None or depth < max_depth:
+                    child = node[key] = {}
+                    next_level.append((child, full_path.rstrip('/'), depth + 1))
+                else:
+                    node[key] = False
+        level = next_level
+    return trie
+
+
+def _private_dir(path):
+    """Create path if needed and make sure only the current user can use it."""
+    if not os.path.isdir(path):
+        os.makedirs(path, mode=0o700)
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise Exception('%s must be a directory owned by the current user and not accessible by others' % path)
+    return path
+
+
+def _process_start_time(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except Exception:
+        return '0'
+
+
+def _process_alive(pid, start):
+    if start != '0':
+        return _process_start_time(pid) == start
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _hashivault_root():
+    """Return the private directory of the current user for the ansible runs and the broker."""
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return _private_dir(os.path.join(base, 'ansible-hashivault-%d' % os.getuid()))
+
+
+def hashivault_run_dir(pid):
+    """
+    Return a private directory for the ansible run of process pid. Directories
+    left by runs whose process has exited are removed.
+    """
+    root = _hashivault_root()
+    for name in os.listdir(root):
+        other_pid, _, start = name.partition('-')
+        if other_pid.isdigit() and not _process_alive(int(other_pid), start):
+            import shutil
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return _private_dir(os.path.join(root, '%d-%s' % (pid, _process_start_time(pid))))
+
+
+def hashivault_profile_log(pid):
+    """Return the path of the file the profiles of the ansible run of process pid are appended to."""
+    return os.path.join(hashivault_run_dir(pid), 'profiles.jsonl')
+
+
+def hashivault_profile_append(pid, report):
+    """Append report to the profiles of the ansible run of process pid, for the hashivault_stats callback."""
+    fd = os.open(hashivault_profile_log(pid), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, (json.dumps(report) + '\n').encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def hashivault_profile_drain(path):
+    """Return and remove the profiles appended to path, the hashivault_profile_log of an ansible run."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), 'rb') as f:
+            lines = f.read().splitlines()
+        os.ftruncate(fd, 0)
+    finally:
+        os.close(fd)
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def _broker_send(sock, message):
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+
+def _broker_recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _broker_recv(sock):
+    """Return the next message of sock, None when the peer closed it."""
+    header = _broker_recv_exactly(sock, 4)
+    if header is None:
+        return None
+    data = _broker_recv_exactly(sock, struct.unpack('>I', header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+def _broker_error(reply):
+    """Rebuild the exception the broker replied with, hvac and requests exceptions keep their class."""
+    name = reply.get('error')
+    for module in (hvac.exceptions, requests.exceptions):
+        cls = getattr(module, name, None)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls(reply.get('message'))
+    return Exception('%s: %s' % (name, reply.get('message')))
+
+
+def _broker_client_key(params):
+    """Digest of who params authenticate as and of how they reach Vault."""
+    key = [hashivault_identity(params)] + [params.get(name) for name in (
+        'ca_cert', 'ca_path', 'client_cert', 'client_key', 'verify', 'login_mount_point', 'token_cache',
+        'token_cache_path')]
+    return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+class BrokerServer(object):
+    """
+    Session broker serving the hashivault modules and lookups of the current
+    user on a Unix socket only the user may use. It holds one authenticated
+    client per Vault url, namespace and identity, so a login is done once for
+    every process asking for it, and sends the requests of those processes to
+    Vault over its pool of kept alive connections, so TLS handshakes are done
+    once too. A request bearing a token the broker handed out is sent with the
+    current token of that client, renewed or logged in again as needed. The
+    broker exits once no process has used it for idle_timeout seconds.
+
+    The protocol is one JSON message each way per call, prefixed by its
+    length: {op: auth, params, stale} logs in unless a client for params
+    exists whose token is not stale and replies {token}, {op: request, method,
+    url, headers, body, verify, cert, timeout} replies {status, reason,
+    headers, body}, bodies in base64. Failures reply {error, message}.
+    """
+
+    def __init__(self, path, idle_timeout=300):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.clients = {}
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.auth_lock = threading.Lock()
+        self.active = 0
+        self.last_used = time.time()
+        self.sock = None
+        self.inode = None
+
+    def bind(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        self.inode = os.stat(self.path).st_ino
+        sock.listen(64)
+        sock.settimeout(1)
+        self.sock = sock
+
+    def serve(self):
+        try:
+            while True:
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    with self.lock:
+                        if not self.active and time.time() - self.last_used > self.idle_timeout:
+                            return
+                    continue
+                if not self._trusted(conn):
+                    conn.close()
+                    continue
+                with self.lock:
+                    self.active += 1
+                thread = threading.Thread(target=self._handle, args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.sock.close()
+            try:
+                if os.stat(self.path).st_ino == self.inode:
+                    os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _trusted(self, conn):
+        """Only serve processes of the user running the broker, where the platform tells who the peer is."""
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True
+        _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                        struct.calcsize('3i')))
+        return uid == os.getuid()
+
+    def _handle(self, conn):
+        try:
+            while True:
+                message = _broker_recv(conn)
+                if message is None:
+                    break
+                try:
+                    if message.get('op') == 'auth':
+                        reply = self._auth(message)
+                    elif message.get('op') == 'request':
+                        reply = self._request(message)
+                    else:
+                        raise ValueError('unknown op %s' % message.get('op'))
+                except Exception as e:
+                    reply = dict(error=e.__class__.__name__, message=str(e))
+                _broker_send(conn, reply)
+                with self.lock:
+                    self.last_used = time.time()
+        except (OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+            with self.lock:
+                self.active -= 1
+                self.last_used = time.time()
+
+    def _token(self, key):
+        """Current token of the client kept under key, remembered as one the broker handed out."""
+        token = self.clients[key].token
+        # requests without a token must not be given the one of a client
+        if token:
+            with self.lock:
+                self.tokens[token] = key
+        return token
+
+    def _auth(self, message):
+        params = dict(message['params'], broker=False)
+        key = _broker_client_key(params)
+        with self.auth_lock:
+            client = self.clients.get(key)
+            if client is None or (message.get('stale') and message['stale'] == client.token):
+                self.clients[key] = hashivault_auth_client(params)
+            return dict(token=self._token(key))
+
+    def _request(self, message):
+        headers = message.get('headers') or {}
+        key = None
+        if headers.get('X-Vault-Token'):
+            key = self.tokens.get(headers['X-Vault-Token'])
+        if key is not None:
+            headers['X-Vault-Token'] = self._token(key)
+        body = message.get('body')
+        timeout = message.get('timeout')
+        response = hashivault_session().request(
+            message['method'], message['url'], headers=headers,
+            data=base64.b64decode(body) if body is not None else None, verify=message.get('verify'),
+            cert=tuple(message['cert']) if message.get('cert') else None,
+            timeout=tuple(timeout) if isinstance(timeout, list) else timeout, allow_redirects=False)
+        return dict(status=response.status_code, reason=response.reason, headers=dict(response.headers),
+                    body=base64.b64encode(response.content).decode('ascii'))
+
+
+def _broker_connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def _broker_start(path, idle_timeout):
+    """Start a broker on path in a daemon process, the socket accepts connections once this returns."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = BrokerServer(path, idle_timeout)
+    server.bind()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            if os.fork() == 0:
+                devnull = os.open(os.devnull, os.O_RDWR)
+                for fd in (0, 1, 2):
+                    os.dup2(devnull, fd)
+                keep = server.sock.fileno()
+                os.closerange(3, keep)
+                os.closerange(keep + 1, os.sysconf('SC_OPEN_MAX'))
+                server.serve()
+        finally:
+            os._exit(0)
+    server.sock.close()
+    os.waitpid(pid, 0)
+
+
+def hashivault_broker_connect(path, idle_timeout=300):
+    """Connect to the broker listening on path, starting one first if none is."""
+    sock = _broker_connect(path)
+    if sock is not None:
+        return sock
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        sock = _broker_connect(path)
+        if sock is None:
+            _broker_start(path, idle_timeout)
+            sock = _broker_connect(path)
+    finally:
+        os.close(fd)
+    if sock is None:
+        raise Exception('Could not start the hashivault broker on %s' % path)
+    return sock
+
+
+class BrokerAdapter(requests.adapters.BaseAdapter):
+    """requests transport handing the requests of a session to the broker on path, over one socket per thread."""
+
+    def __init__(self, path, idle_timeout=300):
+        super(BrokerAdapter, self).__init__()
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self._local = threading.local()
+
+    def call(self, message):
+        """Send message to the broker and return its reply, raising the error it replied with."""
+        sock = getattr(self._local, 'sock', None)
+        fresh = sock is None
+        while True:
+            if sock is None:
+                sock = self._local.sock = hashivault_broker_connect(self.path, self.idle_timeout)
+            try:
+                _broker_send(sock, message)
+                reply = _broker_recv(sock)
+            except (OSError, ValueError) as e:
+                reply = None
+                error = e
+            else:
+                error = 'the broker closed the connection'
+            if reply is not None:
+                break
+            self.close()
+            # a broker exiting on idle drops the connections it had not accepted yet
+            # without reading them, so the message is sent again to a new one
+            if not fresh:
+                raise requests.exceptions.ConnectionError('hashivault broker: %s' % error)
+            sock = None
+            fresh = False
+        if reply.get('error'):
+            raise _broker_error(reply)
+        return reply
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        reply = self.call(dict(op='request', method=request.method, url=request.url, headers=dict(request.headers),
+                               body=base64.b64encode(body).decode('ascii') if body is not None else None,
+                               verify=verify, cert=cert, timeout=timeout))
+        response = requests.models.Response()
+        response.status_code = reply['status']
+        response.reason = reply.get('reason')
+        response.headers = requests.structures.CaseInsensitiveDict(reply['headers'])
+        response._content = base64.b64decode(reply['body'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            self._local.sock = None
+            sock.close()
+
+
+def hashivault_broker_session(idle_timeout=300):
+    """requests session of the process sending every request through the broker of the current user."""
+    path = os.path.join(_hashivault_root(), 'broker.sock')
+    key = ('broker', path, idle_timeout)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.verify = None
+            adapter = BrokerAdapter(path, idle_timeout)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.mount(UNIX_SCHEME, adapter)
+            session.hooks['response'].append(_profile_response)
+            _sessions[key] = session
+        return session
+
+
+def _hashivault_broker_auth(client, params):
+    """Give client the token of the client the broker holds for params, which logs in only when it has none."""
+    adapter = client.adapter.session.get_adapter(client.adapter.base_uri)
+    message = dict(op='auth', params=dict((name, params.get(name)) for name in hashivault_argspec()))
+
+    def relogin():
+        client.token = adapter.call(dict(message, stale=client.token))['token']
+
+    client.token = adapter.call(message)['token']
+    client.adapter.relogin = relogin
+    return client
+
+
+class SharedReadCache(object):
+    """
+    Cache of secret read responses shared by the processes of one ansible run
+    through an encrypted sqlite database in a private run directory. A process
+    that misses holds a lock on the secret while reading it, so concurrent
+    readers of the same secret wait for its result instead of reading it again.
+    As in ReadCache a hit returns what is left of the lease_duration.
+    """
+
+    def __init__(self, directory):
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise Exception('shared_cache requires the cryptography python library')
+        self.directory = _private_dir(directory)
+        key_path = os.path.join(self.directory, 'reads.key')
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except OSError:
+            for _ in range(50):
+                with open(key_path, 'rb') as f:
+                    key = f.read().strip()
+                if key:
+                    break
+                time.sleep(0.01)
+        else:
+            key = Fernet.generate_key()
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key)
+        self.fernet = Fernet(key)
+        self.db_path = os.path.join(self.directory, 'reads.db')
+        self.local = threading.local()
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            import sqlite3
+            # sqlite gives the -wal and -shm files the mode of the database
+            os.close(os.open(self.db_path, os.O_RDWR | os.O_CREAT, 0o600))
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS reads '
+                       '(key TEXT PRIMARY KEY, expires REAL, value BLOB, stored REAL, secret TEXT)')
+            self.local.db = db
+        return db
+
+    def _digest(self, key):
+        return hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+    def _get(self, digest):
+        row = self._db().execute('SELECT expires, value, stored FROM reads WHERE key = ?', (digest,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        try:
+            response = json.loads(self.fernet.decrypt(row[1]).decode('utf-8'))
+        except Exception:
+            return None
+        return _cache_aged(response, row[2])
+
+    def get(self, key):
+        return self._get(self._digest(key))
+
+    def get_or_load(self, key, load, max_age):
+        """Return the cached response for key, calling load to read it if no other process is doing so."""
+        digest = self._digest(key)
+        response = self._get(digest)
+        if response is not None:
+            return response
+        fd = os.open(os.path.join(self.directory, digest + '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            response = self._get(digest)
+            if response is None:
+                response = load()
+                ttl = _cache_ttl(response, max_age) if isinstance(response, dict) else 0
+                if ttl > 0:
+                    value = self.fernet.encrypt(json.dumps(response).encode('utf-8'))
+                    now = time.time()
+                    self._db().execute('INSERT OR REPLACE INTO reads VALUES (?, ?, ?, ?, ?)',
+                                       (digest, now + ttl, value, now, self._digest(key[1:5])))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return response
+
+    def invalidate(self, url, namespace, mount_point, path):
+        """Forget every cached version of a secret, whoever read it."""
+        self._db().execute('DELETE FROM reads WHERE secret = ?', (self._digest((url, namespace, mount_point, path)),))
+
+
+hashivault_read_cache = ReadCache(max_entries=hashivault_env_int('VAULT_READ_CACHE_MAX_ENTRIES', 1024),
+                                  max_bytes=hashivault_env_int('VAULT_READ_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+
+def hashivault_read_cache_invalidate(params, mount_point, secret):
+    """
+    Forget every cached version of a secret, in this process and in the shared
+    cache of the ansible run whose pid the action plugin put in
+    HASHIVAULT_RUN_PID when the module runs on the controller.
+    """
+    hashivault_read_cache.invalidate(params.get('url'), params.get('namespace'), mount_point, secret)
+    pid = os.environ.get('HASHIVAULT_RUN_PID', '')
+    if not pid.isdigit():
+        return
+    directory = hashivault_run_dir(int(pid))
+    if os.path.exists(os.path.join(directory, 'reads.db')):
+        SharedReadCache(directory).invalidate(params.get('url'), params.get('namespace'), mount_point, secret)
+
+
 @hashiwrapper
-def hashivault_read(params):
+def hashivault_read(params, client=None, shared_cache=None):
+    """
+    Read a secret. client may be an authenticated client or a function returning one when needed. Responses are
+    looked up in the process cache and then in shared_cache, a SharedReadCache, if given.
+    """
     result = {"changed": False, "rc": 0}
-    client = hashivault_auth_client(params)
     version = params.get('version')
     mount_point = params.get('mount_point')
     secret = params.get('secret')
@@ -188,19 +2304,44 @@ def hashivault_read(params):
     else:
         secret_path = secret
 
-    try:
-        if version == 2:
-            response = client.secrets.kv.v2.read_secret_version(secret, mount_point=mount_point, version=secret_version)
-        else:
-            response = client.secrets.kv.v1.read_secret(secret, mount_point=mount_point)
-    except InvalidPath:
-        response = None
-    except Exception as e:
-        result['rc'] = 1
-        result['failed'] = True
-        error_string = "%s(%s)" % (e.__class__.__name__, e)
-        result['msg'] = u"Error %s reading %s" % (error_string, secret_path)
-        return result
+    cache_key = None
+    response = None
+    max_age = params.get('cache_max_age') or 300
+    if params.get('cache', True):
+        cache_key = (hashivault_identity(params), params.get('url'), params.get('namespace'), mount_point, secret,
+                     version, secret_version)
+        response = hashivault_read_cache.get(cache_key)
+    if response is None:
+        def load(client):
+            if client is None:
+                client = hashivault_auth_client(params)
+            elif callable(client):
+                client = client()
+            if version == 2:
+                return client.secrets.kv.v2.read_secret_version(secret, mount_point=mount_point,
+                                                                version=secret_version)
+            return client.secrets.kv.v1.read_secret(secret, mount_point=mount_point)
+
+        if shared_cache is None or cache_key is None:
+            if client is None:
+                client = hashivault_auth_client(params)
+            elif callable(client):
+                client = client()
+        try:
+            if shared_cache is not None and cache_key is not None:
+                response = shared_cache.get_or_load(cache_key, lambda: load(client), max_age)
+            else:
+                response = load(client)
+        except InvalidPath:
+            response = None
+        except Exception as e:
+            result['rc'] = 1
+            result['failed'] = True
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            result['msg'] = u"Error %s reading %s" % (error_string, secret_path)
+            return result
+        if cache_key is not None and isinstance(response, dict):
+            hashivault_read_cache.put(cache_key, response, max_age)
     if not response:
         if default is not None:
             result['value'] = default
@@ -250,16 +2391,32 @@ def hashivault_read(params):
 
 class AppRoleClient(object):
     """
-    hvac.Client decorator which generates and sets a new approle token on every
-    function call. This allows multiple calls to Vault without having to manually
-    generate and set a token on every Vault call.
+    hvac.Client decorator which logs in with approle on first use and then reuses
+    the token. Before every request the adapter sends, the token is renewed, or a
+    new one generated, when it nears expiry or has run out of uses. This allows
+    multiple calls to Vault, from any thread, without having to manually generate
+    and set a token on every Vault call.
     """
 
-    def __init__(self, client, role_id, secret_id, mount_point):
+    # refresh the token once this fraction of its lease has elapsed
+    refresh_ratio = 0.8
+
+    def __init__(self, client, role_id, secret_id, mount_point, on_token=None):
         object.__setattr__(self, 'client', client)
         object.__setattr__(self, 'role_id', role_id)
         object.__setattr__(self, 'secret_id', secret_id)
         object.__setattr__(self, 'login_mount_point', mount_point)
+        object.__setattr__(self, 'logins', 0)
+        object.__setattr__(self, 'renewals', 0)
+        object.__setattr__(self, 'token_refresh_at', None)
+        object.__setattr__(self, 'token_expires_at', None)
+        object.__setattr__(self, 'token_renewable', False)
+        object.__setattr__(self, 'token_uses_left', None)
+        object.__setattr__(self, 'on_token', on_token)
+        object.__setattr__(self, 'lock', threading.Lock())
+        # set while this thread logs in or renews, those requests do not use the token being refreshed
+        object.__setattr__(self, 'refreshing', threading.local())
+        client.adapter.ensure_token = object.__getattribute__(self, '_before_request')
 
     def __setattr__(self, name, val):
         """
@@ -270,20 +2427,94 @@ class AppRoleClient(object):
 
     def __getattribute__(self, name):
         """
-        generates and sets new approle token in decorated class (Client)
+        makes sure the decorated class (Client) holds an approle token
         returns decorated class (Client) attribute
         """
+        if name in ('logins', 'renewals', 'token_expires_at'):
+            return object.__getattribute__(self, name)
         client = object.__getattribute__(self, 'client')
-        attr = client.__getattribute__(name)
+        # log in first, the attribute may be the token itself
+        if object.__getattribute__(self, 'token_refresh_at') is None:
+            with object.__getattribute__(self, 'lock'):
+                if object.__getattribute__(self, 'token_refresh_at') is None:
+                    object.__getattribute__(self, '_login')()
+        return client.__getattribute__(name)
+
+    def _before_request(self):
+        if getattr(object.__getattribute__(self, 'refreshing'), 'active', False):
+            return
+        with object.__getattribute__(self, 'lock'):
+            object.__getattribute__(self, '_ensure_token')()
 
+    def _ensure_token(self):
+        """Refresh the token if needed and count the use the request about to be sent makes of it."""
+        now = time.time()
+        refresh_at = object.__getattribute__(self, 'token_refresh_at')
+        uses_left = object.__getattribute__(self, 'token_uses_left')
+        if refresh_at is None or now >= refresh_at or uses_left == 0:
+            expires_at = object.__getattribute__(self, 'token_expires_at')
+            if refresh_at is not None and uses_left != 0 and object.__getattribute__(self, 'token_renewable') and \
+                    now < expires_at:
+                object.__getattribute__(self, '_renew')()
+            else:
+                object.__getattribute__(self, '_login')()
+        uses_left = object.__getattribute__(self, 'token_uses_left')
+        if uses_left is not None:
+            object.__setattr__(self, 'token_uses_left', uses_left - 1)
+
+    @hashivault_profiled('login')
+    def _login(self):
+        client = object.__getattribute__(self, 'client')
         role_id = object.__getattribute__(self, 'role_id')
         secret_id = object.__getattribute__(self, 'secret_id')
         login_mount_point = object.__getattribute__(self, 'login_mount_point')
-        resp = client.auth.approle.login(role_id, secret_id=secret_id, mount_point=login_mount_point)
+        refreshing = object.__getattribute__(self, 'refreshing')
+        refreshing.active = True
+        try:
+            resp = client.auth.approle.login(role_id, secret_id=secret_id, mount_point=login_mount_point)
+        finally:
+            refreshing.active = False
         client.token = str(resp['auth']['client_token'])
-        return attr
+        object.__setattr__(self, 'logins', object.__getattribute__(self, 'logins') + 1)
+        object.__getattribute__(self, '_track')(resp['auth'])
 
+    @hashivault_profiled('login')
+    def _renew(self):
+        client = object.__getattribute__(self, 'client')
+        refreshing = object.__getattribute__(self, 'refreshing')
+        refreshing.active = True
+        try:
+            resp = client.auth.token.renew_self()
+        except Exception:
+            resp = None
+        finally:
+            refreshing.active = False
+        if resp is None:
+            object.__getattribute__(self, '_login')()
+            return
+        object.__setattr__(self, 'renewals', object.__getattribute__(self, 'renewals') + 1)
+        object.__getattribute__(self, '_track')(resp['auth'])
+
+    def _seed(self, entry):
+        """Start from a token found in the token cache."""
+        object.__setattr__(self, 'token_refresh_at', entry['refresh_at'])
+        object.__setattr__(self, 'token_expires_at', entry['expires_at'])
+        object.__setattr__(self, 'token_renewable', entry['renewable'])
 
+    def _track(self, auth):
+        """Record the lifetime of the token from the auth block of a login or renew response."""
+        refresh_at, expires_at = _token_lifetime(auth, object.__getattribute__(self, 'refresh_ratio'))
+        num_uses = auth.get('num_uses') or 0
+        object.__setattr__(self, 'token_refresh_at', refresh_at)
+        object.__setattr__(self, 'token_expires_at', expires_at)
+        object.__setattr__(self, 'token_renewable', bool(auth.get('renewable')))
+        object.__setattr__(self, 'token_uses_left', num_uses if num_uses > 0 else None)
+        on_token = object.__getattribute__(self, 'on_token')
+        if on_token is not None:
+            on_token(auth)
+
+
+@hashivault_profiled('compare')
 def _compare_state(desired_state, current_state, ignore=None):
     """Compares desired state to current state. Returns true if objects are equal
 
@@ -297,14 +2528,17 @@ def _compare_state(desired_state, current_state, ignore=None):
     :return: True if the states are the same.
     :rtype: bool
     """
+    return _compare_values(desired_state, current_state, ignore)
+
 
+def _compare_values(desired_state, current_state, ignore=None):
     if ignore is None:
         ignore = []
     if (type(desired_state) is list):
         if ((type(current_state) != list) or (len(desired_state) != len(current_state))):
             return False
         for i in range(len(desired_state)):
-            if (not _compare_state(desired_state[i], current_state[i])):
+            if (not _compare_values(desired_state[i], current_state[i])):
                 return False
         return True
 
@@ -317,7 +2551,7 @@ def _compare_state(desired_state, current_state, ignore=None):
             if key in ignore:
                 continue
             v = desired_state[key]
-            if ((key not in current_state) or (not _compare_state(v, current_state.get(key)))):
+            if ((key not in current_state) or (not _compare_values(v, current_state.get(key)))):
                 return False
         return True
 
@@ -349,6 +2583,7 @@ def _convert_to_seconds(original_value):
     return original_value
 
 
+@hashivault_profiled('compare')
 def get_keys_updated(desired_state, current_state, ignore=None):
     """Return list of keys that have different values
 
@@ -380,11 +2615,12 @@ def get_keys_updated(desired_state, current_state, ignore=None):
         if 'ttl' in key:
             if _convert_to_seconds(old_value) != _convert_to_seconds(new_value):
                 differences.append(key)
-        elif not _compare_state(new_value, old_value):
+        elif not _compare_values(new_value, old_value):
             differences.append(key)
     return differences
 
 
+@hashivault_profiled('compare')
 def is_state_changed(desired_state, current_state, ignore=None):
     """Return list of keys that have different values
 
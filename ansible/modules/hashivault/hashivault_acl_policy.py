@@ -1,5 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+from hvac.exceptions import InvalidPath
+
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
@@ -67,14 +69,13 @@ def hashivault_acl_policy(module):
     current_state = {}
     desired_state = {}
 
-    # get current policies
-    current_policies = client.sys.list_acl_policies()
-    if isinstance(current_policies, dict):
-        current_policies = current_policies.get('data', current_policies).get('keys', current_policies)
-    if name in current_policies:
-        exists = True
+    # get current policy
+    try:
         current_state = client.sys.read_acl_policy(name)
         current_state = current_state.get('data', current_state).get('policy', current_state)
+        exists = True
+    except InvalidPath:
+        current_state = {}
 
     # Define desired rules
     rules_file = params.get('rules_file')
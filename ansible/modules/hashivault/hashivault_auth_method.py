@@ -105,6 +105,7 @@ def hashivault_auth_method(module):
         mount_point = method_type
 
     # Get current auth methods
+    auth_methods = {}
     try:
         result = client.sys.list_auth_methods()
         auth_methods = result.get('data', result)
@@ -138,13 +139,16 @@ def hashivault_auth_method(module):
     elif state == 'disabled' and changed and not module.check_mode:
         client.sys.disable_auth_method(path=mount_point)
 
-    # Get resulting auth method
-    try:
-        final_result = client.sys.list_auth_methods()
-        retval = final_result['data'][mount_point + u"/"]
-    except Exception:
-        retval = {}
-        pass
+    # Get resulting auth method, only list again when it was changed
+    if changed and not module.check_mode:
+        auth_methods = {}
+        if state == 'enabled':
+            try:
+                final_result = client.sys.list_auth_methods()
+                auth_methods = final_result.get('data', final_result)
+            except Exception:
+                pass
+    retval = auth_methods.get(mount_point + u"/", {})
 
     return {
         "changed": changed,
@@ -128,8 +128,9 @@ def hashivault_db_secret_engine_role(module):
     # check if role exists
     exists = False
     changed = False
+    current_state = {}
     try:
-        client.secrets.database.read_role(name=name, mount_point=mount_point)
+        current_state = client.secrets.database.read_role(name=name, mount_point=mount_point)['data']
         exists = True
     except Exception:
         pass
@@ -139,7 +140,6 @@ def hashivault_db_secret_engine_role(module):
 
     # compare current_state to desired_state
     if exists and state == 'present' and not changed:
-        current_state = client.secrets.database.read_role(name=name, mount_point=mount_point)['data']
         for k, v in desired_state.items():
             if v != current_state[k]:
                 changed = True
@@ -5,6 +5,7 @@ from hvac.exceptions import InvalidPath
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
+from ansible.module_utils.hashivault import hashivault_read_cache_invalidate
 from ansible.module_utils.hashivault import hashiwrapper
 
 ANSIBLE_METADATA = {'status': ['stableinterface'], 'supported_by': 'community', 'version': '1.1'}
@@ -81,6 +82,7 @@ def hashivault_delete(params):
         else:
             returned_data = client.secrets.kv.v1.delete_secret(secret, mount_point=mount_point)
     except InvalidPath:
+        hashivault_read_cache_invalidate(params, mount_point, secret)
         result['msg'] = u"Secret %s nonexistent" % secret_path
         result['changed'] = False
         return result
@@ -90,6 +92,7 @@ def hashivault_delete(params):
         error_string = "%s(%s)" % (e.__class__.__name__, e)
         result['msg'] = u"Error %s deleting %s" % (error_string, secret_path)
         return result
+    hashivault_read_cache_invalidate(params, mount_point, secret)
     if returned_data:
         result['data'] = returned_data.text
     result['msg'] = u"Secret %s deleted" % secret_path
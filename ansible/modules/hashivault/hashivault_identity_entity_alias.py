@@ -1,5 +1,8 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+from hvac.exceptions import Forbidden
+from hvac.exceptions import InvalidPath
+
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
@@ -13,6 +16,8 @@ version_added: "3.13.0"
 short_description: Hashicorp Vault entity alias manage module
 description:
     - Module to manage identity entity aliases in Hashicorp Vault.
+    - Aliases given by name are found with identity/lookup/entity, which needs the C(update) capability on it.
+      Tokens denied it fall back to listing identity/entity-alias/id, as earlier versions did, which needs C(list).
 options:
     name:
         description:
@@ -60,12 +65,42 @@ def main():
         module.exit_json(**result)
 
 
-def hashivault_identity_entity_alias_update(client, alias_id, alias_name, canonical_id, mount_accessor):
+def hashivault_identity_entity_alias_lookup(client, alias_name, mount_accessor):
+    """Return the alias named alias_name on mount_accessor or None, with one lookup instead of listing every alias."""
     try:
-        alias_details = client.secrets.identity.read_entity_alias(alias_id=alias_id)
-    except Exception as e:
-        return {'failed': True, 'msg': str(e)}
-    if alias_details['data']['canonical_id'] == canonical_id:
+        entity = client.secrets.identity.lookup_entity(alias_name=alias_name, alias_mount_accessor=mount_accessor)
+    except InvalidPath:
+        return None
+    except Forbidden:
+        return hashivault_identity_entity_alias_scan(client, alias_name, mount_accessor)
+    if not isinstance(entity, dict):
+        return None
+    for alias in entity['data'].get('aliases') or []:
+        if alias['mount_accessor'] == mount_accessor and alias['name'] == alias_name:
+            return alias
+    return None
+
+
+def hashivault_identity_entity_alias_scan(client, alias_name, mount_accessor):
+    """Return the alias named alias_name on mount_accessor or None from the list of every alias."""
+    try:
+        list_of_aliases = client.secrets.identity.list_entity_aliases()
+    except InvalidPath:
+        return None
+    for key, value in dict(list_of_aliases['data']['key_info']).items():
+        if value['mount_accessor'] == mount_accessor and value['name'] == alias_name:
+            return dict(value, id=key)
+    return None
+
+
+def hashivault_identity_entity_alias_update(client, alias_id, alias_name, canonical_id, mount_accessor,
+                                            alias_details=None):
+    if alias_details is None:
+        try:
+            alias_details = client.secrets.identity.read_entity_alias(alias_id=alias_id)['data']
+        except Exception as e:
+            return {'failed': True, 'msg': str(e)}
+    if alias_details['canonical_id'] == canonical_id:
         return {'changed': False}
     try:
         client.secrets.identity.update_entity_alias(
@@ -81,51 +116,44 @@ def hashivault_identity_entity_alias_update(client, alias_id, alias_name, canoni
 
 def hashivault_identity_entity_alias_create(client, alias_name, canonical_id, mount_accessor):
     try:
-        list_of_aliases = client.secrets.identity.list_entity_aliases()
-    except Exception:
-        try:
-            alias_details = client.secrets.identity.create_or_update_entity_alias(
-                name=alias_name,
-                canonical_id=canonical_id,
-                mount_accessor=mount_accessor
-            )
-        except Exception as e:
-            return {'failed': True, 'msg': str(e)}
+        alias = hashivault_identity_entity_alias_lookup(client, alias_name, mount_accessor)
+    except Exception as e:
+        return {'failed': True, 'msg': 'Error looking up alias %s: %s' % (alias_name, e)}
+    if alias is not None:
+        return hashivault_identity_entity_alias_update(client, alias_id=alias['id'], alias_name=alias_name,
+                                                       canonical_id=canonical_id, mount_accessor=mount_accessor,
+                                                       alias_details=alias)
+    try:
+        alias_details = client.secrets.identity.create_or_update_entity_alias(
+            name=alias_name,
+            canonical_id=canonical_id,
+            mount_accessor=mount_accessor
+        )
+    except Exception as e:
+        return {'failed': True, 'msg': str(e)}
+    if isinstance(alias_details, dict):
         return {'changed': True, 'data': alias_details['data']}
-    for key, value in dict(list_of_aliases['data']['key_info']).items():
-        if value['mount_accessor'] == mount_accessor and value['name'] == alias_name:
-            return hashivault_identity_entity_alias_update(client, alias_id=key, alias_name=alias_name,
-                                                           canonical_id=canonical_id,
-                                                           mount_accessor=mount_accessor)
-    else:
-        try:
-            client.secrets.identity.create_or_update_entity_alias(name=alias_name, canonical_id=canonical_id,
-                                                                  mount_accessor=mount_accessor)
-        except Exception as e:
-            return {'failed': True, 'msg': str(e)}
-        return {'changed': True}
+    return {'changed': True}
 
 
 def hashivault_identity_entity_alias_delete(client, alias_id, alias_name, mount_accessor, canonical_id):
-    try:
-        list_of_aliases = client.secrets.identity.list_entity_aliases()
-    except Exception:
-        return {'changed': False}
-    else:
-        if alias_id is not None:
-            if alias_id not in list_of_aliases['data']['keys']:
-                return {'changed': False}
-            client.secrets.identity.delete_entity_alias(alias_id=alias_id)
-            return {'changed': True}
-        elif alias_name is not None:
-            for key, value in dict(list_of_aliases['data']['key_info']).items():
-                if value['mount_accessor'] == mount_accessor and \
-                        value['name'] == alias_name and \
-                        value['canonical_id'] == canonical_id:
-                    client.secrets.identity.delete_entity_alias(alias_id=key)
-                    return {'changed': True}
+    if alias_id is not None:
+        try:
+            client.secrets.identity.read_entity_alias(alias_id=alias_id)
+        except Exception:
             return {'changed': False}
-        return {'failed': True, 'msg': 'Either alias_id or name must be provided'}
+        client.secrets.identity.delete_entity_alias(alias_id=alias_id)
+        return {'changed': True}
+    elif alias_name is not None:
+        try:
+            alias = hashivault_identity_entity_alias_lookup(client, alias_name, mount_accessor)
+        except Exception as e:
+            return {'failed': True, 'msg': 'Error looking up alias %s: %s' % (alias_name, e)}
+        if alias is None or alias['canonical_id'] != canonical_id:
+            return {'changed': False}
+        client.secrets.identity.delete_entity_alias(alias_id=alias['id'])
+        return {'changed': True}
+    return {'failed': True, 'msg': 'Either alias_id or name must be provided'}
 
 
 @hashiwrapper
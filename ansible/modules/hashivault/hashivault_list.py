@@ -2,9 +2,12 @@
 # -*- coding: utf-8 -*-
 from hvac.exceptions import InvalidPath
 
+from ansible.module_utils.hashivault import AdaptiveConcurrency
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
+from ansible.module_utils.hashivault import hashivault_map
+from ansible.module_utils.hashivault import hashivault_walk
 from ansible.module_utils.hashivault import hashiwrapper
 
 ANSIBLE_METADATA = {'status': ['stableinterface'], 'supported_by': 'community', 'version': '1.1'}
@@ -36,6 +39,31 @@ options:
         description:
             - secret mount point
         default: secret
+    recursive:
+        description:
+            - walk every folder under *secret* and return the full path of every secret found. Each level of the
+              tree is listed concurrently.
+        default: false
+    max_depth:
+        description:
+            - number of folder levels to walk when *recursive*. Folders below this depth are returned with their
+              trailing slash.
+    include:
+        description:
+            - only return paths matching one of these globs when *recursive*, e.g. `app/*/password`.
+    exclude:
+        description:
+            - do not return paths matching any of these globs when *recursive*. Folders matching them, with their
+              trailing slash, are not walked.
+    concurrency:
+        description:
+            - maximum number of list or metadata requests in flight when *recursive*. The number in flight
+              adapts to how vault copes, see scheduler.
+        default: 8
+    with_metadata:
+        description:
+            - also read the metadata of every secret found when *recursive*, kv engine version 2 only.
+        default: false
 extends_documentation_fragment: hashivault
 '''
 RETURN = '''
@@ -45,6 +73,16 @@ secrets:
     returned: success
     type: list
     sample: ["giant", "stalks/"]
+secrets_metadata:
+    description: metadata of every secret found, keyed by path
+    returned: recursive and with_metadata
+    type: dict
+scheduler:
+    description: how the number of concurrent requests was adapted, with every change and every throttle event
+    returned: recursive
+    type: dict
+    sample: {"max_concurrency": 8, "final_concurrency": 4, "timeline": [{"time": 0.0, "concurrency": 4}],
+             "throttles": [{"time": 0.41, "reason": "RateLimitExceeded", "concurrency": 4}]}
 '''
 EXAMPLES = '''
 ---
@@ -55,6 +93,14 @@ EXAMPLES = '''
         version: 2
       register: 'fie'
     - debug: msg="Known secrets are {{ fie.secrets|join(', ') }}"
+
+    - hashivault_list:
+        secret: 'apps'
+        version: 2
+        recursive: true
+        exclude: ['apps/archive/*']
+      register: 'tree'
+    - debug: msg="All secrets are {{ tree.secrets|join(', ') }}"
 '''
 
 
@@ -63,6 +109,12 @@ def main():
     argspec['version'] = dict(required=False, type='int', default=1)
     argspec['mount_point'] = dict(required=False, type='str', default='secret')
     argspec['secret'] = dict(default='', type='str')
+    argspec['recursive'] = dict(required=False, type='bool', default=False)
+    argspec['max_depth'] = dict(required=False, type='int')
+    argspec['include'] = dict(required=False, type='list', elements='str')
+    argspec['exclude'] = dict(required=False, type='list', elements='str')
+    argspec['concurrency'] = dict(required=False, type='int', default=8)
+    argspec['with_metadata'] = dict(required=False, type='bool', default=False)
     module = hashivault_init(argspec)
     result = hashivault_list(module.params)
     if result.get('failed'):
@@ -94,7 +146,20 @@ def hashivault_list(params):
         metadata = False
 
     try:
-        if version == 2:
+        if params.get('recursive'):
+            controller = AdaptiveConcurrency(maximum=params.get('concurrency') or 1)
+            trie = hashivault_walk(client, secret, mount_point, version=version, max_depth=params.get('max_depth'),
+                                   exclude=params.get('exclude'), concurrency=params.get('concurrency'),
+                                   controller=controller)
+            result['secrets'] = trie.select(include=params.get('include'), exclude=params.get('exclude'))
+            if params.get('with_metadata') and version == 2:
+                def read_metadata(path):
+                    return client.secrets.kv.v2.read_secret_metadata(path=path, mount_point=mount_point).get('data')
+                paths = [path for path in result['secrets'] if not path.endswith('/')]
+                result['secrets_metadata'] = dict(zip(paths, hashivault_map(read_metadata, paths,
+                                                                            params.get('concurrency'), controller)))
+            result['scheduler'] = controller.report()
+        elif version == 2:
             if secret and metadata:
                 response = client.secrets.kv.v2.read_secret_metadata(path=secret, mount_point=mount_point)
                 result['metadata'] = response.get('data', {})
@@ -334,7 +334,7 @@ options:
                 description:
                     - Specifies the duration by which to backdate the NotBefore property.
             not_after:
-                type: string
+                type: str
                 description:
                     - Set the Not After field of the certificate with specified date value.
                     - The value format should be given in UTC format YYYY-MM-ddTHH:MM:SSZ.
@@ -345,7 +345,7 @@ options:
                 description:
                     - Validations to run on the Common Name field of the certificate.
             allowed_user_ids:
-                type: string
+                type: str
                 default: ""
                 description:
                     - Comma separated, globbing list of User ID Subject components to allow on requests.
@@ -371,6 +371,57 @@ EXAMPLES = r'''
 '''
 
 
+# checked against DOCUMENTATION by benchmarks/importtime.py
+CONFIG_TYPES = {
+    'ttl': 'str',
+    'max_ttl': 'str',
+    'allow_localhost': 'bool',
+    'allowed_domains': 'list',
+    'allowed_domains_template': 'bool',
+    'allow_bare_domains': 'bool',
+    'allow_subdomains': 'bool',
+    'allow_glob_domains': 'bool',
+    'allow_wildcard_certificates': 'bool',
+    'allow_any_name': 'bool',
+    'enforce_hostnames': 'bool',
+    'allow_ip_sans': 'bool',
+    'allowed_uri_sans': 'list',
+    'allowed_uri_sans_template': 'bool',
+    'allowed_other_sans': 'list',
+    'allowed_serial_numbers': 'list',
+    'server_flag': 'bool',
+    'client_flag': 'bool',
+    'code_signing_flag': 'bool',
+    'email_protection_flag': 'bool',
+    'key_type': 'str',
+    'key_bits': 'int',
+    'signature_bits': 'int',
+    'use_pss': 'bool',
+    'key_usage': 'list',
+    'ext_key_usage': 'list',
+    'ext_key_usage_oids': 'list',
+    'use_csr_common_name': 'bool',
+    'use_csr_sans': 'bool',
+    'ou': 'list',
+    'organization': 'list',
+    'country': 'list',
+    'locality': 'list',
+    'province': 'list',
+    'street_address': 'list',
+    'postal_code': 'list',
+    'serial_number': 'str',
+    'generate_lease': 'bool',
+    'no_store': 'bool',
+    'require_cn': 'bool',
+    'policy_identifiers': 'list',
+    'basic_constraints_valid_for_non_ca': 'bool',
+    'not_before_duration': 'duration',
+    'not_after': 'str',
+    'cn_validations': 'list',
+    'allowed_user_ids': 'str',
+}
+
+
 def main():
     argspec = hashivault_argspec()
     argspec['name'] = dict(required=True, type='str')
@@ -408,11 +459,8 @@ def hashivault_pki_role(module):
         import json
         desired_state = json.loads(open(role_file, 'r').read())
     elif config:
-        import yaml
-        doc = yaml.safe_load(DOCUMENTATION)
-        args = doc.get('options').get('config').get('suboptions')
         try:
-            desired_state = hashivault_normalize_from_doc(module, config, args)
+            desired_state = hashivault_normalize_from_doc(module, config, CONFIG_TYPES)
         except Exception as e:
             return e.args[0]
 
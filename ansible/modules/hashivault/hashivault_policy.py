@@ -67,13 +67,11 @@ def hashivault_policy(module):
     current_state = {}
     desired_state = {}
 
-    # get current policies
-    current_policies = client.sys.list_policies()
-    if isinstance(current_policies, dict):
-        current_policies = current_policies.get('policies', current_policies)
-    if name in current_policies:
+    # get current policy, None when it does not exist
+    policy = client.get_policy(name)
+    if policy is not None:
         exists = True
-        current_state = client.get_policy(name)
+        current_state = policy
 
     # Define desired rules
     rules_file = params.get('rules_file')
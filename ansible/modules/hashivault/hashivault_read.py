@@ -4,6 +4,7 @@
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_init
 from ansible.module_utils.hashivault import hashivault_read
+from ansible.module_utils.hashivault import hashivault_read_secrets
 
 ANSIBLE_METADATA = {'status': ['stableinterface'], 'supported_by': 'community', 'version': '1.1'}
 DOCUMENTATION = '''
@@ -24,13 +25,40 @@ options:
         default: secret
     secret:
         description:
-            - secret to read.
+            - secret to read. Either secret or secrets is required.
     key:
         description:
             - secret key to read.
     secret_version:
         description:
             - secret version to read kv2 only.
+    default:
+        description:
+            - value to return if the secret or key is not in vault.
+    cache:
+        description:
+            - reuse responses already read by this process. Responses are kept for the lease_duration returned by
+              vault capped by cache_max_age.
+        default: true
+    cache_max_age:
+        description:
+            - maximum number of seconds a cached response is reused.
+        default: 300
+    secrets:
+        description:
+            - list of secrets to read in one task over a single login. Each item takes secret and optionally name,
+              key, version, mount_point, secret_version and default; unset options are taken from the task. The
+              values are returned in value as a dict keyed by name, which defaults to secret. A failed item does
+              not stop the others; the task fails afterwards with the failures listed in failures.
+    concurrency:
+        description:
+            - maximum number of secrets read at the same time. Fewer are read at once when vault rate limits or
+              slows down, how this went is returned in scheduler.
+        default: 8
+    fail_fast:
+        description:
+            - stop reading secrets after the first failure.
+        default: false
 extends_documentation_fragment: hashivault
 '''
 EXAMPLES = '''
@@ -42,6 +70,18 @@ EXAMPLES = '''
         key: 'fie'
       register: 'fie'
     - debug: msg="Value is {{fie.value}}"
+
+    - hashivault_read:
+        version: 2
+        secrets:
+          - name: db_password
+            secret: 'db'
+            key: 'password'
+          - name: api
+            secret: 'api'
+            default: {}
+      register: 'config'
+    - debug: msg="Password is {{config.value.db_password}}"
 '''
 
 
@@ -49,12 +89,29 @@ def main():
     argspec = hashivault_argspec()
     argspec['version'] = dict(required=False, type='int', default=1)
     argspec['mount_point'] = dict(required=False, type='str', default='secret')
-    argspec['secret'] = dict(required=True, type='str')
+    argspec['secret'] = dict(required=False, type='str')
     argspec['key'] = dict(required=False, type='str')
     argspec['default'] = dict(required=False, default=None, type='str')
     argspec['secret_version'] = dict(required=False, type='int')
-    module = hashivault_init(argspec)
-    result = hashivault_read(module.params)
+    argspec['cache'] = dict(required=False, type='bool', default=True)
+    argspec['cache_max_age'] = dict(required=False, type='int', default=300)
+    argspec['secrets'] = dict(required=False, type='list', elements='dict', options=dict(
+        name=dict(required=False, type='str'),
+        secret=dict(required=True, type='str'),
+        key=dict(required=False, type='str'),
+        version=dict(required=False, type='int'),
+        mount_point=dict(required=False, type='str'),
+        secret_version=dict(required=False, type='int'),
+        default=dict(required=False, type='raw'),
+    ))
+    argspec['concurrency'] = dict(required=False, type='int', default=8)
+    argspec['fail_fast'] = dict(required=False, type='bool', default=False)
+    module = hashivault_init(argspec, required_one_of=[['secret', 'secrets']],
+                             mutually_exclusive=[['secret', 'secrets']])
+    if module.params.get('secrets') is not None:
+        result = hashivault_read_secrets(module.params)
+    else:
+        result = hashivault_read(module.params)
     if result.get('failed'):
         module.fail_json(**result)
     else:
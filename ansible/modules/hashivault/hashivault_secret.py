@@ -2,11 +2,21 @@
 # -*- coding: utf-8 -*-
 from hvac.exceptions import InvalidPath
 
+from ansible.module_utils.hashivault import AdaptiveConcurrency
+from ansible.module_utils.hashivault import KV2PatchUnsupported
+from ansible.module_utils.hashivault import get_keys_updated
 from ansible.module_utils.hashivault import is_state_changed
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
+from ansible.module_utils.hashivault import hashivault_fingerprint
 from ansible.module_utils.hashivault import hashivault_init
+from ansible.module_utils.hashivault import hashivault_kv2_fingerprint_matches
+from ansible.module_utils.hashivault import hashivault_kv2_metadata
+from ansible.module_utils.hashivault import hashivault_kv2_patch
+from ansible.module_utils.hashivault import hashivault_kv2_record_fingerprint
+from ansible.module_utils.hashivault import hashivault_map
 from ansible.module_utils.hashivault import hashiwrapper
+from ansible.module_utils.hashivault import hashivault_read_cache_invalidate
 
 ANSIBLE_METADATA = {'status': ['stableinterface'], 'supported_by': 'community', 'version': '1.1'}
 DOCUMENTATION = '''
@@ -42,6 +52,35 @@ options:
         description:
             - delete all versions and metadata for a given secret for kv engine version 2.
         default: false
+    method:
+        description:
+            - how state update is applied to a kv version 2 secret. `rmw` reads the secret, overlays data and
+              writes the whole secret back if it changed. `patch` sends only data in one JSON merge patch request,
+              keys set to null are removed; the secret must exist, the server must be vault 1.9 or later and the
+              token needs the patch capability. The task is then always reported as changed. `auto` patches when
+              possible and falls back to `rmw` otherwise. Check mode always uses `rmw`.
+        choices: ["rmw", "patch", "auto"]
+        default: rmw
+    fingerprint:
+        description:
+            - kv version 2 only. Store a hash of data and state in the custom_metadata of the secret when it is
+              written and, on later runs, read only the metadata and leave the secret alone when the hash still
+              matches its current version. Any write by something else makes the next run read and compare the
+              whole secret again. The token needs read and update capabilities on the metadata path.
+        type: bool
+        default: false
+    secrets:
+        description:
+            - list of secrets to manage in one task over a single login. Each item takes secret and optionally
+              data, state, version, mount_point, cas, permanent and fingerprint; unset options are taken from the
+              task. Every secret is read and only the ones that differ are written, at most concurrency at a time.
+              A failed item does not stop the others; the task fails afterwards with the failures listed in
+              failures.
+    concurrency:
+        description:
+            - maximum number of secrets read or written at the same time. Fewer are handled at once when vault
+              rate limits or slows down, how this went is returned in scheduler.
+        default: 8
 extends_documentation_fragment: hashivault
 '''
 EXAMPLES = '''
@@ -53,6 +92,30 @@ EXAMPLES = '''
         data:
             foo: foe
             fie: fum
+
+    - hashivault_secret:
+        secrets:
+          - secret: giant
+            data:
+              foo: foe
+          - secret: stalks/bean
+            state: update
+            data:
+              height: tall
+          - secret: old
+            state: absent
+'''
+RETURN = '''
+---
+secrets:
+    description: outcome of every secret of a bulk task, keyed by path
+    returned: secrets is set
+    type: dict
+    sample: {"secret/giant": {"changed": true, "msg": "Secret secret/giant written"}}
+scheduler:
+    description: how the number of concurrent requests was adapted, with every change and every throttle event
+    returned: secrets is set
+    type: dict
 '''
 
 
@@ -62,11 +125,25 @@ def main():
                             default='present')
     argspec['version'] = dict(required=False, type='int', default=2)
     argspec['mount_point'] = dict(required=False, type='str', default='secret')
-    argspec['secret'] = dict(required=True, type='str')
+    argspec['secret'] = dict(required=False, type='str')
     argspec['data'] = dict(required=False, default={}, type='dict', no_log=True)
     argspec['cas'] = dict(required=False, type='int')
     argspec['permanent'] = dict(required=False, type='bool', default=False)
-    module = hashivault_init(argspec, supports_check_mode=True)
+    argspec['method'] = dict(required=False, type='str', choices=['rmw', 'patch', 'auto'], default='rmw')
+    argspec['fingerprint'] = dict(required=False, type='bool', default=False)
+    argspec['secrets'] = dict(required=False, type='list', elements='dict', options=dict(
+        secret=dict(required=True, type='str'),
+        data=dict(required=False, type='dict', no_log=True),
+        state=dict(required=False, type='str', choices=['present', 'update', 'absent']),
+        version=dict(required=False, type='int'),
+        mount_point=dict(required=False, type='str'),
+        cas=dict(required=False, type='int'),
+        permanent=dict(required=False, type='bool'),
+        fingerprint=dict(required=False, type='bool'),
+    ))
+    argspec['concurrency'] = dict(required=False, type='int', default=8)
+    module = hashivault_init(argspec, supports_check_mode=True, required_one_of=[['secret', 'secrets']],
+                             mutually_exclusive=[['secret', 'secrets']])
     result = hashivault_secret(module)
     if result.get('failed'):
         module.fail_json(**result)
@@ -74,10 +151,75 @@ def main():
         module.exit_json(**result)
 
 
+def _hidden_keys(data, changed_keys=(), old_data=None):
+    """Describe the keys of a secret for --diff without showing any value."""
+    hidden = dict((key, 'VALUE_HIDDEN') for key in data)
+    for key in changed_keys:
+        hidden[key] = 'VALUE_CHANGED' if key in (old_data or {}) else 'VALUE_ADDED'
+    return hidden
+
+
 @hashiwrapper
 def hashivault_secret(module):
     params = module.params
     client = hashivault_auth_client(params)
+    if params.get('secrets') is not None:
+        return hashivault_secrets(module, client)
+    return _hashivault_secret(client, params, module.check_mode)
+
+
+def hashivault_secrets(module, client):
+    params = module.params
+    secrets = params.get('secrets')
+    base_params = dict(params)
+    base_params.pop('secrets')
+
+    def apply(item):
+        item_params = dict(base_params)
+        for option, value in item.items():
+            if value is not None:
+                item_params[option] = value
+        try:
+            return _hashivault_secret(client, item_params, module.check_mode)
+        except Exception as e:
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            return {'failed': True, 'rc': 1, 'msg': u"Error %s with %s" % (error_string, item['secret'])}
+
+    secret_paths = []
+    for item in secrets:
+        mount_point = item.get('mount_point') or params.get('mount_point')
+        secret_path = '%s/%s' % (mount_point, item['secret']) if mount_point else item['secret']
+        if secret_path in secret_paths:
+            return {'failed': True, 'rc': 1, 'msg': u"Secret %s is listed more than once" % secret_path}
+        secret_paths.append(secret_path)
+
+    controller = AdaptiveConcurrency(maximum=params.get('concurrency') or 1)
+    results = hashivault_map(apply, secrets, concurrency=params.get('concurrency'), controller=controller)
+    result = {"changed": False, "rc": 0, "secrets": {}, "diff": {"before": {}, "after": {}},
+              "scheduler": controller.report()}
+    failures = {}
+    for secret_path, item_result in zip(secret_paths, results):
+        diff = item_result.pop('diff', None)
+        if diff and item_result.get('changed'):
+            result['diff']['before'][secret_path] = diff['before']
+            result['diff']['after'][secret_path] = diff['after']
+        result['secrets'][secret_path] = dict(changed=item_result.get('changed', False), msg=item_result.get('msg'))
+        result['changed'] = result['changed'] or item_result.get('changed', False)
+        if item_result.get('warnings'):
+            result.setdefault('warnings', []).extend(item_result['warnings'])
+        if item_result.get('failed'):
+            failures[secret_path] = item_result.get('msg')
+    changed = len([r for r in result['secrets'].values() if r['changed']])
+    result['msg'] = u"%d of %d secrets changed" % (changed, len(secrets))
+    if failures:
+        result['rc'] = 1
+        result['failed'] = True
+        result['failures'] = failures
+        result['msg'] = u"Error with %d of %d secrets, %s" % (len(failures), len(secrets), result['msg'])
+    return result
+
+
+def _hashivault_secret(client, params, check_mode):
     state = params.get('state')
     version = params.get('version')
     mount_point = params.get('mount_point')
@@ -92,10 +234,52 @@ def hashivault_secret(module):
         secret_path = secret
 
     result = {"changed": False, "rc": 0}
+    fingerprint = None
+    metadata = None
+    if params.get('fingerprint') and version == 2 and state in ['present', 'update']:
+        fingerprint = hashivault_fingerprint(data, state)
+        try:
+            metadata = hashivault_kv2_metadata(client, secret, mount_point=mount_point)
+        except Exception as e:
+            result['rc'] = 1
+            result['failed'] = True
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            result['msg'] = u"Error %s reading metadata of %s" % (error_string, secret_path)
+            return result
+        if hashivault_kv2_fingerprint_matches(metadata, fingerprint):
+            result['msg'] = u"Secret %s unchanged" % secret_path
+            return result
+
+    method = params.get('method') or 'rmw'
+    if state == 'update' and version == 2 and method != 'rmw' and not check_mode:
+        try:
+            response = hashivault_kv2_patch(client, secret, data, mount_point=mount_point, cas=cas)
+        except KV2PatchUnsupported as e:
+            if method == 'patch':
+                result['rc'] = 1
+                result['failed'] = True
+                result['msg'] = u"Error %s patching %s" % (e, secret_path)
+                return result
+        except Exception as e:
+            result['rc'] = 1
+            result['failed'] = True
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            result['msg'] = u"Error %s writing %s" % (error_string, secret_path)
+            return result
+        else:
+            hashivault_read_cache_invalidate(params, mount_point, secret)
+            if fingerprint:
+                hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint, response, metadata, result)
+            result['msg'] = u"Secret %s patched" % secret_path
+            result['changed'] = True
+            return result
+
+    read_version = None
     try:
         if version == 2:
             read_data = client.secrets.kv.v2.read_secret_version(secret, mount_point=mount_point)
             read_data = read_data.get('data', {})
+            read_version = read_data.get('metadata', {}).get('version')
         else:
             read_data = client.secrets.kv.v1.read_secret(secret, mount_point=mount_point)
         read_data = read_data.get('data', {})
@@ -122,13 +306,22 @@ def hashivault_secret(module):
         # result['read_data'] = read_data
 
         if not changed:
+            if fingerprint and not check_mode:
+                response = {'data': {'version': read_version}}
+                hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint, response, metadata, result)
             result['msg'] = u"Secret %s unchanged" % secret_path
             return result
-        if not module.check_mode:
+        changed_keys = get_keys_updated(write_data, read_data)
+        result['diff'] = dict(before=_hidden_keys(read_data),
+                              after=_hidden_keys(write_data, changed_keys, read_data))
+        if not check_mode:
             try:
                 if version == 2:
-                    client.secrets.kv.v2.create_or_update_secret(
+                    response = client.secrets.kv.v2.create_or_update_secret(
                         mount_point=mount_point, cas=cas, path=secret, secret=write_data)
+                    if fingerprint:
+                        hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint, response, metadata,
+                                                          result)
                 else:
                     client.secrets.kv.v1.create_or_update_secret(
                         mount_point=mount_point, path=secret, secret=write_data)
@@ -139,9 +332,15 @@ def hashivault_secret(module):
                 result['msg'] = u"Error %s writing %s" % (error_string, secret_path)
                 return result
 
+        hashivault_read_cache_invalidate(params, mount_point, secret)
         result['msg'] = u"Secret %s written" % secret_path
         result['changed'] = True
     else:
+        result['diff'] = dict(before=_hidden_keys(read_data), after={})
+        if check_mode:
+            result['msg'] = u"Secret %s deleted" % secret_path
+            result['changed'] = True
+            return result
         try:
             if version == 2:
                 if permanent:
@@ -159,6 +358,7 @@ def hashivault_secret(module):
             error_string = "%s(%s)" % (e.__class__.__name__, e)
             result['msg'] = u"Error %s deleting %s" % (error_string, secret_path)
             return result
+        hashivault_read_cache_invalidate(params, mount_point, secret)
         result['msg'] = u"Secret %s deleted" % secret_path
         result['changed'] = True
     return result
@@ -3,8 +3,6 @@
 
 import copy
 
-import yaml
-
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
@@ -314,6 +312,38 @@ EXAMPLES = r"""
 """
 
 
+# checked against DOCUMENTATION by benchmarks/importtime.py
+CONFIG_TYPES = {
+    "key": "str",
+    "admin_user": "str",
+    "default_user": "str",
+    "cidr_list": "str",
+    "exclude_cidr_list": "str",
+    "port": "int",
+    "key_type": "str",
+    "key_bits": "int",
+    "install_script": "str",
+    "allowed_users": "str",
+    "allowed_users_template": "bool",
+    "allowed_domains": "str",
+    "key_option_specs": "str",
+    "ttl": "str",
+    "max_ttl": "str",
+    "allowed_critical_options": "str",
+    "allowed_extensions": "str",
+    "default_critical_options": "dict",
+    "default_extensions": "dict",
+    "allow_user_certificates": "bool",
+    "allow_host_certificates": "bool",
+    "allow_bare_domains": "bool",
+    "allow_subdomains": "bool",
+    "allow_user_key_ids": "bool",
+    "key_id_format": "str",
+    "allowed_user_key_lengths": "dict",
+    "algorithm_signer": "str",
+}
+
+
 def main():
     argspec = hashivault_argspec()
     argspec["name"] = dict(required=True, type="str")
@@ -388,10 +418,8 @@ def hashivault_ssh_role(module):
             # normalize some keys. This is a quirk of the vault api that it
             # expects a different data format in the PUT/POST endpoint than
             # it returns in the GET endpoint.
-            doc = yaml.safe_load(DOCUMENTATION)
-            args = doc.get("options").get("config").get("suboptions")
             try:
-                data = hashivault_normalize_from_doc(module, desired_state, args)
+                data = hashivault_normalize_from_doc(module, desired_state, CONFIG_TYPES)
             except Exception as e:
                 return e.args[0]
             # create or update
@@ -3,8 +3,6 @@
 
 import copy
 
-import yaml
-
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
 from ansible.module_utils.hashivault import hashivault_init
@@ -190,6 +188,25 @@ EXAMPLES = r"""
 """
 
 
+# checked against DOCUMENTATION by benchmarks/importtime.py
+CONFIG_TYPES = {
+    "allowed_policies": "list",
+    "disallowed_policies": "list",
+    "allowed_policies_glob": "list",
+    "disallowed_policies_glob": "list",
+    "orphan": "bool",
+    "renewable": "bool",
+    "path_suffix": "str",
+    "allowed_entity_aliases": "list",
+    "token_bound_cidrs": "list",
+    "token_explicit_max_ttl": "str",
+    "token_no_default_policy": "bool",
+    "token_num_uses": "int",
+    "token_period": "str",
+    "token_type": "str",
+}
+
+
 def main():
     argspec = hashivault_argspec()
     argspec["name"] = dict(required=True, type="str")
@@ -265,10 +282,8 @@ def hashivault_token_role(module):
             # it returns in the GET endpoint.
             extra_params = {}
 
-            doc = yaml.safe_load(DOCUMENTATION)
-            args = doc.get("options").get("config").get("suboptions")
             try:
-                extra_params = hashivault_normalize_from_doc(module, desired_state, args)
+                extra_params = hashivault_normalize_from_doc(module, desired_state, CONFIG_TYPES)
             except Exception as e:
                 return e.args[0]
             # create or update
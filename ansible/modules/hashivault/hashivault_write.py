@@ -1,12 +1,23 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import time
+
 from hvac.exceptions import InvalidPath
 
+from ansible.module_utils.hashivault import KV2PatchUnsupported
 from ansible.module_utils.hashivault import is_state_changed
 from ansible.module_utils.hashivault import hashivault_argspec
 from ansible.module_utils.hashivault import hashivault_auth_client
+from ansible.module_utils.hashivault import hashivault_backoff
+from ansible.module_utils.hashivault import hashivault_cas_conflict
+from ansible.module_utils.hashivault import hashivault_fingerprint
 from ansible.module_utils.hashivault import hashivault_init
+from ansible.module_utils.hashivault import hashivault_kv2_fingerprint_matches
+from ansible.module_utils.hashivault import hashivault_kv2_metadata
+from ansible.module_utils.hashivault import hashivault_kv2_patch
+from ansible.module_utils.hashivault import hashivault_kv2_record_fingerprint
 from ansible.module_utils.hashivault import hashiwrapper
+from ansible.module_utils.hashivault import hashivault_read_cache_invalidate
 
 ANSIBLE_METADATA = {'status': ['stableinterface'], 'supported_by': 'community', 'version': '1.1'}
 DOCUMENTATION = '''
@@ -42,6 +53,35 @@ options:
             - This option is deprecated. Update the secret rather than overwrite. The module will read the secret and
               overlay with the data provided and write.
         default: False
+    method:
+        description:
+            - how update is applied to a kv version 2 secret. `rmw` reads the secret, overlays data and writes the
+              whole secret back if it changed. `patch` sends only data in one JSON merge patch request, keys set to
+              null are removed; the secret must exist, the server must be vault 1.9 or later and the token needs
+              the patch capability. The task is then always reported as changed. `auto` patches when possible and
+              falls back to `rmw` otherwise. Check mode always uses `rmw`.
+        choices: ["rmw", "patch", "auto"]
+        default: rmw
+    fingerprint:
+        description:
+            - kv version 2 only. Store a hash of data and update in the custom_metadata of the secret when it is
+              written and, on later runs, read only the metadata and skip the read and the write when the hash
+              still matches its current version. The token needs read and update capabilities on the metadata path.
+        type: bool
+        default: false
+    optimistic:
+        description:
+            - kv version 2 with update only. Write the merged secret with cas set to the version that was read and,
+              when another writer got there first, read, merge and write again after an exponential backoff with
+              jitter until optimistic_timeout. Concurrent updates of different keys of one secret are then not
+              lost. The number of retries is returned in retries. Cannot be used with cas.
+        type: bool
+        default: false
+    optimistic_timeout:
+        description:
+            - seconds to keep retrying an optimistic write that conflicts with other writers.
+        type: int
+        default: 30
 extends_documentation_fragment: hashivault
 '''
 EXAMPLES = '''
@@ -65,6 +105,10 @@ def main():
     argspec['data'] = dict(required=False, default={}, type='dict', no_log=True)
     argspec['alternate_data'] = dict(required=False, default={}, type='dict')
     argspec['cas'] = dict(required=False, type='int')
+    argspec['method'] = dict(required=False, type='str', choices=['rmw', 'patch', 'auto'], default='rmw')
+    argspec['fingerprint'] = dict(required=False, type='bool', default=False)
+    argspec['optimistic'] = dict(required=False, type='bool', default=False)
+    argspec['optimistic_timeout'] = dict(required=False, type='int', default=30)
     module = hashivault_init(argspec, supports_check_mode=True)
     result = hashivault_write(module)
     if result.get('failed'):
@@ -93,61 +137,141 @@ def hashivault_write(module):
     else:
         secret_path = secret
 
+    optimistic = params.get('optimistic')
+    if optimistic and (version != 2 or not params.get('update') or cas is not None):
+        result['rc'] = 1
+        result['failed'] = True
+        result['msg'] = u"optimistic requires update and version 2 and cannot be used with cas"
+        return result
+
     changed = True
     write_data = data
+    method = params.get('method')
 
-    if params.get('update') or module.check_mode:
-        # Do not move these reads outside of the update
-        read_data = None
+    fingerprint = None
+    metadata = None
+    if params.get('fingerprint') and version == 2:
+        fingerprint = hashivault_fingerprint(data, 'update' if params.get('update') else 'present')
         try:
-            if version == 2:
-                read_data = client.secrets.kv.v2.read_secret_version(secret, mount_point=mount_point)
-            else:
-                read_data = client.secrets.kv.v1.read_secret(secret, mount_point=mount_point)
-        except InvalidPath:
-            read_data = None
+            metadata = hashivault_kv2_metadata(client, secret, mount_point=mount_point)
         except Exception as e:
             result['rc'] = 1
             result['failed'] = True
             error_string = "%s(%s)" % (e.__class__.__name__, e)
-            result['msg'] = u"Error %s reading %s" % (error_string, secret_path)
+            result['msg'] = u"Error %s reading metadata of %s" % (error_string, secret_path)
+            return result
+        if hashivault_kv2_fingerprint_matches(metadata, fingerprint):
+            result['msg'] = u"Secret %s unchanged" % secret_path
             return result
-        if not read_data:
-            read_data = {}
-        read_data = read_data.get('data', {})
-
-        if version == 2:
-            read_data = read_data.get('data', {})
-
-        write_data = dict(read_data)
-        write_data.update(data)
 
-        # result['write_data'] = write_data
-        # result['read_data'] = read_data
-        changed = is_state_changed(write_data, read_data)
+    if params.get('update') and version == 2 and method != 'rmw' and not module.check_mode:
+        try:
+            result['data'] = hashivault_kv2_patch(client, secret, data, mount_point=mount_point, cas=cas)
+        except KV2PatchUnsupported as e:
+            if method == 'patch':
+                result['rc'] = 1
+                result['failed'] = True
+                result['msg'] = u"Error %s patching %s" % (e, secret_path)
+                return result
+        except Exception as e:
+            result['rc'] = 1
+            result['failed'] = True
+            error_string = "%s(%s)" % (e.__class__.__name__, e)
+            result['msg'] = u"Error %s writing %s" % (error_string, secret_path)
+            return result
+        else:
+            hashivault_read_cache_invalidate(params, mount_point, secret)
+            if fingerprint:
+                hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint, result['data'], metadata,
+                                                  result)
+            result['msg'] = u"Secret %s patched" % secret_path
+            result['changed'] = True
+            return result
 
-    if changed:
-        if not module.check_mode:
+    if optimistic:
+        deadline = time.time() + params.get('optimistic_timeout')
+        result['retries'] = 0
+    while True:
+        if params.get('update') or module.check_mode:
+            # Do not move these reads outside of the update
+            read_data = None
             try:
                 if version == 2:
-                    returned_data = client.secrets.kv.v2.create_or_update_secret(mount_point=mount_point, cas=cas,
-                                                                                 path=secret, secret=write_data)
+                    read_data = client.secrets.kv.v2.read_secret_version(secret, mount_point=mount_point)
                 else:
-                    returned_data = client.write_data(secret_path, data=write_data)
-                if returned_data:
-                    from requests.models import Response
-                    if isinstance(returned_data, Response):
-                        result['data'] = returned_data.text
-                    else:
-                        result['data'] = returned_data
+                    read_data = client.secrets.kv.v1.read_secret(secret, mount_point=mount_point)
+            except InvalidPath:
+                read_data = None
             except Exception as e:
                 result['rc'] = 1
                 result['failed'] = True
                 error_string = "%s(%s)" % (e.__class__.__name__, e)
-                result['msg'] = u"Error %s writing %s" % (error_string, secret_path)
+                result['msg'] = u"Error %s reading %s" % (error_string, secret_path)
                 return result
+            if not read_data:
+                read_data = {}
+            read_data = read_data.get('data', {})
+
+            read_version = None
+            if version == 2:
+                read_version = read_data.get('metadata', {}).get('version')
+                read_data = read_data.get('data', {})
+
+            if optimistic:
+                if read_version is None:
+                    # missing or latest version deleted, the metadata still has the version to check against
+                    try:
+                        read_version = (hashivault_kv2_metadata(client, secret, mount_point=mount_point) or {}).get(
+                            'current_version')
+                    except Exception as e:
+                        result['rc'] = 1
+                        result['failed'] = True
+                        error_string = "%s(%s)" % (e.__class__.__name__, e)
+                        result['msg'] = u"Error %s reading metadata of %s" % (error_string, secret_path)
+                        return result
+                cas = read_version or 0
+
+            write_data = dict(read_data)
+            write_data.update(data)
+
+            # result['write_data'] = write_data
+            # result['read_data'] = read_data
+            changed = is_state_changed(write_data, read_data)
+            if not changed and fingerprint and not module.check_mode:
+                hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint,
+                                                  {'data': {'version': read_version}}, metadata, result)
+
+        if changed:
+            if not module.check_mode:
+                try:
+                    if version == 2:
+                        returned_data = client.secrets.kv.v2.create_or_update_secret(mount_point=mount_point, cas=cas,
+                                                                                     path=secret, secret=write_data)
+                        if fingerprint:
+                            hashivault_kv2_record_fingerprint(client, secret, mount_point, fingerprint,
+                                                              returned_data, metadata, result)
+                    else:
+                        returned_data = client.write_data(secret_path, data=write_data)
+                    if returned_data:
+                        from requests.models import Response
+                        if isinstance(returned_data, Response):
+                            result['data'] = returned_data.text
+                        else:
+                            result['data'] = returned_data
+                except Exception as e:
+                    if optimistic and hashivault_cas_conflict(e) and time.time() < deadline:
+                        time.sleep(min(hashivault_backoff(result['retries']), max(deadline - time.time(), 0)))
+                        result['retries'] += 1
+                        continue
+                    result['rc'] = 1
+                    result['failed'] = True
+                    error_string = "%s(%s)" % (e.__class__.__name__, e)
+                    result['msg'] = u"Error %s writing %s" % (error_string, secret_path)
+                    return result
 
-        result['msg'] = u"Secret %s written" % secret_path
+            hashivault_read_cache_invalidate(params, mount_point, secret)
+            result['msg'] = u"Secret %s written" % secret_path
+        break
     result['changed'] = changed
     return result
 
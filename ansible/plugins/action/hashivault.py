@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Action plugin shared by the hashivault modules, each has an action plugin
+# of its own name importing this one.
+#
+# Most hashivault tasks run on the controller, delegate_to: localhost or
+# connection: local. For those the module is run inside the worker process
+# ansible forked for the task rather than packaged by AnsiballZ and started
+# in a new interpreter, which saves the interpreter start and the import of
+# hvac and requests on every task. The result is the one the module returns
+# when run the usual way, and the connections and logins of a task are kept
+# across the items of a loop.
+#
+# The module is run the usual way when:
+#    - the task does not run on the controller, or runs async or with become
+#    - ansible_python_interpreter names a python other than the controller's
+#    - the module or hvac cannot be imported by the controller, the module is
+#      not the one ansible found for the task, as with a role's library
+#    - hashivault_in_process is false:
+#        - hosts: localhost
+#          vars:
+#            hashivault_in_process: false
+#
+# Modules run on the controller either way get the pid of the ansible run in
+# HASHIVAULT_RUN_PID, so writes can drop what the lookups of the run keep in
+# their shared cache.
+#
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+from ansible.module_utils import basic
+from ansible.module_utils.common import warnings as module_warnings
+from ansible.module_utils.common.text.converters import to_bytes
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+from ansible.utils.vars import merge_hash
+from ansible.vars.clean import remove_internal_keys
+
+try:
+    from ansible.module_utils.common.json import Direction
+    from ansible.module_utils.common.json import get_module_encoder
+except ImportError:
+    # ansible-core < 2.19
+    from ansible.module_utils.common.json import AnsibleJSONEncoder
+    get_module_encoder = None
+
+try:
+    # The controller loads action plugins before forking the worker of a task,
+    # so every worker starts with hvac and requests imported.
+    import ansible.module_utils.hashivault  # noqa: F401
+except ImportError:
+    pass
+
+display = Display()
+
+PROFILE = 'legacy'
+AUTO_INTERPRETERS = ('auto', 'auto_legacy', 'auto_silent', 'auto_legacy_silent')
+
+
+@contextlib.contextmanager
+def _environment(environment):
+    """Set the environment of the task while the module runs in this process."""
+    saved = dict(os.environ)
+    os.environ.update((str(key), str(value)) for key, value in environment.items())
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+class ActionModule(ActionBase):
+
+    _supports_check_mode = True
+    _supports_async = True
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+
+        wrap_async = self._task.async_val and not self._connection.has_native_async
+        result = merge_hash(result, self._execute_hashivault_module(task_vars=task_vars, wrap_async=wrap_async))
+
+        if not wrap_async:
+            # remove a temporary path we created
+            self._remove_tmp_path(self._connection._shell.tmpdir)
+
+        return result
+
+    def _compute_environment_string(self, raw_environment_out=None):
+        environment = dict()
+        super(ActionModule, self)._compute_environment_string(environment)
+        if self._connection.transport == 'local':
+            # ansible runs tasks in forks of the ansible-playbook process
+            parent = multiprocessing.parent_process()
+            environment.setdefault('HASHIVAULT_RUN_PID', str(parent.pid if parent else os.getpid()))
+        if isinstance(raw_environment_out, dict):
+            raw_environment_out.clear()
+            raw_environment_out.update(environment)
+        return self._connection._shell.env_prefix(**environment)
+
+    def _execute_hashivault_module(self, module_name=None, module_args=None, task_vars=None, wrap_async=False):
+        """Run a hashivault module in this process when it can be, otherwise the way ansible runs modules."""
+        if module_name is None:
+            module_name = self._task.action
+        if module_args is None:
+            module_args = self._task.args
+        if task_vars is None:
+            task_vars = dict()
+        module = None
+        if not wrap_async:
+            module = self._in_process_module(module_name, task_vars)
+        if module is None:
+            return self._execute_module(module_name=module_name, module_args=module_args, task_vars=task_vars,
+                                        wrap_async=wrap_async)
+        display.vvv('running %s in process' % module_name, host=self._play_context.remote_addr)
+        return self._run_in_process(module, module_name, dict(module_args), task_vars)
+
+    def _in_process_module(self, module_name, task_vars):
+        """Return the python module of module_name if it can run in this process, None otherwise."""
+        reason = None
+        interpreter = self._templar.template(task_vars.get('ansible_python_interpreter'))
+        if not boolean(self._templar.template(task_vars.get('hashivault_in_process', True)), strict=False):
+            reason = 'hashivault_in_process is false'
+        elif self._connection.transport != 'local':
+            reason = 'the task does not run on the controller'
+        elif self._task.async_val or self._play_context.become:
+            reason = 'the task runs async or with become'
+        elif interpreter and interpreter not in AUTO_INTERPRETERS and \
+                os.path.realpath(interpreter) != os.path.realpath(sys.executable):
+            reason = 'ansible_python_interpreter is not the python of the controller'
+        if reason is not None:
+            display.vvvv('not running %s in process: %s' % (module_name, reason), host=self._play_context.remote_addr)
+            return None
+
+        path = self._shared_loader_obj.module_loader.find_plugin(module_name, mod_type='.py',
+                                                                 collection_list=self._task.collections)
+        try:
+            module = importlib.import_module('ansible.modules.hashivault.' + module_name.rpartition('.')[2])
+        except ImportError as e:
+            display.vvvv('not running %s in process: %s' % (module_name, e), host=self._play_context.remote_addr)
+            return None
+        if not path or os.path.realpath(path) != os.path.realpath(module.__file__):
+            display.vvvv('not running %s in process: ansible found it in %s' % (module_name, path),
+                         host=self._play_context.remote_addr)
+            return None
+        return module
+
+    def _run_in_process(self, module, module_name, module_args, task_vars):
+        """Run the main function of module with module_args and return its result as _execute_module does."""
+        self._update_module_args(module_name, module_args, task_vars)
+        environment = dict()
+        self._compute_environment_string(environment)
+
+        params = dict(ANSIBLE_MODULE_ARGS=module_args)
+        if get_module_encoder is not None:
+            basic._ANSIBLE_ARGS = to_bytes(json.dumps(
+                params, cls=get_module_encoder(PROFILE, Direction.CONTROLLER_TO_MODULE)))
+            basic._ANSIBLE_PROFILE = PROFILE
+        else:
+            basic._ANSIBLE_ARGS = to_bytes(json.dumps(params, cls=AnsibleJSONEncoder, vault_to_text=True))
+        # warnings are kept process wide until the module exits, which it no longer does
+        module_warnings._global_warnings.clear()
+        module_warnings._global_deprecations.clear()
+
+        out = io.StringIO()
+        try:
+            with _environment(environment), contextlib.redirect_stdout(out):
+                module.main()
+        except SystemExit:
+            pass
+        except Exception as e:
+            return dict(failed=True, msg='MODULE FAILURE: %s' % e, exception=traceback.format_exc())
+        finally:
+            basic._ANSIBLE_ARGS = None
+
+        res = dict(rc=0, stdout=out.getvalue(), stderr='')
+        if get_module_encoder is not None:
+            data = self._parse_returned_data(res, PROFILE)
+        else:
+            data = self._parse_returned_data(res)
+        remove_internal_keys(data)
+        return data
@@ -0,0 +1,2 @@
+# Runs hashivault_db_secret_engine_role in the controller process when the task runs there, see hashivault.py
+from ansible.plugins.action.hashivault import ActionModule  # noqa: F401
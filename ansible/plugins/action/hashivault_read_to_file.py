@@ -14,11 +14,11 @@ import os
 import tempfile
 
 from ansible.playbook.play_context import PlayContext
-from ansible.plugins.action import ActionBase
+from ansible.plugins.action.hashivault import ActionModule as HashivaultActionModule
 from ansible.utils.vars import merge_hash
 
 
-class ActionModule(ActionBase):
+class ActionModule(HashivaultActionModule):
 
     # load and return ansible copy action plugin
     # copied from `ansible/plugins/action/template.py`
@@ -37,7 +37,8 @@ class ActionModule(ActionBase):
         if task_vars is None:
             task_vars = dict()
 
-        results = super(ActionModule, self).run(tmp, task_vars)
+        # ActionBase.run, the run of HashivaultActionModule would run this module
+        results = super(HashivaultActionModule, self).run(tmp, task_vars)
 
         args = self._task.args.copy()
 
@@ -85,7 +86,7 @@ class ActionModule(ActionBase):
         results = merge_hash(
             results,
             # executes hashivault_read module on localhost
-            self._execute_module(module_name='hashivault_read', tmp=tmp, task_vars=task_vars, module_args=args)
+            self._execute_hashivault_module(module_name='hashivault_read', module_args=args, task_vars=task_vars)
         )
 
         if 'failed' in results and results['failed'] is True:
@@ -0,0 +1,2 @@
+# Runs hashivault_ssh_role_list in the controller process when the task runs there, see hashivault.py
+from ansible.plugins.action.hashivault import ActionModule  # noqa: F401
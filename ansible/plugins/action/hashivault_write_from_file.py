@@ -9,18 +9,19 @@
 #
 ########################################################################
 
-from ansible.plugins.action import ActionBase
+from ansible.plugins.action.hashivault import ActionModule as HashivaultActionModule
 from ansible.utils.vars import merge_hash
 
 
-class ActionModule(ActionBase):
+class ActionModule(HashivaultActionModule):
 
     def run(self, tmp=None, task_vars=None):
 
         if task_vars is None:
             task_vars = dict()
 
-        results = super(ActionModule, self).run(tmp, task_vars)
+        # ActionBase.run, the run of HashivaultActionModule would run this module
+        results = super(HashivaultActionModule, self).run(tmp, task_vars)
 
         args = self._task.args.copy()
 
@@ -57,7 +58,7 @@ class ActionModule(ActionBase):
         results = merge_hash(
             results,
             # executes hashivault_write module on localhost
-            self._execute_module(module_name='hashivault_write', tmp=tmp, task_vars=task_vars, module_args=args)
+            self._execute_hashivault_module(module_name='hashivault_write', module_args=args, task_vars=task_vars)
         )
 
         results['invocation']['module_args']['data'] = 'VALUE_SPECIFIED_IN_NO_LOG_PARAMETER'
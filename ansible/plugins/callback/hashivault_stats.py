@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Callback plugin summarizing the Vault requests of the hashivault modules and
+# lookups of a playbook run, per endpoint and per task:
+#
+#    [defaults]
+#    callbacks_enabled = hashivault_stats
+#
+# It sets VAULT_PROFILE, so modules run on the controller and the lookup
+# report their requests, see the profile option. Modules run on other hosts
+# need profile: true or VAULT_PROFILE in their environment.
+#
+import json
+import math
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+from ansible.plugins.callback import CallbackBase
+
+from ansible.module_utils.hashivault import hashivault_profile_drain
+from ansible.module_utils.hashivault import hashivault_profile_log
+
+DOCUMENTATION = '''
+    name: hashivault_stats
+    type: aggregate
+    short_description: Summarize the Vault requests of the hashivault modules and lookups
+    description:
+        - Collects the vault_profile of every hashivault module result and the profiles of the hashivault lookup
+          and prints, at the end of the run, the requests, logins, retries, bytes and latency percentiles per
+          Vault endpoint and per task.
+        - Lookups are counted against the task running when they report, which is exact with the linear strategy.
+        - Optionally writes the summary as JSON or as a Prometheus textfile.
+    requirements:
+        - enable in configuration with C(callbacks_enabled = hashivault_stats)
+    options:
+        json_path:
+            description: Write the summary as JSON to this file.
+            type: path
+            env:
+                - name: HASHIVAULT_STATS_JSON
+            ini:
+                - section: callback_hashivault_stats
+                  key: json_path
+        prometheus_path:
+            description: Write the summary to this file in the Prometheus text format, for the textfile collector.
+            type: path
+            env:
+                - name: HASHIVAULT_STATS_PROMETHEUS
+            ini:
+                - section: callback_hashivault_stats
+                  key: prometheus_path
+        top:
+            description: Number of endpoints and tasks shown in the summary, the ones with the most requests.
+            type: int
+            default: 10
+            env:
+                - name: HASHIVAULT_STATS_TOP
+            ini:
+                - section: callback_hashivault_stats
+                  key: top
+'''
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values, quantile):
+    """Nearest rank percentile of the sorted list values."""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, int(math.ceil(quantile * len(values))))) - 1]
+
+
+class Metrics(object):
+    """Requests, logins, retries, bytes and latencies of an endpoint or a task."""
+
+    def __init__(self):
+        self.runs = 0
+        self.requests = 0
+        self.errors = 0
+        self.logins = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies = []
+
+    def add_request(self, request):
+        self.requests += 1
+        if request.get('status', 0) >= 400 and request.get('status') != 404:
+            self.errors += 1
+        if request.get('path', '').endswith('/login'):
+            self.logins += 1
+        self.bytes_sent += request.get('bytes_sent', 0)
+        self.bytes_received += request.get('bytes_received', 0)
+        self.latencies.append(request.get('total', 0.0))
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        summary = OrderedDict((
+            ('runs', self.runs),
+            ('requests', self.requests),
+            ('errors', self.errors),
+            ('logins', self.logins),
+            ('retries', self.retries),
+            ('bytes_sent', self.bytes_sent),
+            ('bytes_received', self.bytes_received),
+            ('latency_sum', round(sum(latencies), 6)),
+        ))
+        for quantile in QUANTILES:
+            summary['p%d' % int(quantile * 100)] = round(percentile(latencies, quantile), 6)
+        summary['max'] = round(latencies[-1], 6) if latencies else 0.0
+        return summary
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'hashivault_stats'
+    CALLBACK_NEEDS_ENABLED = True
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        os.environ.setdefault('VAULT_PROFILE', 'true')
+        self.started = time.time()
+        self.task = None
+        self.endpoints = OrderedDict()
+        self.tasks = OrderedDict()
+        self.total = Metrics()
+        try:
+            self.profile_log = hashivault_profile_log(os.getpid())
+        except Exception as e:
+            self.profile_log = None
+            self._display.vvvv('hashivault_stats: lookup profiles not read: %s' % e)
+
+    def _metrics(self, table, key):
+        metrics = table.get(key)
+        if metrics is None:
+            metrics = table[key] = Metrics()
+        return metrics
+
+    def _add(self, task, report):
+        # retries are only known per module run or lookup, not per endpoint
+        metrics = [self.total, self._metrics(self.tasks, task)]
+        for item in metrics:
+            item.runs += 1
+            item.retries += report.get('retries', 0)
+        for request in report.get('requests', []):
+            endpoint = self._metrics(self.endpoints, '%s %s' % (request.get('method'), request.get('path')))
+            for item in metrics + [endpoint]:
+                item.add_request(request)
+
+    def _drain(self):
+        """Count the profiles reported by lookups against the current task."""
+        if self.profile_log is None:
+            return
+        try:
+            reports = hashivault_profile_drain(self.profile_log)
+        except Exception as e:
+            self._display.vvvv('hashivault_stats: lookup profiles not read: %s' % e)
+            return
+        for report in reports:
+            self._add(self.task or '(no task)', report)
+
+    def _task_name(self, task):
+        name = task.get_name().strip()
+        role = getattr(task, '_role', None)
+        if role is not None and not name.startswith(role.get_name()):
+            name = '%s : %s' % (role.get_name(), name)
+        return name
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._drain()
+        self.task = self._task_name(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.v2_playbook_on_task_start(task, False)
+
+    def _on_result(self, result):
+        self._drain()
+        task = self._task_name(result._task)
+        results = [result._result] + list(result._result.get('results') or [])
+        for item in results:
+            if isinstance(item, dict) and isinstance(item.get('vault_profile'), dict):
+                self._add(task, item['vault_profile'])
+
+    def v2_runner_on_ok(self, result):
+        self._on_result(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._on_result(result)
+
+    def summary(self):
+        return OrderedDict((
+            ('duration', round(time.time() - self.started, 3)),
+            ('total', self.total.summary()),
+            ('endpoints', OrderedDict((key, metrics.summary()) for key, metrics in self.endpoints.items())),
+            ('tasks', OrderedDict((key, metrics.summary()) for key, metrics in self.tasks.items())),
+        ))
+
+    def _table(self, title, rows):
+        top = self.get_option('top')
+        rows = sorted(rows.items(), key=lambda row: -row[1]['requests'])[:top]
+        width = max([len(title)] + [len(name) for name, _ in rows])
+        lines = ['%-*s %8s %6s %7s %6s %10s %9s %9s %9s' % (
+            width, title, 'requests', 'logins', 'retries', 'errors', 'bytes', 'p50', 'p95', 'p99')]
+        for name, row in rows:
+            lines.append('%-*s %8d %6d %7s %6d %10d %7.1fms %7.1fms %7.1fms' % (
+                width, name, row['requests'], row['logins'], row['retries'] if title == 'task' else '-',
+                row['errors'], row['bytes_sent'] + row['bytes_received'], row['p50'] * 1000, row['p95'] * 1000,
+                row['p99'] * 1000))
+        return '\n'.join(lines)
+
+    def v2_playbook_on_stats(self, stats):
+        self._drain()
+        summary = self.summary()
+        total = summary['total']
+        self._display.banner('HASHIVAULT STATS')
+        self._display.display('%d requests, %d logins, %d retries, %d errors, %d bytes, p95 %.1fms' % (
+            total['requests'], total['logins'], total['retries'], total['errors'],
+            total['bytes_sent'] + total['bytes_received'], total['p95'] * 1000))
+        if self.endpoints:
+            self._display.display(self._table('endpoint', summary['endpoints']))
+            self._display.display(self._table('task', summary['tasks']))
+        if self.get_option('json_path'):
+            self._write(self.get_option('json_path'), json.dumps(summary, indent=2) + '\n')
+        if self.get_option('prometheus_path'):
+            self._write(self.get_option('prometheus_path'), prometheus(summary))
+
+    def _write(self, path, content):
+        """Write content to path atomically, so a collector never reads a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.hashivault_stats')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.chmod(tmp, 0o644)
+            os.rename(tmp, path)
+        except Exception as e:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            self._display.warning('hashivault_stats: could not write %s: %s' % (path, e))
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus(summary):
+    """Render summary in the Prometheus text exposition format."""
+    counters = (
+        ('requests_total', 'Requests sent to Vault', 'requests'),
+        ('request_errors_total', 'Requests answered with an error status other than 404', 'errors'),
+        ('logins_total', 'Logins to Vault', 'logins'),
+        ('retries_total', 'Requests retried', 'retries'),
+        ('sent_bytes_total', 'Bytes of request bodies sent', 'bytes_sent'),
+        ('received_bytes_total', 'Bytes of response bodies received', 'bytes_received'),
+    )
+    series = []
+    for endpoint, row in summary['endpoints'].items():
+        method, _, path = endpoint.partition(' ')
+        series.append(('hashivault_endpoint_', 'method="%s",path="%s"' % (_label(method), _label(path)), row))
+    for task, row in summary['tasks'].items():
+        series.append(('hashivault_task_', 'task="%s"' % _label(task), row))
+    lines = []
+    for prefix, scope in (('hashivault_endpoint_', 'per endpoint'), ('hashivault_task_', 'per task')):
+        for suffix, description, key in counters:
+            if key == 'retries' and prefix == 'hashivault_endpoint_':
+                continue
+            name = prefix + suffix
+            lines.append('# HELP %s %s, %s.' % (name, description, scope))
+            lines.append('# TYPE %s counter' % name)
+            lines.extend('%s{%s} %d' % (name, labels, row[key]) for kind, labels, row in series if kind == prefix)
+        name = prefix + 'latency_seconds'
+        lines.append('# HELP %s Latency of the requests sent to Vault, %s.' % (name, scope))
+        lines.append('# TYPE %s summary' % name)
+        for kind, labels, row in series:
+            if kind != prefix:
+                continue
+            for quantile in QUANTILES:
+                lines.append('%s{%s,quantile="%s"} %s' % (name, labels, quantile, row['p%d' % int(quantile * 100)]))
+            lines.append('%s_sum{%s} %s' % (name, labels, row['latency_sum']))
+            lines.append('%s_count{%s} %d' % (name, labels, row['requests']))
+    lines.append('# HELP hashivault_run_duration_seconds Duration of the ansible run.')
+    lines.append('# TYPE hashivault_run_duration_seconds gauge')
+    lines.append('hashivault_run_duration_seconds %s' % summary['duration'])
+    return '\n'.join(lines) + '\n'
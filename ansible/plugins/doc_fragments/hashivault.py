@@ -8,7 +8,10 @@ class ModuleDocFragment(object):
     options:
         url:
             description:
-                - url for vault
+                - url for vault. Several nodes of a cluster can be given separated by commas; writes are then sent
+                  to the active node and reads spread over the active node and the performance standbys. A node
+                  that fails is left out and probed again after a growing cooldown.
+                - A Vault Agent listening on a Unix socket is given as `unix:///path/agent.sock`.
             default: to environment variable `VAULT_ADDR`
         ca_cert:
             description:
@@ -35,8 +38,9 @@ class ModuleDocFragment(object):
         authtype:
             description:
                 - authentication type
+                - agent sends requests without a token, for a Vault Agent to add the token of its auto-auth.
             default: token or environment variable `VAULT_AUTHTYPE`
-            choices: ["token", "userpass", "github", "ldap", "approle"]
+            choices: ["token", "userpass", "github", "ldap", "approle", "agent"]
         login_mount_point:
             description:
                 - authentication mount point
@@ -65,4 +69,83 @@ class ModuleDocFragment(object):
             description:
                 - The timeout value (seconds) for requests sent to Vault.
             default: 30
+        token_cache:
+            description:
+                - Cache login tokens in an encrypted file on the controller and reuse them across tasks until they
+                  near expiry. Tokens are renewed when renewable and a fresh login is only done on expiry or when
+                  Vault rejects the cached token, that is when a request and auth/token/lookup-self both get a 403,
+                  a 403 on the request alone is a missing capability. Requires the cryptography python library.
+                  The cache is encrypted with `VAULT_TOKEN_CACHE_KEY` if set, otherwise with a random key stored
+                  beside the cache. Both files are only readable by their owner. Without `VAULT_TOKEN_CACHE_KEY`
+                  anyone who can read the cache can read its key too, so the encryption protects no more than the
+                  file permissions; set it to keep the tokens safe from whoever can read the files.
+            default: to environment variable `VAULT_TOKEN_CACHE` or false
+        token_cache_path:
+            description:
+                - Path of the token cache file.
+            default: to environment variable `VAULT_TOKEN_CACHE_PATH` or `~/.ansible/hashivault/token_cache`
+        pool_connections:
+            description:
+                - Number of Vault hosts to keep a connection pool for. Pools are shared by every client in the
+                  process with the same pool settings, so connections and TLS sessions are reused.
+            default: 10
+        pool_maxsize:
+            description:
+                - Number of connections kept open per Vault host.
+            default: 10, or concurrency when larger
+        pool_block:
+            description:
+                - Wait for a pooled connection to be free instead of opening an extra one that is closed after use.
+            default: false
+        retries:
+            description:
+                - Number of times a request is sent again after a rate limit (429), a sealed or standby node (503),
+                  a stale read (412) or, for reads and deletes only, a server or connection error. The number of
+                  retries done is returned in request_retries.
+            default: to environment variable `VAULT_MAX_RETRIES` or 0
+        retry_backoff:
+            description:
+                - Base delay in seconds of the exponential backoff with full jitter between retries. A Retry-After
+                  sent by Vault is used instead when present.
+            default: 0.5
+        deadline:
+            description:
+                - Seconds after which the task stops retrying requests.
+        discover_nodes:
+            description:
+                - Ask the cluster behind url for its nodes, with sys/ha-status when the token may read it and
+                  sys/leader otherwise, and route requests over them as if they were given in url.
+            default: to environment variable `VAULT_DISCOVER_NODES` or false
+        read_consistency:
+            description:
+                - Read your writes on clusters with performance standbys. With `index` the X-Vault-Index returned by
+                  writes is kept on the controller and sent with later reads to the same url, also by later tasks,
+                  and a standby that has not caught up yet answers 412, which is retried. `forward` also asks such
+                  a standby to forward the read to the active node instead.
+            choices: ["none", "index", "forward"]
+            default: to environment variable `VAULT_READ_CONSISTENCY` or none
+        index_state_path:
+            description:
+                - Path of the file keeping the last X-Vault-Index of every url for read_consistency.
+            default: to environment variable `VAULT_INDEX_STATE_PATH` or `~/.ansible/hashivault/index_state`
+        profile:
+            description:
+                - Return `vault_profile` with the task, listing every request sent to Vault with its method, path
+                  with names replaced by `*`, status, bytes sent and received and its latency split in connect, TLS
+                  and server time, next to the time spent importing, logging in and comparing states.
+            type: bool
+            default: to environment variable `VAULT_PROFILE` or false
+        broker:
+            description:
+                - Send the requests to Vault through the session broker of the current user, a process started on
+                  first use which listens on a Unix socket only the user may use. It keeps one authenticated client
+                  per url, namespace and identity and its connections to Vault open, so logins and TLS handshakes
+                  are done once for every task and lookup using it rather than once per task.
+            type: bool
+            default: to environment variable `VAULT_BROKER` or false
+        broker_idle_timeout:
+            description:
+                - Seconds the broker started by this task keeps running without being used.
+            type: int
+            default: to environment variable `VAULT_BROKER_IDLE_TIMEOUT` or 300
 '''
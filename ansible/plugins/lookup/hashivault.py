@@ -7,12 +7,32 @@
 #    ---
 #    - debug: msg="{{lookup('vault', 'ldapadmin', 'password', mount_point='kv2')}}"
 #
+# Several secrets can be read at once by passing each one as a [path, key]
+# list or as a dict with secret, key, default, version, mount_point and
+# secret_version. They are read concurrently over one authenticated client
+# and the values are returned in the order given:
+#    - debug: msg="{{query('hashivault', ['giant', 'foo'], ['giant', 'fie'], {'secret': 'stalks', 'default': ''})}}"
+#
+# With recursive=True the first term is a folder and every secret under it is
+# read, the value of each is returned in a dict keyed by path. include and
+# exclude take lists of globs to filter the paths:
+#    - debug: msg="{{lookup('hashivault', 'apps/web', 'password', recursive=True, version=2)}}"
+#
+# With shared_cache=True (or VAULT_SHARED_CACHE set) responses are also kept
+# in an encrypted cache shared by all forks of the ansible-playbook run, so a
+# secret wanted by many hosts at once is read from vault only once.
+#
+# With profile=True (or VAULT_PROFILE set) the requests of every lookup are
+# logged at -vvvv and handed to the hashivault_stats callback, if enabled.
+#
 # The plugin must be run with VAULT_ADDR and VAULT_TOKEN set and
 # exported.
 #
 # The plugin can be run manually for testing:
 #     python ansible/plugins/lookup/hashivault.py ldapadmin password
 #
+import json
+import multiprocessing
 import os
 import sys
 
@@ -20,8 +40,21 @@ from ansible.errors import AnsibleError
 from ansible.module_utils.basic import AnsibleFallbackNotFound
 from ansible.plugins.lookup import LookupBase
 
+from ansible.module_utils.hashivault import AdaptiveConcurrency
+from ansible.module_utils.hashivault import SharedReadCache
 from ansible.module_utils.hashivault import hashivault_argspec
+from ansible.module_utils.hashivault import hashivault_env_bool
+from ansible.module_utils.hashivault import hashivault_lazy_client
+from ansible.module_utils.hashivault import hashivault_map
+from ansible.module_utils.hashivault import hashivault_profile_append
+from ansible.module_utils.hashivault import hashivault_profiling
 from ansible.module_utils.hashivault import hashivault_read
+from ansible.module_utils.hashivault import hashivault_read_cache
+from ansible.module_utils.hashivault import hashivault_request_stats
+from ansible.module_utils.hashivault import hashivault_run_dir
+from ansible.module_utils.hashivault import hashivault_walk
+
+ITEM_OPTIONS = ('secret', 'key', 'default', 'version', 'mount_point', 'secret_version')
 
 
 class LookupModule(LookupBase):
@@ -48,29 +81,146 @@ class LookupModule(LookupBase):
             params['key'] = None
         return params
 
+    def _get_items(self, terms):
+        """Return the secrets to read when terms are [path, key] lists or dicts, None for a single secret."""
+        if not any(isinstance(term, (list, tuple, dict)) for term in terms):
+            return None
+        items = []
+        for term in terms:
+            if isinstance(term, (list, tuple)) and term and all(isinstance(t, (list, tuple, dict)) for t in term):
+                items.extend(self._get_item(t) for t in term)
+            else:
+                items.append(self._get_item(term))
+        return items
+
+    def _get_item(self, term):
+        if isinstance(term, dict):
+            unknown = set(term) - set(ITEM_OPTIONS)
+            if unknown or 'secret' not in term:
+                raise AnsibleError('Invalid hashivault lookup item %s, secret is required and only %s are allowed'
+                                   % (term, ', '.join(ITEM_OPTIONS)))
+            item = dict(term)
+            for option in ('version', 'secret_version'):
+                if item.get(option) is not None:
+                    item[option] = int(item[option])
+            return item
+        if isinstance(term, (list, tuple)):
+            if not 1 <= len(term) <= 2:
+                raise AnsibleError('Invalid hashivault lookup item %s, expected [path] or [path, key]' % (term,))
+            return dict(secret=term[0], key=term[1] if len(term) > 1 else None)
+        return dict(secret=term, key=None)
+
+    def _run_pid(self):
+        """Return the pid of the ansible-playbook process, lookups run in its forks."""
+        parent = multiprocessing.parent_process()
+        return parent.pid if parent else os.getpid()
+
+    def _shared_cache(self, params):
+        """Return the read cache shared by the forks of this ansible run, if asked for."""
+        if not params.get('shared_cache') or not params.get('cache'):
+            return None
+        return SharedReadCache(hashivault_run_dir(self._run_pid()))
+
+    def _error(self, path, key, result):
+        key = '/' + key if key else ''
+        return 'Error reading vault %s%s: %s\n%s' % (path, key, result.get('msg', 'msg not set'),
+                                                     result.get('stack_trace', ''))
+
     def run(self, terms, variables=None, **kwargs):
+        profile = kwargs.pop('profile', None)
+        if profile is None:
+            profile = hashivault_env_bool('VAULT_PROFILE')
+        with hashivault_profiling(profile) as vault_profile:
+            try:
+                return self._run(terms, variables, **kwargs)
+            finally:
+                if vault_profile is not None:
+                    self._report(vault_profile.report())
+
+    def _report(self, report):
+        report['lookup'] = 'hashivault'
+        self._display.vvvv('hashivault profile: %s' % json.dumps(report))
+        try:
+            hashivault_profile_append(self._run_pid(), report)
+        except Exception as e:
+            self._display.vvvv('hashivault profile not kept: %s' % e)
+
+    def _run(self, terms, variables=None, **kwargs):
         # self._display.v('Running lookup')
+        concurrency = int(kwargs.pop('concurrency', 8))
+        recursive = kwargs.pop('recursive', False)
+        include = kwargs.pop('include', None)
+        exclude = kwargs.pop('exclude', None)
+        kwargs.setdefault('pool_maxsize', max(10, concurrency))
         argspec = hashivault_argspec()
         argspec['version'] = dict(required=False, type='int', default=1)
         argspec['mount_point'] = dict(required=False, type='str', default='secret')
         argspec['secret'] = dict(required=True, type='str')
         argspec['key'] = dict(required=False, type='str')
         argspec['default'] = dict(required=False, default=None, type='str')
+        argspec['cache'] = dict(required=False, default=True, type='bool')
+        argspec['cache_max_age'] = dict(required=False, default=300, type='int')
+        argspec['shared_cache'] = dict(required=False, default=hashivault_env_bool('VAULT_SHARED_CACHE'), type='bool')
+        if recursive:
+            return self._run_recursive(terms, argspec, kwargs, concurrency, include, exclude)
+        items = self._get_items(terms)
+        if items is not None:
+            base_params = self._get_params(argspec, [''], kwargs)
+            return self._read_items(items, base_params, hashivault_lazy_client(base_params), concurrency)
         params = self._get_params(argspec, terms, kwargs)
         # self._display.v('ARGSPEC: ' + str(argspec))
         # self._display.v('KWARGS: ' + str(kwargs))
         # self._display.v('PARAMS: ' + str(params))
-        result = hashivault_read(params=params)
+        result = hashivault_read(params=params, shared_cache=self._shared_cache(params))
+        self._display.vvvv('hashivault read cache: %(hits)d hits, %(misses)d misses' % hashivault_read_cache.stats())
+        self._display.vvvv('hashivault request retries: %(retries)d' % hashivault_request_stats())
         if 'value' not in result:
-            path = terms[0]
             try:
-                key = '/' + terms[1]
+                key = terms[1]
             except IndexError:
-                key = ''
-            raise AnsibleError('Error reading vault %s%s: %s\n%s' % (path, key, result.get('msg', 'msg not set'),
-                                                                     result.get('stack_trace', '')))
+                key = None
+            raise AnsibleError(self._error(terms[0], key, result))
         return [result['value']]
 
+    def _run_recursive(self, terms, argspec, kwargs, concurrency, include, exclude):
+        """Read every secret under the folder terms[0], or only its key terms[1], and return them keyed by path."""
+        params = self._get_params(argspec, terms, kwargs)
+        mount_point = params['mount_point']
+        prefix = params['secret']
+        if prefix.startswith('/'):
+            mount_point, _, prefix = prefix.lstrip('/').partition('/')
+        get_client = hashivault_lazy_client(params)
+        try:
+            trie = hashivault_walk(get_client(), prefix, mount_point, version=params['version'],
+                                   exclude=exclude, concurrency=concurrency)
+        except Exception as e:
+            raise AnsibleError('Error listing vault %s: %s(%s)' % (terms[0], e.__class__.__name__, e))
+        paths = [path for path in trie.select(include=include, exclude=exclude) if not path.endswith('/')]
+        items = [dict(secret=path, key=params['key'], mount_point=mount_point) for path in paths]
+        return [dict(zip(paths, self._read_items(items, params, get_client, concurrency)))]
+
+    def _read_items(self, items, base_params, get_client, concurrency):
+        shared_cache = self._shared_cache(base_params)
+
+        def read(item):
+            params = dict(base_params)
+            params.update(item)
+            try:
+                return hashivault_read(params=params, client=get_client, shared_cache=shared_cache)
+            except Exception as e:
+                return {'failed': True, 'msg': '%s(%s)' % (e.__class__.__name__, e)}
+
+        controller = AdaptiveConcurrency(maximum=concurrency)
+        results = hashivault_map(read, items, concurrency=concurrency, controller=controller)
+        self._display.vvvv('hashivault scheduler: %s' % controller.report())
+        self._display.vvvv('hashivault read cache: %(hits)d hits, %(misses)d misses' % hashivault_read_cache.stats())
+        self._display.vvvv('hashivault request retries: %(retries)d' % hashivault_request_stats())
+        errors = [self._error(item['secret'], item.get('key'), result)
+                  for item, result in zip(items, results) if 'value' not in result]
+        if errors:
+            raise AnsibleError('\n'.join(errors))
+        return [result['value'] for result in results]
+
 
 def main(argv=sys.argv[1:]):
     if len(argv) < 1:
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+"""
+HTTP request budgets of the hashivault modules. Every case runs a module in
+this process against fake_vault.py for one scenario, create, update, no-op,
+delete or check mode, counts the requests Vault receives and fails when the
+count exceeds the budget of the case or the module does not report the
+expected changed. Requests are what a playbook costs Vault, so a change that
+raises a count must raise the budget here too, where review can see it.
+
+    tox -e budget
+    python benchmarks/budgets.py hashivault_policy hashivault_auth_method
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+
+from fake_vault import FakeVault
+from fake_vault import ROOT_TOKEN
+from fake_vault import make_certificate
+from run import run_module
+
+Case = namedtuple('Case', 'module scenario budget changed args setup check_mode')
+CASES = []
+
+RULES = 'path "secret/*" {\n  capabilities = ["read"]\n}\n'
+OTHER_RULES = 'path "secret/*" {\n  capabilities = ["list"]\n}\n'
+AUTH_CONFIG = dict(default_lease_ttl=2764800, max_lease_ttl=2764800, force_no_cache=False, token_type='default-service')
+
+
+def case(module, scenario, budget, changed, args=None, setup=None, check_mode=False):
+    """
+    Register a case: module run with args must cost at most budget requests.
+    setup(vault) seeds the fake Vault and may return more args for the module.
+    """
+    CASES.append(Case(module, scenario, budget, changed, args or {}, setup, check_mode))
+
+
+def seed_run(module, args, setup=None):
+    """Run module with args once, after setup if given, so the case measures a run finding it all in place."""
+    def seed(vault):
+        more = setup(vault) or {} if setup else {}
+        result = run_module(module, dict(args, url=vault.url, token=ROOT_TOKEN, **more))
+        if result.get('failed'):
+            raise Exception('seeding with %s failed: %s' % (module, result.get('msg')))
+        return more
+    return seed
+
+
+def seed_objects(objects):
+    """Put objects, a dict of path to data, in the plain store of the fake Vault."""
+    def setup(vault):
+        for path, data in objects.items():
+            vault.objects[path] = dict(data)
+    return setup
+
+
+def seed_ca_cert(option):
+    """Pass a CA certificate in PEM as option."""
+    def setup(vault):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(make_certificate(directory)[0]) as f:
+                return {option: f.read()}
+        finally:
+            shutil.rmtree(directory)
+    return setup
+
+
+def seed_kv2(data):
+    def setup(vault):
+        vault.put_kv2('budget/secret', data)
+    return setup
+
+
+def seed_policy(rules):
+    def setup(vault):
+        vault.policies['budget'] = rules
+    return setup
+
+
+def seed_auth(description=''):
+    def setup(vault):
+        vault.enable_auth('userpass', config=AUTH_CONFIG, description=description)
+    return setup
+
+
+def seed_pki_role(role):
+    def setup(vault):
+        vault.pki_roles['budget'] = dict(role)
+    return setup
+
+
+def seed_db_role(**role):
+    def setup(vault):
+        vault.db_roles['budget'] = dict(dict(default_ttl=0, max_ttl=0, creation_statements=[],
+                                             revocation_statements=[], rollback_statements=[],
+                                             renew_statements=[]), **role)
+    return setup
+
+
+def seed_entity_alias(on_entity='budget', by_id=False, denied=()):
+    def setup(vault):
+        vault.denied.update(denied)
+        accessor = vault.enable_auth('userpass')
+        entity_id = vault.add_entity('budget')
+        other_id = vault.add_entity('other')
+        alias_id = vault.add_entity_alias('budget', entity_id if on_entity == 'budget' else other_id, accessor)
+        for i in range(20):
+            vault.add_entity_alias('alias%d' % i, other_id, accessor)
+        args = dict(mount_accessor=accessor)
+        if by_id:
+            args['alias_id'] = alias_id
+        return args
+    return setup
+
+
+def seed_entity():
+    def setup(vault):
+        accessor = vault.enable_auth('userpass')
+        entity_id = vault.add_entity('budget')
+        vault.add_entity('other')
+        for i in range(20):
+            vault.add_entity_alias('alias%d' % i, entity_id, accessor)
+        return dict(mount_accessor=accessor)
+    return setup
+
+
+SECRET = dict(secret='budget/secret', data={'user': 'admin', 'password': 'x'})
+case('hashivault_secret', 'create', 2, True, SECRET)
+case('hashivault_secret', 'update', 2, True, SECRET, seed_kv2({'user': 'admin', 'password': 'y'}))
+case('hashivault_secret', 'no-op', 1, False, SECRET, seed_kv2(SECRET['data']))
+case('hashivault_secret', 'delete', 2, True, dict(secret='budget/secret', state='absent'),
+     seed_kv2(SECRET['data']))
+case('hashivault_secret', 'check mode', 1, True, SECRET, seed_kv2({'user': 'admin'}), check_mode=True)
+
+WRITE = dict(secret='budget/secret', version=2, data={'user': 'admin', 'password': 'x'})
+case('hashivault_write', 'create', 1, True, WRITE)
+case('hashivault_write', 'update', 2, True, dict(WRITE, update=True), seed_kv2({'user': 'admin'}))
+case('hashivault_write', 'no-op', 1, False, dict(WRITE, update=True), seed_kv2(WRITE['data']))
+case('hashivault_write', 'check mode', 1, True, dict(WRITE, update=True), seed_kv2({'user': 'admin'}),
+     check_mode=True)
+
+case('hashivault_read', 'read', 1, False, dict(secret='budget/secret', version=2), seed_kv2({'user': 'admin'}))
+case('hashivault_delete', 'delete', 1, True, dict(secret='budget/secret', version=2), seed_kv2({'user': 'admin'}))
+case('hashivault_list', 'list', 1, False, dict(secret='budget', version=2), seed_kv2({'user': 'admin'}))
+
+POLICY = dict(name='budget', rules=RULES)
+case('hashivault_policy', 'create', 2, True, POLICY)
+case('hashivault_policy', 'update', 2, True, POLICY, seed_policy(OTHER_RULES))
+case('hashivault_policy', 'no-op', 1, False, POLICY, seed_policy(RULES))
+case('hashivault_policy', 'delete', 2, True, dict(name='budget', state='absent'), seed_policy(RULES))
+case('hashivault_policy', 'check mode', 1, True, POLICY, seed_policy(OTHER_RULES), check_mode=True)
+case('hashivault_policy_get', 'read', 1, False, dict(name='budget'), seed_policy(RULES))
+case('hashivault_policy_list', 'list', 1, False)
+
+case('hashivault_acl_policy', 'create', 2, True, POLICY)
+case('hashivault_acl_policy', 'update', 2, True, POLICY, seed_policy(OTHER_RULES))
+case('hashivault_acl_policy', 'no-op', 1, False, POLICY, seed_policy(RULES))
+case('hashivault_acl_policy', 'delete', 2, True, dict(name='budget', state='absent'), seed_policy(RULES))
+case('hashivault_acl_policy', 'check mode', 1, True, POLICY, seed_policy(OTHER_RULES), check_mode=True)
+
+ENGINE = dict(name='budget', backend='kv', options={'version': '2'})
+case('hashivault_secret_engine', 'create', 2, True, ENGINE)
+case('hashivault_secret_engine', 'no-op', 1, False, dict(ENGINE, name='secret'))
+case('hashivault_secret_engine', 'delete', 2, True, dict(name='secret', state='absent'))
+case('hashivault_secret_engine', 'check mode', 1, True, ENGINE, check_mode=True)
+
+AUTH = dict(method_type='userpass', description='users')
+case('hashivault_auth_method', 'create', 3, True, AUTH)
+case('hashivault_auth_method', 'update', 3, True, AUTH, seed_auth(description='old'))
+case('hashivault_auth_method', 'no-op', 1, False, AUTH, seed_auth(description='users'))
+case('hashivault_auth_method', 'delete', 2, True, dict(method_type='userpass', state='disabled'), seed_auth())
+case('hashivault_auth_method', 'check mode', 1, True, AUTH, check_mode=True)
+
+PKI_ROLE = dict(name='budget', config={'allow_any_name': True, 'max_ttl': '1h'})
+PKI_CURRENT = dict(allow_any_name=True, max_ttl=3600)
+case('hashivault_pki_role', 'create', 2, True, PKI_ROLE)
+case('hashivault_pki_role', 'update', 2, True, PKI_ROLE, seed_pki_role(dict(PKI_CURRENT, max_ttl=60)))
+case('hashivault_pki_role', 'no-op', 1, False, PKI_ROLE, seed_pki_role(PKI_CURRENT))
+case('hashivault_pki_role', 'delete', 2, True, dict(name='budget', state='absent'), seed_pki_role(PKI_CURRENT))
+case('hashivault_pki_role', 'check mode', 1, True, PKI_ROLE, seed_pki_role(dict(PKI_CURRENT, max_ttl=60)),
+     check_mode=True)
+case('hashivault_pki_role_list', 'list', 1, False, setup=seed_pki_role(PKI_CURRENT))
+
+DB_ROLE = dict(name='budget', db_name='db', token_ttl=3600, creation_statements=['CREATE ROLE'])
+case('hashivault_db_secret_engine_role', 'create', 2, True, DB_ROLE)
+case('hashivault_db_secret_engine_role', 'update', 2, True, DB_ROLE,
+     seed_db_role(db_name='db', default_ttl=60, creation_statements=['CREATE ROLE']))
+case('hashivault_db_secret_engine_role', 'no-op', 1, False, DB_ROLE,
+     seed_db_role(db_name='db', default_ttl=3600, creation_statements=['CREATE ROLE']))
+case('hashivault_db_secret_engine_role', 'delete', 2, True, dict(name='budget', state='absent'),
+     seed_db_role(db_name='db'))
+case('hashivault_db_secret_engine_role', 'check mode', 1, True, DB_ROLE, check_mode=True)
+
+ALIAS = dict(name='budget', entity_name='budget')
+case('hashivault_identity_entity_alias', 'create', 3, True, ALIAS, seed_entity())
+case('hashivault_identity_entity_alias', 'update', 3, True, ALIAS, seed_entity_alias(on_entity='other'))
+case('hashivault_identity_entity_alias', 'no-op', 2, False, ALIAS, seed_entity_alias())
+case('hashivault_identity_entity_alias', 'no-op, scan', 3, False, ALIAS,
+     seed_entity_alias(denied=['identity/lookup/entity']))
+case('hashivault_identity_entity_alias', 'update, scan', 4, True, ALIAS,
+     seed_entity_alias(on_entity='other', denied=['identity/lookup/entity']))
+case('hashivault_identity_entity_alias', 'delete', 3, True, dict(ALIAS, state='absent'), seed_entity_alias())
+case('hashivault_identity_entity_alias', 'delete by id', 3, True, dict(ALIAS, state='absent'),
+     seed_entity_alias(by_id=True))
+
+
+case('hashivault_acl_policy_get', 'read', 1, False, dict(name='budget'), seed_policy(RULES))
+case('hashivault_acl_policy_list', 'list', 1, False)
+
+APPROLE = dict(name='budget', token_policies=['default'], token_num_uses=10)
+APPROLE_OBJECTS = {'auth/approle/role/budget': dict(token_ttl=3600, token_policies=['default']),
+                   'auth/approle/role/budget/role-id': dict(role_id='budget-role-id'),
+                   'auth/approle/role/budget/secret-id/budget-accessor': dict(secret_id='budget-secret-id',
+                                                                              secret_id_accessor='budget-accessor')}
+case('hashivault_approle_role', 'no-op', 1, False, APPROLE, seed_run('hashivault_approle_role', APPROLE))
+case('hashivault_approle_role_get', 'read', 1, False, dict(name='budget'), seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_id', 'read', 1, False, dict(name='budget'), seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_list', 'list', 1, False, setup=seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_secret', 'create', 1, True, dict(name='budget'), seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_secret_accessor_get', 'read', 1, False, dict(name='budget', accessor='budget-accessor'),
+     seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_secret_get', 'read', 1, False, dict(name='budget', secret='budget-secret-id'),
+     seed_objects(APPROLE_OBJECTS))
+case('hashivault_approle_role_secret_list', 'list', 1, False, dict(name='budget'), seed_objects(APPROLE_OBJECTS))
+
+AUDIT = dict(device_type='file', options={'file_path': '/tmp/audit.log'})
+case('hashivault_audit', 'no-op', 1, False, AUDIT, seed_run('hashivault_audit', AUDIT))
+case('hashivault_audit_list', 'list', 1, False, setup=seed_run('hashivault_audit', AUDIT))
+
+case('hashivault_auth_ldap', 'no-op', 1, False, dict(), seed_run('hashivault_auth_ldap', dict()))
+case('hashivault_auth_list', 'list', 1, False)
+AWS_AUTH_CONFIG = dict(access_key='key', secret_key='secret')
+case('hashivault_aws_auth_config', 'update', 1, True, AWS_AUTH_CONFIG)
+AWS_AUTH_ROLE = dict(name='budget', auth_type='iam', bound_iam_principal_arn='arn:aws:iam::1:role/budget')
+case('hashivault_aws_auth_role', 'update', 1, True, AWS_AUTH_ROLE)
+AZURE_AUTH_CONFIG = dict(tenant_id='tenant', client_id='client', client_secret='secret')
+case('hashivault_azure_auth_config', 'no-op', 1, False, AZURE_AUTH_CONFIG,
+     seed_run('hashivault_azure_auth_config', AZURE_AUTH_CONFIG))
+AZURE_AUTH_ROLE = dict(name='budget', policies=['default'], bound_subscription_ids=['subscription'])
+case('hashivault_azure_auth_role', 'no-op', 2, False, AZURE_AUTH_ROLE,
+     seed_run('hashivault_azure_auth_role', AZURE_AUTH_ROLE))
+AZURE_SECRET_CONFIG = dict(subscription_id='subscription', tenant_id='tenant', client_id='client',
+                           client_secret='secret')
+case('hashivault_azure_secret_engine_config', 'no-op', 1, False, AZURE_SECRET_CONFIG,
+     seed_run('hashivault_azure_secret_engine_config', AZURE_SECRET_CONFIG))
+AZURE_SECRET_ROLE = dict(name='budget', azure_role='[{"role_name": "Contributor", "scope": "/subscriptions/s"}]')
+case('hashivault_azure_secret_engine_role', 'create', 2, True, AZURE_SECRET_ROLE)
+
+CONSUL_ENGINE = dict(name='consul', backend='consul')
+CONSUL_CONFIG = dict(consul_address='127.0.0.1:8500', scheme='http', consul_token='token')
+case('hashivault_consul_secret_engine_config', 'update', 2, True, CONSUL_CONFIG,
+     seed_run('hashivault_secret_engine', CONSUL_ENGINE))
+CONSUL_ROLE = dict(name='budget', policies=['budget'])
+case('hashivault_consul_secret_engine_role', 'no-op', 2, False, CONSUL_ROLE,
+     seed_run('hashivault_consul_secret_engine_role', CONSUL_ROLE, seed_run('hashivault_secret_engine', CONSUL_ENGINE)))
+DB_CONFIG = dict(name='budget', plugin_name='postgresql-database-plugin', verify_connection=False,
+                 connection_details={'connection_url': 'postgresql://{{username}}@db/postgres', 'username': 'v',
+                                     'password': 'x'})
+case('hashivault_db_secret_engine_config', 'no-op', 1, False, DB_CONFIG,
+     seed_run('hashivault_db_secret_engine_config', DB_CONFIG))
+
+case('hashivault_cluster_status', 'read', 1, False)
+case('hashivault_leader', 'read', 1, False)
+case('hashivault_status', 'read', 1, False)
+case('hashivault_secret_list', 'list', 1, False)
+case('hashivault_init', 'no-op', 1, False)
+case('hashivault_seal', 'no-op', 1, False, setup=seed_run('hashivault_seal', dict()))
+case('hashivault_unseal', 'no-op', 1, False, dict(keys='key'))
+case('hashivault_generate_root_status', 'read', 1, False)
+case('hashivault_generate_root_init', 'create', 2, True)
+case('hashivault_generate_root', 'update', 1, True, dict(key='key', nonce='nonce'),
+     seed_run('hashivault_generate_root_init', dict()))
+case('hashivault_generate_root_cancel', 'no-op', 1, False)
+case('hashivault_rekey_status', 'read', 1, False)
+case('hashivault_rekey_init', 'create', 2, True, dict(secret_shares=1, secret_threshold=1))
+case('hashivault_rekey', 'update', 1, True, dict(key='key', nonce='nonce'),
+     seed_run('hashivault_rekey_init', dict(secret_shares=1, secret_threshold=1)))
+case('hashivault_rekey_verify', 'update', 1, True, dict(key='key', nonce='nonce'),
+     seed_run('hashivault_rekey_init', dict(secret_shares=1, secret_threshold=1, verification_required=True)))
+case('hashivault_rekey_cancel', 'delete', 2, True, setup=seed_run('hashivault_rekey_init', dict(secret_shares=1,
+                                                                                                secret_threshold=1)))
+
+ENTITY = dict(name='budget', policies=['default'])
+case('hashivault_identity_entity', 'no-op', 1, False, ENTITY, seed_run('hashivault_identity_entity', ENTITY))
+GROUP = dict(name='budget', group_type='external', policies=['default'])
+case('hashivault_identity_group', 'no-op', 1, False, GROUP, seed_run('hashivault_identity_group', GROUP))
+case('hashivault_identity_group_alias', 'no-op', 4, False, dict(name='budget', group_name='budget'),
+     seed_run('hashivault_identity_group_alias', dict(name='budget', group_name='budget'),
+              seed_run('hashivault_identity_group', GROUP)))
+case('hashivault_identity_group_alias_list', 'list', 1, False,
+     setup=seed_run('hashivault_identity_group_alias', dict(name='budget', group_name='budget'),
+                    seed_run('hashivault_identity_group', GROUP)))
+
+JWT_CONFIG = dict(jwks_url='https://example.com/jwks', bound_issuer='https://example.com')
+case('hashivault_jwt_auth_method_config', 'no-op', 1, False, JWT_CONFIG,
+     seed_run('hashivault_jwt_auth_method_config', JWT_CONFIG))
+JWT_ROLE = dict(name='budget', allowed_redirect_uris=['https://example.com/callback'], user_claim='sub',
+                bound_audiences=['budget'])
+case('hashivault_jwt_auth_role', 'no-op', 1, False, JWT_ROLE, seed_run('hashivault_jwt_auth_role', JWT_ROLE))
+OIDC_CONFIG = dict(oidc_discovery_url='https://example.com', oidc_client_id='client', oidc_client_secret='secret')
+case('hashivault_oidc_auth_method_config', 'no-op', 1, False, OIDC_CONFIG,
+     seed_run('hashivault_oidc_auth_method_config', OIDC_CONFIG))
+OIDC_ROLE = dict(JWT_ROLE)
+case('hashivault_oidc_auth_role', 'no-op', 1, False, OIDC_ROLE, seed_run('hashivault_oidc_auth_role', OIDC_ROLE))
+K8S_CONFIG = dict(kubernetes_host='https://kubernetes.default.svc')
+case('hashivault_k8s_auth_config', 'no-op', 1, False, K8S_CONFIG,
+     seed_run('hashivault_k8s_auth_config', K8S_CONFIG, seed_ca_cert('kubernetes_ca_cert')))
+K8S_ROLE = dict(name='budget', bound_service_account_names=['budget'], bound_service_account_namespaces=['default'])
+case('hashivault_k8s_auth_role', 'no-op', 2, False, K8S_ROLE, seed_run('hashivault_k8s_auth_role', K8S_ROLE))
+LDAP_GROUP = dict(name='budget', policies=['default'])
+case('hashivault_ldap_group', 'no-op', 1, False, LDAP_GROUP, seed_run('hashivault_ldap_group', LDAP_GROUP))
+RADIUS_CONFIG = dict(host='radius.example.com', secret='secret')
+case('hashivault_radius_config', 'no-op', 1, False, RADIUS_CONFIG, seed_run('hashivault_radius_config', RADIUS_CONFIG))
+RADIUS_USER = dict(name='budget', policies=['default'])
+case('hashivault_radius_user', 'no-op', 1, False, RADIUS_USER, seed_run('hashivault_radius_user', RADIUS_USER))
+USERPASS = {'name': 'budget', 'pass': 'x', 'policies': ['default']}
+case('hashivault_userpass', 'no-op', 1, False, USERPASS, seed_run('hashivault_userpass', USERPASS))
+NAMESPACE = dict(name='budget')
+case('hashivault_namespace', 'no-op', 1, False, NAMESPACE, seed_run('hashivault_namespace', NAMESPACE))
+
+PKI_CA = dict(common_name='budget')
+case('hashivault_pki_ca', 'no-op', 1, False, PKI_CA, seed_run('hashivault_pki_ca', PKI_CA))
+case('hashivault_pki_ca_set', 'update', 1, True, dict(pem_bundle='bundle'))
+case('hashivault_pki_cert_get', 'read', 1, False, dict(serial='01'),
+     seed_objects({'pki/cert/01': dict(certificate='c')}))
+case('hashivault_pki_cert_issue', 'create', 2, False, dict(role='budget', common_name='budget.example.com'),
+     seed_pki_role(PKI_CURRENT))
+case('hashivault_pki_cert_list', 'list', 1, False)
+case('hashivault_pki_cert_revoke', 'update', 1, False, dict(serial='01'))
+case('hashivault_pki_cert_sign', 'create', 2, True, dict(role='budget', csr='csr', common_name='budget.example.com'),
+     seed_pki_role(PKI_CURRENT))
+PKI_CRL = dict(expiry='72h')
+case('hashivault_pki_crl', 'no-op', 1, False, PKI_CRL, seed_run('hashivault_pki_crl', PKI_CRL))
+case('hashivault_pki_crl_get', 'read', 1, False, setup=seed_run('hashivault_pki_crl', PKI_CRL))
+case('hashivault_pki_crl_rotate', 'update', 1, True)
+case('hashivault_pki_role_get', 'read', 1, False, dict(name='budget'), seed_pki_role(PKI_CURRENT))
+case('hashivault_pki_set_signed', 'update', 1, True, dict(certificate='certificate'))
+case('hashivault_pki_tidy', 'update', 1, False)
+PKI_URL = dict(issuing_certificates=['https://vault/v1/pki/ca'])
+case('hashivault_pki_url', 'no-op', 1, False, PKI_URL, seed_run('hashivault_pki_url', PKI_URL))
+case('hashivault_pki_url_get', 'read', 1, False, setup=seed_run('hashivault_pki_url', PKI_URL))
+
+SSH_ROLE = dict(name='budget', config={'key_type': 'otp', 'default_user': 'budget'})
+case('hashivault_ssh_role', 'no-op', 1, False, SSH_ROLE, seed_run('hashivault_ssh_role', SSH_ROLE))
+case('hashivault_ssh_role_list', 'list', 1, False, setup=seed_run('hashivault_ssh_role', SSH_ROLE))
+
+case('hashivault_token_create', 'create', 1, True, dict(policies=['default'], display_name='budget'))
+case('hashivault_token_lookup', 'read', 1, False)
+case('hashivault_token_renew', 'update', 1, True)
+case('hashivault_token_revoke', 'delete', 1, True, dict(revoke_token='budget'))
+TOKEN_ROLE = dict(name='budget', config={'allowed_policies': ['default']})
+case('hashivault_token_role', 'no-op', 1, False, TOKEN_ROLE, seed_run('hashivault_token_role', TOKEN_ROLE))
+case('hashivault_token_role_list', 'list', 1, False, setup=seed_run('hashivault_token_role', TOKEN_ROLE))
+
+# hashivault_read_to_file and hashivault_write_from_file are action plugins running hashivault_read and
+# hashivault_write, their modules only hold the documentation
+
+
+def measure(item):
+    """Run item against a fresh fake Vault and return its request count and result."""
+    vault = FakeVault()
+    url = vault.start()
+    try:
+        args = dict(item.args)
+        if item.setup:
+            args.update(item.setup(vault) or {})
+        vault.reset_stats()
+        result = run_module(item.module, dict(args, url=url, token=ROOT_TOKEN), check_mode=item.check_mode)
+        return vault.stats()['requests'], result, list(vault.requests)
+    finally:
+        vault.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the HTTP request budgets of the hashivault modules.')
+    parser.add_argument('modules', nargs='*', help='modules to check, all by default')
+    parser.add_argument('--verbose', action='store_true', help='print the requests of every case')
+    args = parser.parse_args(argv)
+    cases = [item for item in CASES if not args.modules or item.module in args.modules]
+    if not cases:
+        parser.error('no cases for: %s' % ', '.join(args.modules))
+
+    failures = 0
+    print('%-44s %-13s %8s %6s  %s' % ('module', 'scenario', 'requests', 'budget', 'result'))
+    for item in cases:
+        try:
+            count, result, requests = measure(item)
+        except Exception as e:
+            failures += 1
+            print('%-44s %-13s %8s %6d  FAIL %s' % (item.module, item.scenario, '-', item.budget, e))
+            continue
+        status = 'ok'
+        if count > item.budget:
+            status = 'FAIL over budget'
+        elif bool(result.get('changed')) != item.changed:
+            status = 'FAIL changed is %s' % bool(result.get('changed'))
+        elif count < item.budget:
+            status = 'ok, lower the budget'
+        if status.startswith('FAIL'):
+            failures += 1
+        print('%-44s %-13s %8d %6d  %s' % (item.module, item.scenario, count, item.budget, status))
+        if args.verbose or status.startswith('FAIL'):
+            for method, path in requests:
+                print('    %s %s' % (method, path))
+    if failures:
+        print('%d of %d cases failed' % (failures, len(cases)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
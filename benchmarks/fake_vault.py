@@ -0,0 +1,781 @@
+"""
+In process stand-in for the parts of the Vault HTTP API the modules use, for
+benchmarks that must run without a Vault server. It serves kv version 1 and 2
+mounts, sys/mounts, sys/auth, ACL policies, approle and userpass logins,
+token lookup and renewal, sys/health, sys/leader, pki roles and certificate
+listing, database roles and identity entities and entity aliases, groups and
+group aliases. Sealing, root generation and rekeying go through their steps
+without keys being checked, token creation, secret-id generation and pki
+issuing return made up values. Any
+other path is kept in a plain store: a write merges its body into what the
+path holds, with policies and durations converted to the lists and seconds
+Vault returns, a read returns it both at the top level and under data, as
+sys/ endpoints do, a list returns the paths under it. Every request is counted
+with its size, and latency and errors can be injected.
+
+    vault = FakeVault(latency=0.002)
+    url = vault.start()
+    ...
+    vault.stats()
+    vault.stop()
+
+start_agent() also serves it on a Unix socket the way a Vault Agent listener
+with use_auto_auth_token does, requests without a token get the agent's.
+start_tls() serves it over HTTPS with a certificate from make_certificate().
+"""
+import json
+import os
+import datetime
+import ipaddress
+import random
+import socketserver
+import ssl
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT_TOKEN = 'root'
+DURATIONS = dict(s=1, m=60, h=3600, d=86400)
+UNAUTHENTICATED = ('sys/health', 'sys/leader', 'sys/init', 'sys/seal-status', 'sys/unseal', 'sys/generate-root/',
+                   'sys/rekey/', 'auth/approle/login', 'auth/userpass/login')
+
+
+class FakeVault(object):
+    """
+    latency is slept before answering every request. fail_rate is the share
+    of requests, outside sys/ and auth/, answered with fail_status. Statuses
+    pushed on fail_next are returned first, one per request. Paths in denied
+    are answered with 403, as Vault does when the token lacks the capability.
+    """
+
+    def __init__(self, latency=0.0, fail_rate=0.0, fail_status=503, token_ttl=3600):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.fail_next = []
+        self.denied = set()
+        self.token_ttl = token_ttl
+        self.lock = threading.Lock()
+        self.server = None
+        self.agent = None
+        self.tls = None
+        self.index = 0
+        self.tokens = {ROOT_TOKEN: dict(ttl=0, renewable=False, policies=['root'])}
+        self.users = {}
+        self.approles = {}
+        self.mounts = {
+            'secret/': dict(type='kv', options={'version': '2'}, config={}),
+            'kv/': dict(type='kv', options={'version': '1'}, config={}),
+            'pki/': dict(type='pki', options={}, config={}),
+            'database/': dict(type='database', options={}, config={}),
+            'sys/': dict(type='system', options={}, config={}),
+        }
+        self.auth = {'token/': dict(type='token', config={}, accessor='auth_token_0')}
+        self.policies = {'root': '', 'default': 'path "sys/capabilities-self" {\n  capabilities = ["update"]\n}\n'}
+        self.kv1 = {}
+        self.kv2 = {}
+        self.pki_roles = {}
+        self.pki_certs = []
+        self.db_roles = {}
+        self.entities = {}
+        self.entity_aliases = {}
+        self.groups = {}
+        self.group_aliases = {}
+        self.pki_ca = ''
+        self.sealed = False
+        self.root_generation = None
+        self.rekey = None
+        self.objects = {}
+        self.url = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = []
+            self.logins = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    def stats(self):
+        with self.lock:
+            return dict(requests=len(self.requests), logins=self.logins, bytes_in=self.bytes_in,
+                        bytes_out=self.bytes_out)
+
+    def start(self):
+        class Handler(_Handler):
+            vault = self
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        return self.url
+
+    def start_agent(self, path, token=ROOT_TOKEN):
+        """Serve on the Unix socket path as a Vault Agent logged in with token, return its url."""
+        class Handler(_Handler):
+            vault = self
+            agent_token = token
+            disable_nagle_algorithm = False
+        if os.path.exists(path):
+            os.unlink(path)
+        self.agent = _UnixHTTPServer(path, Handler)
+        thread = threading.Thread(target=self.agent.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return 'unix://' + path
+
+    def start_tls(self, certfile, keyfile, keep_alive=True):
+        """
+        Serve over HTTPS with the certificate in certfile, return its url. Without
+        keep_alive every response closes its connection, as some load balancers do.
+        """
+        class Handler(_Handler):
+            vault = self
+        Handler.keep_alive = keep_alive
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.tls = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.tls.daemon_threads = True
+        # the handshake is made by the thread of the connection, not the one accepting them
+        self.tls.socket = context.wrap_socket(self.tls.socket, server_side=True, do_handshake_on_connect=False)
+        thread = threading.Thread(target=self.tls.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return 'https://127.0.0.1:%d' % self.tls.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.tls:
+            self.tls.shutdown()
+            self.tls.server_close()
+        if self.agent:
+            self.agent.shutdown()
+            self.agent.server_close()
+            if os.path.exists(self.agent.server_address):
+                os.unlink(self.agent.server_address)
+
+    # data seeding helpers
+    def put_kv1(self, path, data, mount='kv'):
+        self.kv1[(mount, path)] = dict(data)
+
+    def put_kv2(self, path, data, mount='secret'):
+        entry = self.kv2.setdefault((mount, path), dict(versions={}, current=0, deleted=set(), custom_metadata=None))
+        entry['current'] += 1
+        entry['versions'][entry['current']] = dict(data)
+        return entry['current']
+
+    def add_user(self, username, password):
+        self.users[username] = password
+        self.enable_auth('userpass')
+
+    def add_approle(self, role_id, secret_id):
+        self.approles[role_id] = secret_id
+        self.enable_auth('approle')
+
+    def enable_auth(self, method_type, path=None, config=None, description=''):
+        path = (path or method_type).strip('/') + '/'
+        if path not in self.auth:
+            self.auth[path] = dict(type=method_type, config=dict(config or {}), description=description,
+                                   accessor='auth_%s_%d' % (method_type, len(self.auth)))
+        return self.auth[path]['accessor']
+
+    def add_entity(self, name):
+        entity_id = str(uuid.uuid4())
+        self.entities[entity_id] = dict(id=entity_id, name=name, metadata=None, policies=[], disabled=False)
+        return entity_id
+
+    def add_group(self, name):
+        group_id = str(uuid.uuid4())
+        self.groups[group_id] = dict(id=group_id, name=name, type='internal', metadata=None, policies=[],
+                                     member_entity_ids=[], member_group_ids=[])
+        return group_id
+
+    def add_entity_alias(self, name, canonical_id, mount_accessor):
+        alias_id = str(uuid.uuid4())
+        self.entity_aliases[alias_id] = dict(id=alias_id, name=name, canonical_id=canonical_id,
+                                             mount_accessor=mount_accessor)
+        return alias_id
+
+    def entity(self, entity_id):
+        entity = dict(self.entities[entity_id])
+        entity['aliases'] = [dict(alias) for alias in self.entity_aliases.values()
+                             if alias['canonical_id'] == entity_id]
+        return entity
+
+    def login(self):
+        token = str(uuid.uuid4())
+        self.logins += 1
+        self.tokens[token] = dict(ttl=self.token_ttl, renewable=True, policies=['default'])
+        return dict(auth=dict(client_token=token, accessor=str(uuid.uuid4()), policies=['default'],
+                              lease_duration=self.token_ttl, renewable=True))
+
+
+def _list_keys(paths, prefix):
+    prefix = prefix.strip('/')
+    if prefix:
+        prefix += '/'
+    keys = set()
+    for path in paths:
+        if path.startswith(prefix) and path != prefix:
+            head, sep, _ = path[len(prefix):].partition('/')
+            keys.add(head + sep)
+    return sorted(keys)
+
+
+def _stored(key, value):
+    """Return value as Vault returns a field named key it was written to."""
+    if not isinstance(value, str):
+        return value
+    if key.endswith('policies'):
+        return [policy.strip() for policy in value.split(',') if policy.strip()]
+    if key.endswith(('ttl', 'period', 'timeout')) and value[:-1].isdigit() and value[-1] in DURATIONS:
+        return int(value[:-1]) * DURATIONS[value[-1]]
+    return value
+
+
+def make_certificate(directory):
+    """
+    Write a self signed certificate for 127.0.0.1 and its key to directory,
+    return their paths. The certificate is its own CA. Needs cryptography.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'fake vault')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+    builder = builder.serial_number(x509.random_serial_number())
+    builder = builder.not_valid_before(now - datetime.timedelta(minutes=5))
+    builder = builder.not_valid_after(now + datetime.timedelta(days=1))
+    builder = builder.add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address(u'127.0.0.1'))]),
+                                    critical=False)
+    builder = builder.add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+    certificate = builder.sign(key, hashes.SHA256())
+    certfile = os.path.join(directory, 'vault.pem')
+    keyfile = os.path.join(directory, 'vault.key')
+    with open(certfile, 'wb') as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this the delayed ACK
+    # of the client adds 40ms to every request on a kept alive connection
+    disable_nagle_algorithm = True
+    vault = None
+    agent_token = None
+    keep_alive = True
+
+    def _token(self):
+        return self.headers.get('X-Vault-Token') or self.agent_token
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_HEAD(self):
+        self._handle('HEAD')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def do_LIST(self):
+        self._handle('LIST')
+
+    def _reply(self, status, body=None, headers=None, raw=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else raw or b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if not self.keep_alive:
+            self.send_header('Connection', 'close')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == 'HEAD':
+            return None
+        self.wfile.write(data)
+        self.vault.bytes_out += len(data)
+        return None
+
+    def _handle(self, method):
+        vault = self.vault
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if method == 'GET' and query.get('list'):
+            method = 'LIST'
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        body = json.loads(raw or b'{}') if method in ('POST', 'PATCH') else {}
+        path = parsed.path[len('/v1/'):]
+        if vault.latency:
+            time.sleep(vault.latency)
+        with vault.lock:
+            vault.requests.append((method, path))
+            vault.bytes_in += len(raw) + len(self.path)
+            if vault.fail_next:
+                return self._reply(vault.fail_next.pop(0), dict(errors=['injected']), {'Retry-After': '0'})
+            if vault.fail_rate and not path.startswith(('sys/', 'auth/')) and random.random() < vault.fail_rate:
+                return self._reply(vault.fail_status, dict(errors=['injected']))
+            if not path.startswith(UNAUTHENTICATED):
+                if self._token() not in vault.tokens or path in vault.denied:
+                    return self._reply(403, dict(errors=['permission denied']))
+            self.vault_path = path
+            try:
+                return self._route(method, path, body, query)
+            except KeyError:
+                return self._reply(404, dict(errors=[]))
+
+    def _route(self, method, path, body, query):
+        if path.startswith('sys/'):
+            return self._sys(method, path[len('sys/'):], body)
+        if path.startswith('auth/'):
+            return self._auth(method, path[len('auth/'):], body)
+        if path.startswith('identity/'):
+            return self._identity(method, path[len('identity/'):], body)
+        for mount, config in self.vault.mounts.items():
+            if (path + '/').startswith(mount):
+                rest = path[len(mount):]
+                if config['type'] == 'kv' and config['options'].get('version') == '2':
+                    return self._kv2(method, mount.rstrip('/'), rest, body, query)
+                if config['type'] == 'kv':
+                    return self._kv1(method, mount.rstrip('/'), rest, body)
+                if config['type'] == 'pki':
+                    return self._pki(method, rest, body)
+                if config['type'] == 'database':
+                    return self._database(method, rest, body)
+        return self._object(method, body)
+
+    def _sys(self, method, path, body):
+        vault = self.vault
+        if path.startswith('health'):
+            # GET and HEAD alike
+            return self._reply(200, dict(initialized=True, sealed=False, standby=False))
+        if path == 'leader':
+            return self._reply(200, dict(ha_enabled=False, is_self=True, leader_address=''))
+        if path == 'init':
+            if method == 'GET':
+                return self._reply(200, dict(initialized=True))
+            return self._reply(400, dict(errors=['Vault is already initialized']))
+        if path in ('seal-status', 'seal', 'unseal'):
+            if method == 'POST':
+                vault.sealed = path == 'seal'
+            if path == 'seal':
+                return self._reply(204)
+            return self._reply(200, dict(type='shamir', initialized=True, sealed=vault.sealed, t=1, n=1, progress=0,
+                                         nonce='', version='1.15.0', cluster_name='fake'))
+        if path.startswith('generate-root/'):
+            return self._operation(method, path[len('generate-root/'):], 'root_generation',
+                                   dict(progress=0, required=1, encoded_token='', encoded_root_token='',
+                                        pgp_fingerprint='', otp_length=24),
+                                   dict(encoded_token='ZmFrZQ==', encoded_root_token='ZmFrZQ=='))
+        if path.startswith('rekey/'):
+            return self._operation(method, path[len('rekey/'):], 'rekey',
+                                   dict(t=1, n=1, progress=0, required=1, pgp_fingerprints=None, backup=False,
+                                        verification_required=body.get('require_verification', False)),
+                                   dict(keys=['fake-key'], keys_base64=['ZmFrZS1rZXk=']))
+        if path in ('namespaces', 'namespaces/') and method == 'LIST':
+            keys = [key + '/' for key in _list_keys(vault.objects, 'sys/namespaces')]
+            if not keys:
+                return self._reply(404, dict(errors=[]))
+            return self._reply(200, dict(data=dict(keys=keys)))
+        if path == 'audit' and method == 'GET':
+            data = dict((key[len('sys/audit/'):] + '/', value) for key, value in vault.objects.items()
+                        if key.startswith('sys/audit/'))
+            return self._reply(200, dict(data, data=data))
+        if path == 'mounts' and method == 'GET':
+            data = dict((k, dict(v, accessor='x', description='', local=False, seal_wrap=False))
+                        for k, v in vault.mounts.items())
+            return self._reply(200, dict(data, data=data))
+        if path.startswith('mounts/'):
+            name = path[len('mounts/'):]
+            if name.endswith('/tune'):
+                mount = vault.mounts[name[:-len('/tune')] + '/']
+                if method == 'GET':
+                    config = dict(default_lease_ttl=2764800, max_lease_ttl=2764800, force_no_cache=False,
+                                  description=mount.get('description', ''), options=mount['options'])
+                    config.update(mount['config'])
+                    return self._reply(200, dict(config, data=config))
+                if 'description' in body:
+                    mount['description'] = body.pop('description')
+                mount['config'].update(body)
+                return self._reply(204)
+            if method == 'POST':
+                vault.mounts[name.strip('/') + '/'] = dict(type=body.get('type'), options=body.get('options') or {},
+                                                           config=body.get('config') or {},
+                                                           description=body.get('description', ''))
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.mounts.pop(name.strip('/') + '/', None)
+                return self._reply(204)
+        if path == 'auth' and method == 'GET':
+            data = dict((k, dict(v, description=v.get('description', ''))) for k, v in vault.auth.items())
+            return self._reply(200, dict(data, data=data))
+        if path.startswith('auth/'):
+            name = path[len('auth/'):].strip('/')
+            if name.endswith('/tune'):
+                auth = vault.auth[name[:-len('/tune')] + '/']
+                description = body.pop('description', None)
+                if description is not None:
+                    auth['description'] = description
+                auth['config'].update(body)
+            elif method == 'POST':
+                vault.enable_auth(body.get('type'), name, body.get('config'), body.get('description', ''))
+            elif method == 'DELETE':
+                vault.auth.pop(name + '/', None)
+            return self._reply(204)
+        if path in ('policy', 'policies/acl'):
+            keys = sorted(vault.policies)
+            return self._reply(200, dict(policies=keys, keys=keys, data=dict(policies=keys, keys=keys)))
+        for prefix in ('policy/', 'policies/acl/'):
+            if path.startswith(prefix):
+                name = path[len(prefix):]
+                if method == 'GET':
+                    rules = vault.policies[name]
+                    data = dict(name=name, rules=rules, policy=rules)
+                    return self._reply(200, dict(data, data=data))
+                if method == 'POST':
+                    vault.policies[name] = body.get('policy', body.get('rules', ''))
+                    return self._reply(204)
+                if method == 'DELETE':
+                    vault.policies.pop(name, None)
+                    return self._reply(204)
+        return self._object(method, body)
+
+    def _operation(self, method, path, attribute, status, completed):
+        """Serve the attempt of a root generation or a rekey, kept in attribute, which one key share completes."""
+        vault = self.vault
+        attempt = getattr(vault, attribute)
+        if path in ('attempt', 'init'):
+            if method == 'POST':
+                attempt = dict(status, started=True, nonce=str(uuid.uuid4()), complete=False)
+                setattr(vault, attribute, attempt)
+            elif method == 'DELETE':
+                setattr(vault, attribute, None)
+                return self._reply(204)
+            return self._reply(200, attempt or dict(status, started=False, nonce='', complete=False))
+        if path in ('update', 'verify') and method == 'POST':
+            if not attempt:
+                return self._reply(400, dict(errors=['no operation in progress']))
+            setattr(vault, attribute, None)
+            return self._reply(200, dict(attempt, complete=True, progress=1, **completed))
+        return self._reply(404, dict(errors=[]))
+
+    def _auth(self, method, path, body):
+        vault = self.vault
+        if path == 'approle/login':
+            if vault.approles.get(body.get('role_id')) != body.get('secret_id'):
+                return self._reply(400, dict(errors=['invalid role or secret ID']))
+            return self._reply(200, vault.login())
+        if path.startswith('userpass/login/'):
+            if vault.users.get(path[len('userpass/login/'):]) != body.get('password'):
+                return self._reply(400, dict(errors=['invalid username or password']))
+            return self._reply(200, vault.login())
+        token = self._token()
+        if path == 'token/lookup-self':
+            info = vault.tokens[token]
+            return self._reply(200, dict(data=dict(id=token, ttl=info['ttl'], renewable=info['renewable'],
+                                                   policies=info['policies'])))
+        if path == 'token/renew-self':
+            info = vault.tokens[token]
+            return self._reply(200, dict(auth=dict(client_token=token, lease_duration=info['ttl'],
+                                                   renewable=info['renewable'], policies=info['policies'])))
+        if path in ('token/lookup', 'token/renew') and method == 'POST':
+            info = vault.tokens[body.get('token')]
+            auth = dict(client_token=body.get('token'), lease_duration=info['ttl'], renewable=info['renewable'],
+                        policies=info['policies'])
+            if path == 'token/renew':
+                return self._reply(200, dict(auth=auth))
+            return self._reply(200, dict(data=dict(auth, id=body.get('token'), ttl=info['ttl'])))
+        if path.startswith('token/create') and method == 'POST':
+            created = str(uuid.uuid4())
+            policies = body.get('policies') or ['default']
+            vault.tokens[created] = dict(ttl=vault.token_ttl, renewable=True, policies=policies)
+            return self._reply(200, dict(auth=dict(client_token=created, accessor=str(uuid.uuid4()),
+                                                   policies=policies, lease_duration=vault.token_ttl,
+                                                   renewable=True)))
+        if path == 'token/revoke' and method == 'POST':
+            vault.tokens.pop(body.get('token'), None)
+            return self._reply(204)
+        if path.startswith('approle/role/') and path.endswith(('/secret-id', '/custom-secret-id')) and \
+                method == 'POST':
+            secret_id = body.get('secret_id') or str(uuid.uuid4())
+            accessor = str(uuid.uuid4())
+            vault.objects['auth/%s/secret-id/%s' % (path.rpartition('/')[0], accessor)] = dict(
+                secret_id=secret_id, secret_id_accessor=accessor, metadata=body.get('metadata') or {}, cidr_list=[])
+            return self._reply(200, dict(data=dict(secret_id=secret_id, secret_id_accessor=accessor)))
+        if path.startswith('approle/role/') and path.endswith(('/secret-id/lookup', '/secret-id-accessor/lookup')):
+            prefix = 'auth/%s/secret-id/' % path.rsplit('/', 2)[0]
+            wanted = body.get('secret_id_accessor') or body.get('secret_id')
+            for key, value in vault.objects.items():
+                if key.startswith(prefix) and wanted in (value.get('secret_id_accessor'), value.get('secret_id')):
+                    return self._reply(200, dict(data=dict((k, v) for k, v in value.items() if k != 'secret_id')))
+            return self._reply(204)
+        return self._object(method, body)
+
+    def _kv1(self, method, mount, path, body):
+        vault = self.vault
+        if method == 'LIST':
+            keys = _list_keys([p for m, p in vault.kv1 if m == mount], path)
+            if not keys:
+                return self._reply(404, dict(errors=[]))
+            return self._reply(200, dict(data=dict(keys=keys)))
+        if method == 'GET':
+            return self._reply(200, dict(data=vault.kv1[(mount, path)], lease_duration=2764800))
+        if method == 'POST':
+            vault.kv1[(mount, path)] = body
+            return self._reply(204)
+        if method == 'DELETE':
+            vault.kv1.pop((mount, path), None)
+            return self._reply(204)
+        return self._reply(405, dict(errors=[]))
+
+    def _kv2(self, method, mount, path, body, query):
+        vault = self.vault
+        kind, _, path = path.partition('/')
+        entry = vault.kv2.get((mount, path))
+        if kind == 'data':
+            if method == 'GET':
+                version = int(query.get('version', [0])[0]) or (entry or {}).get('current')
+                if not entry or version in entry['deleted'] or version not in entry['versions']:
+                    return self._reply(404, dict(errors=[]))
+                return self._reply(200, dict(data=dict(data=entry['versions'][version], metadata=dict(
+                    version=version, custom_metadata=entry['custom_metadata'], deletion_time='',
+                    destroyed=False)), lease_duration=0))
+            if method in ('POST', 'PATCH'):
+                cas = (body.get('options') or {}).get('cas')
+                current = entry['current'] if entry else 0
+                if cas is not None and cas != current:
+                    return self._reply(400, dict(errors=['check-and-set parameter did not match the current version']))
+                if method == 'PATCH':
+                    if not entry or current in entry['deleted']:
+                        return self._reply(404, dict(errors=[]))
+                    data = dict(entry['versions'][current])
+                    for key, value in body.get('data', {}).items():
+                        if value is None:
+                            data.pop(key, None)
+                        else:
+                            data[key] = value
+                else:
+                    data = body.get('data', {})
+                version = vault.put_kv2(path, data, mount=mount)
+                vault.index += 1
+                return self._reply(200, dict(data=dict(version=version)),
+                                   {'X-Vault-Index': 'fake-index-%d' % vault.index})
+            if method == 'DELETE':
+                if entry:
+                    entry['deleted'].add(entry['current'])
+                return self._reply(204)
+        if kind == 'config':
+            config = vault.mounts[mount + '/'].setdefault(
+                'kv_config', dict(max_versions=0, cas_required=False, delete_version_after='0s'))
+            if method == 'GET':
+                return self._reply(200, dict(data=config))
+            config.update(body)
+            return self._reply(204)
+        if kind == 'metadata':
+            if method == 'LIST':
+                keys = _list_keys([p for m, p in vault.kv2 if m == mount], path)
+                if not keys:
+                    return self._reply(404, dict(errors=[]))
+                return self._reply(200, dict(data=dict(keys=keys)))
+            if method == 'GET':
+                if not entry:
+                    return self._reply(404, dict(errors=[]))
+                versions = dict((str(v), dict(deletion_time='x' if v in entry['deleted'] else '', destroyed=False))
+                                for v in entry['versions'])
+                return self._reply(200, dict(data=dict(current_version=entry['current'], versions=versions,
+                                                       custom_metadata=entry['custom_metadata'])))
+            if method in ('POST', 'PATCH'):
+                if not entry:
+                    entry = vault.kv2[(mount, path)] = dict(versions={}, current=0, deleted=set(),
+                                                            custom_metadata=None)
+                if 'custom_metadata' in body:
+                    entry['custom_metadata'] = body['custom_metadata']
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.kv2.pop((mount, path), None)
+                return self._reply(204)
+        return self._reply(404, dict(errors=[]))
+
+    def _pki(self, method, path, body):
+        vault = self.vault
+        if path == 'ca/pem' and method == 'GET':
+            return self._reply(200, raw=vault.pki_ca.encode('utf-8'))
+        if path.startswith(('root/generate/', 'intermediate/generate/')) and method == 'POST':
+            vault.pki_ca = '-----BEGIN CERTIFICATE-----\nfake\n-----END CERTIFICATE-----\n'
+            return self._reply(200, dict(data=dict(certificate=vault.pki_ca, serial_number='00:01')))
+        if path == 'root' and method == 'DELETE':
+            vault.pki_ca = ''
+            return self._reply(204)
+        if path.startswith(('issue/', 'sign/')) and method == 'POST':
+            if path.partition('/')[2] not in vault.pki_roles:
+                return self._reply(400, dict(errors=['unknown role']))
+        if path.startswith(('issue/', 'sign/', 'sign-verbatim', 'root/sign-intermediate')) and method == 'POST':
+            serial = '00:%02x' % (len(vault.pki_certs) + 2)
+            vault.pki_certs.append(serial)
+            return self._reply(200, dict(data=dict(certificate='fake', issuing_ca=vault.pki_ca, serial_number=serial)))
+        if path == 'revoke' and method == 'POST':
+            return self._reply(200, dict(data=dict(revocation_time=int(time.time()))))
+        if path == 'crl/rotate' and method == 'GET':
+            return self._reply(200, dict(data=dict(success=True)))
+        if path in ('roles', 'roles/') and method == 'LIST':
+            return self._reply(200, dict(data=dict(keys=sorted(vault.pki_roles))))
+        if path in ('certs', 'certs/') and method == 'LIST':
+            return self._reply(200, dict(data=dict(keys=list(vault.pki_certs))))
+        if path.startswith('roles/'):
+            name = path[len('roles/'):]
+            if method == 'GET':
+                return self._reply(200, dict(data=vault.pki_roles[name]))
+            if method == 'POST':
+                vault.pki_roles[name] = body
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.pki_roles.pop(name, None)
+                return self._reply(204)
+        return self._object(method, body)
+
+    def _database(self, method, path, body):
+        vault = self.vault
+        if path in ('roles', 'roles/') and method == 'LIST':
+            return self._reply(200, dict(data=dict(keys=sorted(vault.db_roles))))
+        if path.startswith('roles/'):
+            name = path[len('roles/'):]
+            if method == 'GET':
+                return self._reply(200, dict(data=vault.db_roles[name]))
+            if method == 'POST':
+                role = dict(default_ttl=0, max_ttl=0, creation_statements=[], revocation_statements=[],
+                            rollback_statements=[], renew_statements=[])
+                role.update(body)
+                vault.db_roles[name] = role
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.db_roles.pop(name, None)
+                return self._reply(204)
+        return self._object(method, body)
+
+    def _identity(self, method, path, body):
+        vault = self.vault
+        for kind, store in (('entity', vault.entities), ('group', vault.groups)):
+            if path.startswith(kind + '/name/'):
+                name = path[len(kind + '/name/'):]
+                found = [item_id for item_id, item in store.items() if item['name'] == name]
+                if method == 'POST':
+                    if found:
+                        store[found[0]].update(body)
+                        return self._reply(204)
+                    item_id = vault.add_entity(name) if kind == 'entity' else vault.add_group(name)
+                    store[item_id].update(body)
+                    return self._reply(200, dict(data=dict(id=item_id, name=name)))
+                if not found:
+                    return self._reply(404, dict(errors=[]))
+                path = '%s/id/%s' % (kind, found[0])
+            if path.startswith(kind + '/id/'):
+                item_id = path[len(kind + '/id/'):]
+                if method == 'GET':
+                    item = vault.entity(item_id) if kind == 'entity' else dict(store[item_id])
+                    return self._reply(200, dict(data=item))
+                if method == 'POST':
+                    store[item_id].update(body)
+                    return self._reply(204)
+                if method == 'DELETE':
+                    store.pop(item_id, None)
+                    return self._reply(204)
+        if path in ('group-alias/id', 'group-alias/id/') and method == 'LIST':
+            if not vault.group_aliases:
+                return self._reply(404, dict(errors=[]))
+            return self._reply(200, dict(data=dict(keys=sorted(vault.group_aliases),
+                                                   key_info=dict(vault.group_aliases))))
+        if path == 'group-alias' and method == 'POST':
+            alias_id = str(uuid.uuid4())
+            vault.group_aliases[alias_id] = dict(id=alias_id, name=body.get('name'),
+                                                 canonical_id=body.get('canonical_id'),
+                                                 mount_accessor=body.get('mount_accessor'))
+            return self._reply(200, dict(data=dict(id=alias_id, canonical_id=body.get('canonical_id'))))
+        if path.startswith('group-alias/id/'):
+            alias = vault.group_aliases[path[len('group-alias/id/'):]]
+            if method == 'GET':
+                return self._reply(200, dict(data=alias))
+            if method == 'POST':
+                alias.update(body)
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.group_aliases.pop(alias['id'])
+                return self._reply(204)
+        if path == 'lookup/entity' and method == 'POST':
+            for alias in vault.entity_aliases.values():
+                if alias['name'] == body.get('alias_name') and \
+                        alias['mount_accessor'] == body.get('alias_mount_accessor'):
+                    return self._reply(200, dict(data=vault.entity(alias['canonical_id'])))
+            return self._reply(204)
+        if path in ('entity-alias/id', 'entity-alias/id/') and method == 'LIST':
+            if not vault.entity_aliases:
+                return self._reply(404, dict(errors=[]))
+            return self._reply(200, dict(data=dict(keys=sorted(vault.entity_aliases),
+                                                   key_info=dict(vault.entity_aliases))))
+        if path == 'entity-alias' and method == 'POST':
+            for alias in vault.entity_aliases.values():
+                if alias['name'] == body.get('name') and alias['mount_accessor'] == body.get('mount_accessor'):
+                    return self._reply(400, dict(errors=['combination of mount and alias name is already in use']))
+            alias_id = vault.add_entity_alias(body.get('name'), body.get('canonical_id'), body.get('mount_accessor'))
+            return self._reply(200, dict(data=dict(id=alias_id, canonical_id=body.get('canonical_id'))))
+        if path.startswith('entity-alias/id/'):
+            alias = vault.entity_aliases[path[len('entity-alias/id/'):]]
+            if method == 'GET':
+                return self._reply(200, dict(data=alias))
+            if method == 'POST':
+                alias.update(body)
+                return self._reply(204)
+            if method == 'DELETE':
+                vault.entity_aliases.pop(alias['id'])
+                return self._reply(204)
+        return self._object(method, body)
+
+    def _object(self, method, body):
+        """Serve the request from the plain store of the paths no other handler knows."""
+        objects = self.vault.objects
+        path = self.vault_path.rstrip('/')
+        if method == 'LIST':
+            keys = _list_keys(objects, path)
+            if not keys:
+                return self._reply(404, dict(errors=[]))
+            return self._reply(200, dict(data=dict(keys=keys)))
+        if method == 'GET':
+            data = objects[path]
+            return self._reply(200, dict(data, data=data))
+        if method in ('POST', 'PATCH'):
+            data = dict(objects.get(path) or {})
+            data.update((key, _stored(key, value)) for key, value in body.items())
+            objects[path] = data
+            return self._reply(204)
+        if method == 'DELETE':
+            objects.pop(path, None)
+            return self._reply(204)
+        return self._reply(405, dict(errors=[]))
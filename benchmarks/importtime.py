@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Import time budgets of module_utils, the modules and the plugins. Every
+target is imported by a new interpreter run with python -X importtime after
+the imports it cannot do without, hvac and ansible.module_utils.basic for a
+module, and what importing the target adds is checked against its budget,
+the median of --runs runs. Sources are compiled on every run, as they are
+for a module run from its AnsiballZ zip. Every module run pays this before
+it sends Vault a request, so a change that needs more must raise the budget
+here too.
+
+Modules must not import yaml, and the modules converting their config with
+CONFIG_TYPES must agree with the suboptions of their DOCUMENTATION, which
+they no longer parse when they run.
+
+    tox -e importtime
+    python benchmarks/importtime.py --runs 5 module_utils hashivault_pki_role
+"""
+import argparse
+import importlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from collections import namedtuple
+
+import yaml
+
+MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ansible', 'modules', 'hashivault')
+BASE = ('hvac', 'ansible.module_utils.basic')
+FORBIDDEN = ('yaml',)
+
+Target = namedtuple('Target', 'name module prelude budget forbidden')
+
+
+def targets():
+    """Budgets in milliseconds, generous enough for a busy CI runner."""
+    found = OrderedDict()
+    found['module_utils'] = Target('module_utils', 'ansible.module_utils.hashivault', BASE, 80, FORBIDDEN)
+    found['lookup'] = Target('lookup', 'ansible.plugins.lookup.hashivault', BASE + ('ansible.plugins.lookup',), 90, ())
+    found['action'] = Target('action', 'ansible.plugins.action.hashivault', BASE + ('ansible.plugins.action',), 90, ())
+    found['callback'] = Target('callback', 'ansible.plugins.callback.hashivault_stats',
+                               BASE + ('ansible.plugins.callback',), 90, ())
+    for filename in sorted(os.listdir(MODULES)):
+        if filename.startswith('hashivault') and filename.endswith('.py'):
+            name = filename[:-3]
+            found[name] = Target(name, 'ansible.modules.hashivault.' + name,
+                                 BASE + ('ansible.module_utils.hashivault',), 10, FORBIDDEN)
+    return found
+
+
+def measure(target):
+    """Return the milliseconds importing target took after its prelude and the modules it imported."""
+    code = 'import %s\nimport %s' % (', '.join(target.prelude), target.module)
+    with tempfile.TemporaryDirectory() as directory:
+        # sources are compiled on every import, as AnsiballZ runs them from a zip
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1', PYTHONPYCACHEPREFIX=directory)
+        output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd='/', env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True,
+                                check=True).stderr
+    # a module is listed once imported, after the modules it imported, these
+    # are indented deeper
+    imported = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        top = not name.startswith('  ')
+        name = name.strip()
+        if top and name in target.prelude:
+            imported = []
+            continue
+        imported.append(name)
+        if top and name == target.module:
+            return int(cumulative) / 1000.0, imported
+    raise Exception('%s not in the -X importtime output' % target.module)
+
+
+def check_config_types():
+    """Yield the modules whose CONFIG_TYPES and DOCUMENTATION disagree, with the difference."""
+    for filename in sorted(os.listdir(MODULES)):
+        if not filename.startswith('hashivault') or not filename.endswith('.py'):
+            continue
+        module = importlib.import_module('ansible.modules.hashivault.' + filename[:-3])
+        config_types = getattr(module, 'CONFIG_TYPES', None)
+        if config_types is None:
+            continue
+        options = yaml.safe_load(module.DOCUMENTATION)['options']['config']['suboptions']
+        documented = dict((key, option.get('type')) for key, option in options.items())
+        if documented != config_types:
+            difference = sorted(set(documented.items()) ^ set(config_types.items()), key=str)
+            yield filename[:-3], difference
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the import time budgets of the hashivault modules.')
+    parser.add_argument('targets', nargs='*', help='module_utils, lookup, action, callback or modules, all by default')
+    parser.add_argument('--runs', type=int, default=3, help='runs per target, the median is checked')
+    args = parser.parse_args(argv)
+    known = targets()
+    unknown = [name for name in args.targets if name not in known]
+    if unknown:
+        parser.error('unknown targets: %s' % ', '.join(unknown))
+
+    failures = 0
+    print('%-38s %9s %7s  %s' % ('target', 'import', 'budget', 'result'))
+    for name in args.targets or list(known):
+        target = known[name]
+        try:
+            runs = [measure(target) for _ in range(args.runs)]
+        except Exception as e:
+            failures += 1
+            print('%-38s %9s %5dms  FAIL %s' % (name, '-', target.budget, e))
+            continue
+        milliseconds = statistics.median(run[0] for run in runs)
+        forbidden = sorted(set(runs[0][1]) & set(target.forbidden))
+        status = 'ok'
+        if milliseconds > target.budget:
+            status = 'FAIL over budget'
+        elif forbidden:
+            status = 'FAIL imports %s' % ', '.join(forbidden)
+        if status.startswith('FAIL'):
+            failures += 1
+        print('%-38s %7.1fms %5dms  %s' % (name, milliseconds, target.budget, status))
+
+    for name, difference in check_config_types():
+        failures += 1
+        print('%s: CONFIG_TYPES and DOCUMENTATION differ: %s' % (name, difference))
+    if failures:
+        print('%d checks failed' % failures)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""
+Benchmarks of the hashivault modules, the lookup plugin and _compare_state
+against the in process fake Vault of benchmarks/fake_vault.py, so they run
+anywhere the collection is installed (pip install . or link.sh).
+
+Every scenario reports wall time and the HTTP requests, logins and bytes it
+cost, in total and per iteration. Modules run in this process the way
+AnsiballZ runs them and process wide caches are emptied before every module
+run, as every task gets a fresh process. Lookups keep them, as they do in a
+playbook run.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --latency 0.005 --iterations 20 read_kv2 lookup_multi
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import requests
+
+from fake_vault import FakeVault
+from fake_vault import ROOT_TOKEN
+from fake_vault import make_certificate
+
+SCENARIOS = OrderedDict()
+
+
+def scenario(name):
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+def cold_start():
+    """Forget what a previous module run left in this process."""
+    from ansible.module_utils import hashivault
+    cache = hashivault.hashivault_read_cache
+    with cache.lock:
+        cache.entries.clear()
+        cache.bytes = 0
+    for registry in ('_sessions', '_routers', '_index_states'):
+        getattr(hashivault, registry, {}).clear()
+
+
+def run_module(name, args, check_mode=False):
+    """Run module name with args in this process and return its result."""
+    import importlib
+    from ansible.module_utils import basic
+    from ansible.module_utils.common.text.converters import to_bytes
+    cold_start()
+    args = dict(args, _ansible_check_mode=check_mode)
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    basic._ANSIBLE_PROFILE = 'legacy'
+    module = importlib.import_module('ansible.modules.hashivault.' + name)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            module.main()
+    except SystemExit:
+        pass
+    result = json.loads(out.getvalue().strip().splitlines()[-1])
+    if result.get('failed'):
+        raise Exception('%s failed: %s' % (name, result.get('msg')))
+    return result
+
+
+def lookup(terms, **kwargs):
+    from ansible.plugins.lookup.hashivault import LookupModule
+    return LookupModule().run(terms, {}, **kwargs)
+
+
+def seed_tree(vault, prefix, count, fan_out=10):
+    paths = []
+    for i in range(count):
+        path = '%s/team%d/app%d/secret%d' % (prefix, i % fan_out, (i // fan_out) % fan_out, i)
+        vault.put_kv2(path, {'password': 'p%d' % i, 'user': 'u%d' % i})
+        paths.append(path)
+    return paths
+
+
+@scenario('read_kv2')
+def bench_read_kv2(vault, url, iterations):
+    vault.put_kv2('bench/read', {'password': 'x' * 64})
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_read', dict(url=url, token=ROOT_TOKEN, secret='bench/read', version=2))
+
+
+@scenario('read_kv2_approle')
+def bench_read_kv2_approle(vault, url, iterations):
+    vault.put_kv2('bench/read', {'password': 'x' * 64})
+    vault.add_approle('bench-role', 'bench-secret')
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_read', dict(url=url, authtype='approle', role_id='bench-role',
+                                           secret_id='bench-secret', secret='bench/read', version=2))
+
+
+@scenario('read_kv2_approle_broker')
+def bench_read_kv2_approle_broker(vault, url, iterations):
+    vault.put_kv2('bench/read', {'password': 'x' * 64})
+    vault.add_approle('bench-role', 'bench-secret')
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_read', dict(url=url, authtype='approle', role_id='bench-role', broker=True,
+                                           broker_idle_timeout=2, secret_id='bench-secret', secret='bench/read',
+                                           version=2))
+
+
+@scenario('read_kv2_agent')
+def bench_read_kv2_agent(vault, url, iterations):
+    vault.put_kv2('bench/read', {'password': 'x' * 64})
+    with tempfile.TemporaryDirectory() as directory:
+        agent = vault.start_agent(os.path.join(directory, 'agent.sock'))
+        vault.reset_stats()
+        for _ in range(iterations):
+            run_module('hashivault_read', dict(url=agent, authtype='agent', secret='bench/read', version=2))
+
+
+@scenario('read_kv2_tls')
+def bench_read_kv2_tls(vault, url, iterations):
+    # every response closes its connection, each read connects anew
+    vault.put_kv2('bench/read', {'password': 'x' * 64})
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = make_certificate(directory)
+        tls = vault.start_tls(certfile, keyfile, keep_alive=False)
+        # a CA bundle the size of the usual ones
+        ca_cert = os.path.join(directory, 'ca.pem')
+        with open(ca_cert, 'w') as f:
+            for path in (requests.certs.where(), certfile):
+                with open(path) as bundle:
+                    f.write(bundle.read())
+        vault.reset_stats()
+        for _ in range(iterations):
+            run_module('hashivault_read', dict(url=tls, token=ROOT_TOKEN, ca_cert=ca_cert, secret='bench/read',
+                                               version=2))
+
+
+@scenario('read_batch_50')
+def bench_read_batch(vault, url, iterations):
+    paths = seed_tree(vault, 'batch', 50)
+    secrets = [dict(name=path, secret=path) for path in paths]
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_read', dict(url=url, token=ROOT_TOKEN, version=2, secrets=secrets))
+
+
+@scenario('secret_unchanged')
+def bench_secret_unchanged(vault, url, iterations):
+    data = {'user': 'admin', 'password': 'x' * 64}
+    vault.put_kv2('bench/secret', data)
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_secret', dict(url=url, token=ROOT_TOKEN, secret='bench/secret', data=data))
+
+
+@scenario('secret_changed')
+def bench_secret_changed(vault, url, iterations):
+    vault.reset_stats()
+    for i in range(iterations):
+        run_module('hashivault_secret', dict(url=url, token=ROOT_TOKEN, secret='bench/secret', data={'n': str(i)}))
+
+
+@scenario('secret_bulk_50')
+def bench_secret_bulk(vault, url, iterations):
+    vault.reset_stats()
+    for i in range(iterations):
+        secrets = [dict(secret='bulk/s%d' % n, data={'n': str(n), 'run': str(i % 2)}) for n in range(50)]
+        run_module('hashivault_secret', dict(url=url, token=ROOT_TOKEN, secrets=secrets))
+
+
+@scenario('list_flat')
+def bench_list_flat(vault, url, iterations):
+    seed_tree(vault, 'tree', 200)
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_list', dict(url=url, token=ROOT_TOKEN, secret='tree', version=2))
+
+
+@scenario('list_recursive_200')
+def bench_list_recursive(vault, url, iterations):
+    seed_tree(vault, 'tree', 200)
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_list', dict(url=url, token=ROOT_TOKEN, secret='tree', version=2, recursive=True))
+
+
+@scenario('policy_unchanged')
+def bench_policy_unchanged(vault, url, iterations):
+    rules = 'path "secret/*" {\n  capabilities = ["read"]\n}\n'
+    vault.policies['bench'] = rules
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_policy', dict(url=url, token=ROOT_TOKEN, name='bench', rules=rules))
+
+
+@scenario('secret_engine_unchanged')
+def bench_secret_engine_unchanged(vault, url, iterations):
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_secret_engine', dict(url=url, token=ROOT_TOKEN, name='secret', backend='kv',
+                                                    options={'version': '2'}))
+
+
+@scenario('pki_role_list')
+def bench_pki_role_list(vault, url, iterations):
+    for i in range(20):
+        vault.pki_roles['role%d' % i] = dict(allowed_domains=['example.com'], max_ttl=3600)
+    vault.reset_stats()
+    for _ in range(iterations):
+        run_module('hashivault_pki_role_list', dict(url=url, token=ROOT_TOKEN))
+
+
+@scenario('lookup_single')
+def bench_lookup_single(vault, url, iterations):
+    vault.put_kv1('bench/lookup', {'password': 'x' * 64})
+    vault.reset_stats()
+    for _ in range(iterations):
+        lookup(['bench/lookup', 'password'], url=url, token=ROOT_TOKEN, mount_point='kv')
+
+
+@scenario('lookup_multi_50')
+def bench_lookup_multi(vault, url, iterations):
+    paths = seed_tree(vault, 'multi', 50)
+    vault.reset_stats()
+    for _ in range(iterations):
+        cold_start()
+        lookup([[path, 'password'] for path in paths], url=url, token=ROOT_TOKEN, version=2)
+
+
+@scenario('compare_state')
+def bench_compare_state(vault, url, iterations):
+    from ansible.module_utils.hashivault import _compare_state
+    desired = dict(('key%d' % i, dict(list=list(range(20)), nested=dict(a=str(i), b=[dict(c=i)]))) for i in range(500))
+    current = json.loads(json.dumps(desired))
+    for _ in range(iterations):
+        _compare_state(desired, current)
+
+
+def run(names, iterations, latency, fail_rate):
+    results = OrderedDict()
+    for name in names:
+        vault = FakeVault(latency=latency, fail_rate=fail_rate)
+        url = vault.start()
+        try:
+            start = time.time()
+            SCENARIOS[name](vault, url, iterations)
+            wall = time.time() - start
+        finally:
+            vault.stop()
+        stats = vault.stats()
+        result = OrderedDict(iterations=iterations, wall=round(wall, 4), wall_per_iteration=round(wall / iterations, 5))
+        result.update(stats)
+        result['requests_per_iteration'] = round(stats['requests'] / float(iterations), 2)
+        result['logins_per_iteration'] = round(stats['logins'] / float(iterations), 2)
+        results[name] = result
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hashivault modules against a fake Vault.')
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run, all by default: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of kv requests answered with 503')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: %s' % ', '.join(unknown))
+    if args.fail_rate:
+        # the modules do not retry unless asked to
+        os.environ.setdefault('VAULT_MAX_RETRIES', '2')
+
+    report = OrderedDict(commit=git_commit(), python=platform.python_version(), time=int(time.time()),
+                         latency=args.latency, fail_rate=args.fail_rate,
+                         results=run(names, args.iterations, args.latency, args.fail_rate))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print('%-22s %10s %10s %9s %8s %11s' % ('scenario', 'wall/it', 'requests', 'req/it', 'logins', 'bytes'))
+    for name, result in report['results'].items():
+        print('%-22s %9.4fs %10d %9.2f %8d %11d' % (
+            name, result['wall_per_iteration'], result['requests'], result['requests_per_iteration'],
+            result['logins'], result['bytes_in'] + result['bytes_out']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,6 +20,7 @@ ansible-playbook -v test_aws_auth_config.yml
 ansible-playbook -v test_aws_auth_role.yml
 ansible-playbook -v test_list.yml
 ansible-playbook -v test_lookup.yml
+VAULT_SHARED_CACHE=true ansible-playbook -v test_lookup.yml
 ansible-playbook -v test_delete.yml
 ansible-playbook -v test_delete_permanent.yml
 ansible-playbook -v test_auth.yml
@@ -95,6 +96,7 @@ ansible-playbook -v test_userpass_no_pass.yml
 ansible-playbook -v test_userpass_no_policy.yml
 source ./userpassenv.sh
 ansible-playbook -v --extra-vars='namespace=userpass/' test_write.yml test_read.yml test_lookup.yml
+VAULT_TOKEN_CACHE=true ansible-playbook -v --extra-vars='namespace=userpass/' test_read.yml test_lookup.yml
 source ./vaultenv.sh
 
 ./stop.sh
@@ -5,12 +5,14 @@ rm -rf "$DEST"/modules/hashivault
 rm -f "$DEST"/module_utils/hashivault.py
 rm -f "$DEST"/plugins/lookup/hashivault.py
 rm -f "$DEST"/plugins/doc_fragments/hashivault.py
-rm -f "$DEST"/plugins/action/hashivault_read_to_file.py
-rm -f "$DEST"/plugins/action/hashivault_write_from_file.py
+rm -f "$DEST"/plugins/action/hashivault*.py
+rm -f "$DEST"/plugins/callback/hashivault_stats.py
 
 ln -s "$PWD"/ansible/modules/hashivault "$DEST"/modules/hashivault
 ln "$PWD"/ansible/module_utils/hashivault.py "$DEST"/module_utils/hashivault.py
 ln "$PWD"/ansible/plugins/lookup/hashivault.py "$DEST"/plugins/lookup/hashivault.py
 ln "$PWD"/ansible/plugins/doc_fragments/hashivault.py "$DEST"/plugins/doc_fragments/hashivault.py
-ln "$PWD"/ansible/plugins/action/hashivault_read_to_file.py "$DEST"/plugins/action/hashivault_read_to_file.py
-ln "$PWD"/ansible/plugins/action/hashivault_write_from_file.py "$DEST"/plugins/action/hashivault_write_from_file.py
+for plugin in "$PWD"/ansible/plugins/action/hashivault*.py; do
+    ln "$plugin" "$DEST"/plugins/action/"$(basename "$plugin")"
+done
+ln "$PWD"/ansible/plugins/callback/hashivault_stats.py "$DEST"/plugins/callback/hashivault_stats.py